@@ -0,0 +1,182 @@
+"""
+Benchmark de /callback_bold con una ráfaga de callbacks de Bold (con reintentos duplicados).
+
+Compara:
+- "por_callback": lo que hacía el borrador comentado (UPDATE + commit + INSERT ... SELECT + commit
+  dentro de la petición, una vez por callback, sin deduplicar)
+- "cola": el endpoint actual (encola y responde; el worker aplica por lotes)
+
+La base es falsa pero guarda el estado de compras_albumes en memoria, así que también
+verifica que ninguna compra se aplique dos veces.
+
+    python -m benchmarks.bench_callbacks [--compras 500] [--duplicados 0.3] [--concurrencia 50] [--latencia 0.002]
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import random
+import time
+
+import httpx
+
+# /callback_bold solo acepta callbacks firmados: el benchmark firma con una llave de prueba
+os.environ.setdefault("BOLD_WEBHOOK_SECRET", "secreto-de-benchmark")
+
+from benchmarks import fake_db  # noqa: E402
+from bolas_locas.respuestas import a_json  # noqa: E402
+
+
+def firmar(cuerpo):
+    secreto = os.environ["BOLD_WEBHOOK_SECRET"].encode()
+    return hmac.new(secreto, base64.b64encode(cuerpo), hashlib.sha256).hexdigest()
+
+
+class CursorCompras(fake_db.FakeCursor):
+    def execute(self, query, params=None):
+        super().execute(query, params)
+        base = self.conn.base
+        sql = " ".join(query.split())
+        self._filas = []
+        if self.indices:
+            self._filas = list(fake_db.INDICES)
+        elif sql.startswith("SELECT id_compra_album, estado FROM compras_albumes"):
+            self._filas = [{"id_compra_album": r, "estado": base.estados[r]} for r in params if r in base.estados]
+        elif sql.startswith("UPDATE compras_albumes SET estado"):
+            estado, *referencias = params
+            for referencia in referencias:
+                base.estados[referencia] = estado
+        elif sql.startswith("INSERT INTO coleccion_laminas"):
+            # El INSERT del borrador recibe una sola compra; el del worker, todas las del lote
+            base.asignaciones.extend(params if "DISTINCT" in sql else params[:1])
+
+    def fetchall(self):
+        return self._filas
+
+
+class ConexionCompras(fake_db.FakeConnection):
+    def __init__(self, base, latency):
+        super().__init__(latency=latency)
+        self.base = base
+
+    def cursor(self, dictionary=False, **kwargs):
+        return CursorCompras(self, dictionary=dictionary)
+
+
+class BaseCompras:
+    def __init__(self, compras):
+        self.estados = {i: "pendiente" for i in range(1, compras + 1)}
+        self.asignaciones = []
+        self.conexiones = []
+
+    def conectar(self, latency):
+        conexion = ConexionCompras(self, latency)
+        self.conexiones.append(conexion)
+        return conexion
+
+    def consultas(self):
+        return sum(c.queries for c in self.conexiones)
+
+
+# Lo que hacía el borrador comentado en webhook.py, con user_id/id_album ya corregidos
+def por_callback(reference, status):
+    from contextlib import closing
+    from bolas_locas.db import db_connection
+
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute(
+            "UPDATE compras_albumes SET estado = %s, fecha_confirmacion = NOW() WHERE id_compra_album = %s",
+            (status, reference)
+        )
+        conn.commit()
+        if status == "completado":
+            cursor.execute(
+                "INSERT INTO coleccion_laminas (user_id, id_album, id_lamina, cantidad) SELECT ...",
+                (reference,)
+            )
+            conn.commit()
+
+
+def rafaga(compras, duplicados, seed=7):
+    rnd = random.Random(seed)
+    eventos = [{"reference": str(i), "status": "completado"} for i in range(1, compras + 1)]
+    eventos += [dict(rnd.choice(eventos)) for _ in range(int(compras * duplicados))]
+    rnd.shuffle(eventos)
+    return eventos
+
+
+async def correr(modo, eventos, args):
+    from bolas_locas.db import get_pool, run_db
+    from bolas_locas.main import app
+
+    base = BaseCompras(args.compras)
+    pool = get_pool()
+    pool.close()
+    pool._connect = lambda: base.conectar(args.latencia)
+
+    if modo == "por_callback":
+        from fastapi import APIRouter
+
+        router = APIRouter()
+
+        @router.post("/callback_viejo")
+        async def callback_viejo(data: dict):
+            await run_db(por_callback, int(data["reference"]), data["status"])
+            return {"message": "Callback procesado correctamente."}
+
+        app.include_router(router)
+    ruta = "/callback_viejo" if modo == "por_callback" else "/callback_bold"
+
+    semaforo = asyncio.Semaphore(args.concurrencia)
+    latencias = []
+    async with app.router.lifespan_context(app):
+        consultas_antes = base.consultas()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            async def una(evento):
+                async with semaforo:
+                    inicio = time.perf_counter()
+                    cuerpo = a_json(evento)
+                    r = await client.post(ruta, content=cuerpo, headers={
+                        "Content-Type": "application/json", "x-bold-signature": firmar(cuerpo)
+                    })
+                    r.raise_for_status()
+                    latencias.append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            await asyncio.gather(*(una(e) for e in eventos))
+            respondido = time.perf_counter() - inicio
+
+            # Esperar a que el worker termine de aplicar
+            from bolas_locas.callbacks_bold import get_cola_callbacks
+            while get_cola_callbacks().pendientes() or any(e != "completado" for e in base.estados.values()):
+                await asyncio.sleep(0.005)
+            aplicado = time.perf_counter() - inicio
+        consultas = base.consultas() - consultas_antes
+
+    latencias.sort()
+    p = lambda q: latencias[min(len(latencias) - 1, int(q * len(latencias)))] * 1000
+    asignadas = len(base.asignaciones)
+    print(f"{modo:<14}ack p50 {p(0.5):6.1f} ms  p99 {p(0.99):6.1f} ms  respondido {respondido:5.2f}s  "
+          f"aplicado {aplicado:5.2f}s  consultas {consultas:5}  asignaciones de láminas {asignadas} "
+          f"({'OK' if asignadas == args.compras else 'DUPLICADAS'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compras", type=int, default=500)
+    parser.add_argument("--duplicados", type=float, default=0.3, help="fracción de callbacks reenviados por Bold")
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--latencia", type=float, default=0.002, help="segundos por consulta en la base falsa")
+    args = parser.parse_args()
+
+    eventos = rafaga(args.compras, args.duplicados)
+    print(f"{len(eventos)} callbacks para {args.compras} compras, concurrencia {args.concurrencia}, "
+          f"latencia por consulta {args.latencia * 1000:.1f} ms")
+    for modo in ("por_callback", "cola"):
+        asyncio.run(correr(modo, eventos, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Benchmark de compras en un tablero caliente: una transacción por compra vs. compras agrupadas.
+
+Muchos compradores a la vez en el tablero 1, a través de handle_comprar_bolitas, contra
+una base falsa con estado y bloqueos de fila: cada sentencia cuesta --latencia, cada
+commit --commit (el fsync) y las filas de jugadores y del tablero (tableros_resumen,
+jackpots) quedan bloqueadas hasta el commit o el rollback, como en InnoDB. Hay pedidos
+fuera de rango, jugadores sin registrar, sin saldo y que llegan al límite por tablero.
+
+Al final verifica los invariantes: saldo debitado = compras registradas por jugador,
+nadie pasa el límite, contadores y jackpot = suma de jugadores_tableros, y cada
+comprador recibió un ✅ por cada compra suya registrada.
+
+    python -m benchmarks.bench_compras_agrupadas [--compradores 200] [--compras 4000]
+                                                 [--latencia 0.0005] [--commit 0.002]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from benchmarks import fake_db
+
+PRECIO = Decimal("1000")
+MAXIMO = 100
+PORCENTAJES = {"porcentaje_casa": Decimal("0.34"), "porcentaje_sponsor": Decimal("0.06"), "porcentaje_ganador": Decimal("0.60")}
+
+
+class Base:
+    """Estado del tablero 1 y sus jugadores, con bloqueos de fila que se sueltan al commit/rollback."""
+
+    def __init__(self, jugadores, args):
+        rnd = random.Random(3)
+        self.saldos = {user_id: PRECIO * rnd.choice((20, 60, 150, 300)) for user_id in range(1, jugadores + 1)}
+        self.saldos_iniciales = dict(self.saldos)
+        self.resumen = {}  # user_id -> [bolitas, monto]
+        self.tablero = [0, 0, Decimal(0)]  # jugadores, bolitas, monto
+        self.jackpot = [0, Decimal(0)]
+        self.compras = []
+        self.latencia = args.latencia
+        self.latencia_fila = args.latencia_fila
+        self.commit = args.commit
+        self.mutex = threading.Lock()
+        self.bloqueos = defaultdict(threading.Lock)
+        self.transacciones = 0
+
+    def bloqueo(self, clave):
+        with self.mutex:
+            return self.bloqueos[clave]
+
+
+class CursorTienda(fake_db.FakeCursor):
+    def execute(self, query, params=None):
+        self._ejecutar(" ".join(query.split()), [params or ()])
+
+    def executemany(self, query, seq):
+        self._ejecutar(" ".join(query.split()), list(seq))
+
+    def _ejecutar(self, query, filas):
+        conn, base = self.conn, self.conn.base
+        time.sleep(base.latencia + base.latencia_fila * len(filas))
+        self._filas, self.rowcount = [], 0
+        params = filas[0]
+        if "FROM configuracion_pagos" in query:
+            self._filas = [dict(PORCENTAJES)]
+        elif "FROM tableros WHERE" in query:
+            if params[0] in (1, "1"):
+                self._filas = [{"precio_por_bolita": PRECIO, "min_bolitas_por_jugador": 1, "max_bolitas_por_jugador": MAXIMO}]
+        elif query.startswith("UPDATE jugadores SET saldo = saldo - %s"):
+            costo, user_id = params[0], int(params[1])
+            conn.bloquear(("jugador", user_id))
+            if user_id in base.saldos and base.saldos[user_id] >= costo:
+                conn.debitar(user_id, costo)
+                self.rowcount = 1
+        elif query.startswith("UPDATE jugadores SET saldo = saldo - CASE"):
+            pares = len(params) // 3
+            for i in range(pares):
+                user_id, monto = int(params[2 * i]), params[2 * i + 1]
+                conn.bloquear(("jugador", user_id))
+                conn.debitar(user_id, monto)
+                self.rowcount += 1
+        elif query.startswith("SELECT user_id, saldo FROM jugadores") and "FOR UPDATE" in query:
+            for user_id in sorted(int(u) for u in params):
+                conn.bloquear(("jugador", user_id))
+                if user_id in base.saldos:
+                    self._filas.append({"user_id": user_id, "saldo": base.saldos[user_id]})
+        elif "FROM jugadores WHERE user_id" in query:
+            user_id = int(params[0])
+            if user_id in base.saldos:
+                self._filas = [{"alias": f"jugador{user_id}", "sponsor": "sponsor", "numero_celular": "3000000000"}]
+        elif query.startswith("SELECT user_id, cantidad_bolitas FROM jugadores_tableros_resumen"):
+            self._filas = [{"user_id": int(u), "cantidad_bolitas": base.resumen[int(u)][0]}
+                           for u in params[1:] if int(u) in base.resumen]
+        elif query.startswith("SELECT cantidad_bolitas FROM jugadores_tableros_resumen"):
+            user_id = int(params[1])
+            if user_id in base.resumen:
+                self._filas = [{"cantidad_bolitas": base.resumen[user_id][0]}]
+        elif query.startswith("INSERT INTO jugadores_tableros "):
+            for user_id, id_tablero, cantidad, monto in filas:
+                conn.deshacer.append(len(base.compras))
+                base.compras.append((int(user_id), cantidad, monto))
+        elif query.startswith("INSERT INTO jugadores_tableros_resumen"):
+            for _, user_id, cantidad, monto in filas:
+                conn.bloquear(("resumen", int(user_id)))
+                conn.sumar_resumen(int(user_id), cantidad, monto)
+        elif query.startswith("INSERT INTO tableros_resumen"):
+            conn.bloquear(("tablero", 1))
+            conn.sumar(base.tablero, params[1:])
+        elif query.startswith("INSERT INTO jackpots"):
+            conn.bloquear(("jackpot", 1))
+            conn.sumar(base.jackpot, params[1:3])
+        else:
+            raise AssertionError(f"Consulta sin simular: {query[:80]}")
+
+    def fetchone(self):
+        return self._filas[0] if self._filas else None
+
+    def fetchall(self):
+        filas, self._filas = self._filas, []
+        return filas
+
+
+class ConexionTienda(fake_db.FakeConnection):
+    def __init__(self, base):
+        super().__init__(latency=0)
+        self.base = base
+        self.bloqueadas = []
+        self.deshacer = []  # Índices de compras, o funciones que revierten un cambio
+
+    def cursor(self, dictionary=False, **kwargs):
+        return CursorTienda(self, dictionary=dictionary)
+
+    def bloquear(self, clave):
+        if clave not in self.bloqueadas:
+            self.base.bloqueo(clave).acquire()
+            self.bloqueadas.append(clave)
+
+    def debitar(self, user_id, monto):
+        self.base.saldos[user_id] -= monto
+        self.deshacer.append(lambda: self.base.saldos.__setitem__(user_id, self.base.saldos[user_id] + monto))
+
+    def sumar_resumen(self, user_id, cantidad, monto):
+        resumen = self.base.resumen
+        if user_id in resumen:
+            fila = resumen[user_id]
+            fila[0] += cantidad
+            fila[1] += monto
+            self.deshacer.append(lambda: fila.__setitem__(0, fila[0] - cantidad) or fila.__setitem__(1, fila[1] - monto))
+        else:
+            resumen[user_id] = [cantidad, monto]
+            self.deshacer.append(lambda: resumen.pop(user_id))
+
+    def sumar(self, fila, valores):
+        for i, valor in enumerate(valores):
+            fila[i] += valor
+        self.deshacer.append(lambda: [fila.__setitem__(i, fila[i] - v) for i, v in enumerate(valores)])
+
+    def _soltar(self):
+        for clave in reversed(self.bloqueadas):
+            self.base.bloqueo(clave).release()
+        self.bloqueadas, self.deshacer = [], []
+
+    def commit(self):
+        time.sleep(self.base.commit)
+        self.base.transacciones += 1
+        self._soltar()
+
+    def rollback(self):
+        for paso in reversed(self.deshacer):
+            if isinstance(paso, int):
+                self.base.compras[paso] = None
+            else:
+                paso()
+        self._soltar()
+
+
+def pedidos(args):
+    rnd = random.Random(11)
+    lista = []
+    for _ in range(args.compras):
+        user_id = rnd.randint(1, args.jugadores + args.jugadores // 20)  # ~5% sin registrar
+        cantidad = rnd.choice((0, 150)) if rnd.random() < 0.03 else rnd.randint(1, 30)
+        lista.append((user_id, cantidad))
+    return lista
+
+
+async def correr(agrupadas, args):
+    from bolas_locas import compras_agrupadas, webhook
+    from bolas_locas.cache import cache
+    from bolas_locas.db import get_pool
+    from bolas_locas.respuestas import desde_json
+
+    base = Base(args.jugadores, args)
+    pool = get_pool()
+    pool.close()
+    pool._connect = lambda: ConexionTienda(base)
+    cache.clear()
+    compras_agrupadas._tableros = {"1"} if agrupadas else set()
+
+    fila = pedidos(args)
+    respuestas, demoras = [], []
+
+    async def comprador():
+        while fila:
+            user_id, cantidad = fila.pop()
+            inicio = time.perf_counter()
+            r = await webhook.handle_comprar_bolitas(user_id, "1", str(cantidad))
+            demoras.append(time.perf_counter() - inicio)
+            respuestas.append((user_id, desde_json(r.body)["fulfillmentText"]))
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(comprador() for _ in range(args.compradores)))
+    segundos = time.perf_counter() - inicio
+    await compras_agrupadas.detener_cola_compras()
+    return base, respuestas, demoras, segundos
+
+
+def verificar(base, respuestas):
+    errores = []
+    compras = [c for c in base.compras if c is not None]
+    por_jugador = defaultdict(lambda: [0, 0])
+    for user_id, cantidad, monto in compras:
+        por_jugador[user_id][0] += cantidad
+        por_jugador[user_id][1] += monto
+    for user_id, saldo in base.saldos.items():
+        bolitas, pagado = por_jugador.get(user_id, (0, 0))
+        if saldo < 0:
+            errores.append(f"saldo negativo para {user_id}: {saldo}")
+        if base.saldos_iniciales[user_id] - saldo != pagado:
+            errores.append(f"{user_id}: debitado {base.saldos_iniciales[user_id] - saldo} pero registrado {pagado}")
+        if bolitas > MAXIMO:
+            errores.append(f"{user_id} superó el límite: {bolitas} > {MAXIMO}")
+        if list(base.resumen.get(user_id, (0, 0))) != [bolitas, pagado]:
+            errores.append(f"{user_id}: resumen {base.resumen.get(user_id)} != log {[bolitas, pagado]}")
+    bolitas = sum(c for _, c, _ in compras)
+    monto = sum(m for _, _, m in compras)
+    if base.tablero != [len(por_jugador), bolitas, monto]:
+        errores.append(f"tableros_resumen {base.tablero} != log {[len(por_jugador), bolitas, monto]}")
+    if base.jackpot != [bolitas, monto]:
+        errores.append(f"jackpot {base.jackpot} != log {[bolitas, monto]}")
+    exitos = Counter(user_id for user_id, mensaje in respuestas if mensaje.startswith("✅"))
+    registradas = Counter(user_id for user_id, _, _ in compras)
+    if exitos != registradas:
+        errores.append("los ✅ recibidos por comprador no coinciden con sus compras registradas")
+    return errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compradores", type=int, default=200, help="compradores simultáneos")
+    parser.add_argument("--compras", type=int, default=4000)
+    parser.add_argument("--jugadores", type=int, default=1000)
+    parser.add_argument("--latencia", type=float, default=0.0005, help="segundos por sentencia")
+    parser.add_argument("--latencia-fila", type=float, default=0.00001, help="segundos extra por fila en executemany")
+    parser.add_argument("--commit", type=float, default=0.002, help="segundos por commit")
+    args = parser.parse_args()
+
+    print(f"{args.compras} compras de {args.compradores} compradores simultáneos en un tablero")
+    fallo = False
+    for agrupadas in (False, True):
+        base, respuestas, demoras, segundos = asyncio.run(correr(agrupadas, args))
+        errores = verificar(base, respuestas)
+        demoras.sort()
+        tipos = Counter(mensaje.split(".")[0][:30] for _, mensaje in respuestas)
+        nombre = "agrupadas" if agrupadas else "una por compra"
+        print(f"  {nombre:<15} {len(respuestas) / segundos:8,.0f} compras/s  {base.transacciones:5} commits  "
+              f"p50 {demoras[len(demoras) // 2] * 1000:6.1f} ms  p99 {demoras[int(len(demoras) * 0.99)] * 1000:6.1f} ms")
+        print(f"  {'':<15} respuestas {dict(tipos)}")
+        for error in errores[:10]:
+            print(f"  ❌ {error}")
+        fallo |= bool(errores)
+    if fallo:
+        sys.exit(1)
+    print("✅ Invariantes OK")
+
+
+if __name__ == "__main__":
+    main()
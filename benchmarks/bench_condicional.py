@@ -0,0 +1,143 @@
+"""
+Benchmark de GET condicional y compresión en la API REST pública.
+
+Clientes que refrescan /tableros_abiertos, /albumes_disponibles, /tablero/1/jackpot y
+/tablero/1/jugadores, con compras de vez en cuando en el tablero 1. Compara clientes sin
+validadores ni gzip (como la mini-app hasta ahora) con clientes que reenvían el ETag
+(If-None-Match) y aceptan gzip. Cuenta consultas a la base, respuestas 200/304 y bytes
+enviados, y verifica que ningún cliente se quede con un jackpot o una lista vieja
+después de una compra.
+
+    python -m benchmarks.bench_condicional [--clientes 50] [--rondas 40] [--jugadores 2000]
+"""
+import argparse
+import asyncio
+import random
+from collections import Counter
+from decimal import Decimal
+
+from benchmarks import fake_db
+
+
+class Base:
+    def __init__(self, jugadores):
+        self.jugadores = jugadores
+        self.acum = Counter({1: 100, 2: 50})
+        self.consultas = 0
+
+
+class CursorTienda(fake_db.FakeCursor):
+    def execute(self, query, params=None):
+        base = self.conn.base
+        base.consultas += 1
+        query = " ".join(query.split())
+        self._filas = []
+        if "FROM jackpots" in query and "WHERE id_tablero" in query:
+            id_tablero = params[0]
+            self._filas = [self._jackpot(id_tablero)] if id_tablero in base.acum else []
+        elif "FROM tableros t" in query:
+            self._filas = [dict(self._jackpot(i), nombre=f"Tablero {i}", precio_por_bolita=1000.0) for i in base.acum]
+        elif "FROM albumes" in query:
+            self._filas = [{"id_album": i, "nombre": f"Álbum {i}", "descripcion": "", "precio": 20000.0} for i in (1, 2, 3)]
+        elif "FROM jugadores_tableros_resumen r" in query:
+            limite = params[-1]
+            after = params[1] if len(params) == 3 else 0
+            ultimo = min(base.jugadores, after + limite)
+            # El último jugador suma las bolitas de cada compra nueva
+            self._filas = [{"user_id": i, "alias": f"jugador{i}", "sponsor": f"sponsor{i % 97}",
+                            "total_bolitas": Decimal(i % 50 + 1 + (base.acum[params[0]] if i == base.jugadores else 0))}
+                           for i in range(after + 1, ultimo + 1)]
+
+    def _jackpot(self, id_tablero):
+        acum = self.conn.base.acum[id_tablero]
+        return {"id_tablero": id_tablero, "acum_bolitas": acum, "premio_ganador": acum * 600.0, "premio_sponsor": acum * 60.0}
+
+    def fetchone(self):
+        return self._filas[0] if self._filas else None
+
+    def fetchall(self):
+        filas, self._filas = self._filas, []
+        return filas
+
+    def fetchmany(self, size=1):
+        filas, self._filas = self._filas[:size], self._filas[size:]
+        return filas
+
+
+class ConexionTienda(fake_db.FakeConnection):
+    def __init__(self, base):
+        super().__init__(latency=0)
+        self.base = base
+
+    def cursor(self, dictionary=False, **kwargs):
+        return CursorTienda(self, dictionary=dictionary)
+
+
+RUTAS = ["/tableros_abiertos", "/albumes_disponibles", "/tablero/1/jackpot", "/tablero/1/jugadores"]
+
+
+async def correr(condicional, args):
+    import httpx
+
+    from bolas_locas.cache import cache, invalidar_tableros
+    from bolas_locas.db import get_pool
+    from bolas_locas.main import app
+    from bolas_locas.respuestas import desde_json
+
+    base = Base(args.jugadores)
+    pool = get_pool()
+    pool.close()
+    pool._connect = lambda: ConexionTienda(base)
+    cache.clear()
+
+    estados, enviados, viejos = Counter(), 0, 0
+    rnd = random.Random(7)
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://test") as http:
+        clientes = [{} for _ in range(args.clientes)]  # ruta -> (etag, cuerpo)
+        for _ in range(args.rondas):
+            if rnd.random() < args.compras:
+                # Lo que hace comprar_bolitas al confirmar la compra
+                base.acum[1] += 1
+                invalidar_tableros(1)
+            for guardado in clientes:
+                for ruta in RUTAS:
+                    headers = {}
+                    if condicional:
+                        headers["Accept-Encoding"] = "gzip"
+                        if ruta in guardado:
+                            headers["If-None-Match"] = guardado[ruta][0]
+                    else:
+                        headers["Accept-Encoding"] = "identity"
+                    r = await http.get(ruta, headers=headers)
+                    estados[r.status_code] += 1
+                    enviados += r.num_bytes_downloaded
+                    if r.status_code == 200:
+                        guardado[ruta] = (r.headers.get("etag"), r.content)
+                    cuerpo = guardado[ruta][1]
+                    if ruta == "/tablero/1/jackpot":
+                        viejos += desde_json(cuerpo)["acum_bolitas"] != base.acum[1]
+                    elif ruta == "/tablero/1/jugadores":
+                        viejos += desde_json(cuerpo)[-1]["total_bolitas"] != args.jugadores % 50 + 1 + base.acum[1]
+    return base.consultas, estados, enviados, viejos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=50)
+    parser.add_argument("--rondas", type=int, default=40)
+    parser.add_argument("--jugadores", type=int, default=2000, help="jugadores del tablero 1")
+    parser.add_argument("--compras", type=float, default=0.2, help="probabilidad de una compra por ronda")
+    args = parser.parse_args()
+
+    total = args.clientes * args.rondas * len(RUTAS)
+    print(f"{total} peticiones de {args.clientes} clientes a {len(RUTAS)} rutas")
+    for condicional in (False, True):
+        consultas, estados, enviados, viejos = asyncio.run(correr(condicional, args))
+        nombre = "ETag + gzip" if condicional else "sin validadores"
+        print(f"  {nombre:<16} consultas {consultas:6}  respuestas {dict(estados)}  "
+              f"enviado {enviados / 1024 / 1024:7.2f} MiB  respuestas viejas: {viejos}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Microbenchmark del camino de despacho del webhook (sin base de datos):
+
+1. parseo del body: json.loads + dicts anidados con try/except (antes) vs PayloadDialogflow
+2. despacho: cadena de if vs búsqueda en ACCIONES
+3. serialización de la respuesta: JSONResponse de Starlette (json estándar) vs orjson
+4. petición completa a /webhook con una acción que no usa MySQL (actComprarAlbumMiniApp)
+
+    python -m benchmarks.bench_dispatch [--n 20000]
+"""
+import argparse
+import asyncio
+import json
+import time
+import timeit
+
+import httpx
+from starlette.responses import JSONResponse as JSONResponseEstandar
+
+from benchmarks.payloads import payload
+from bolas_locas.acciones import ACCIONES, PayloadDialogflow
+from bolas_locas.respuestas import JSONResponse
+
+
+def payload_completo(action, callback=False, **parameters):
+    """Body con los campos que Dialogflow realmente envía (contextos, intent, datos de Telegram)."""
+    body = payload(action, user_id=123456789, callback=callback, **parameters)
+    sesion = "projects/bolas-locas/agent/sessions/123456789"
+    body["responseId"] = "a1b2c3d4-e5f6-7890-abcd-ef1234567890-1234abcd"
+    body["session"] = sesion
+    body["queryResult"].update({
+        "queryText": "|".join(["accion", *map(str, parameters.values())]),
+        "allRequiredParamsPresent": True,
+        "fulfillmentMessages": [{"text": {"text": [""]}}],
+        "outputContexts": [
+            {"name": f"{sesion}/contexts/ctx{i}", "lifespanCount": 5,
+             "parameters": {**parameters, **{f"{k}.original": v for k, v in parameters.items()}}}
+            for i in range(4)
+        ],
+        "intent": {"name": "projects/bolas-locas/agent/intents/0f0f0f0f", "displayName": action},
+        "intentDetectionConfidence": 1,
+        "languageCode": "es",
+    })
+    original = body["originalDetectIntentRequest"]
+    original["source"] = "telegram"
+    datos = original["payload"]["data"]
+    remitente = datos["callback_query"]["from"] if callback else datos["from"]
+    remitente.update({"first_name": "Ana", "is_bot": False, "language_code": "es", "username": "ana"})
+    datos.update({"chat": {"id": 123456789, "type": "private", "first_name": "Ana"}, "date": 1700000000, "message_id": 321})
+    return body
+
+
+def parseo_anterior(body):
+    data = json.loads(body)
+    try:
+        user_id = data["originalDetectIntentRequest"]["payload"]["data"]["from"]["id"]
+    except KeyError:
+        try:
+            user_id = data["originalDetectIntentRequest"]["payload"]["data"]["callback_query"]["from"]["id"]
+        except KeyError:
+            user_id = None
+    return user_id, data["queryResult"].get("action"), data["queryResult"]["parameters"]
+
+
+def parseo_modelo(body):
+    modelo = PayloadDialogflow.model_validate_json(body)
+    return modelo.user_id, modelo.queryResult.action, modelo.queryResult.parameters
+
+
+NOMBRES_EN_ORDEN = [
+    "actDatosCuenta", "actCambiarNequi", "actJugar", "actRegistrarUsuario", "actTableroSelect",
+    "actComprarBolitas", "actMisTabAbiertos", "actMisTabJugados", "actConsultaTablero",
+    "actMisTabGanados", "actComprarAlbum", "actComprarAlbumMiniApp",
+]
+
+
+def despacho_if(action):
+    # Mismo costo que la cadena de if anterior: comparar en orden hasta encontrar la acción
+    for nombre in NOMBRES_EN_ORDEN:
+        if action == nombre:
+            return nombre
+    return None
+
+
+def despacho_registro(action):
+    return ACCIONES.get(action)
+
+
+RESPUESTA_TIPICA = {
+    "fulfillmentMessages": [{
+        "platform": "TELEGRAM",
+        "payload": {"telegram": {
+            "parse_mode": "Markdown",
+            "text": "🎲 *Selecciona un tablero para jugar:*",
+            "reply_markup": {"inline_keyboard": [
+                [{"text": f"#ID: {i} - 🟢 $1.000  - 💰 Acum: $1.234.567", "callback_data": f"t4bl3r0s3l|{i}"}]
+                for i in range(20)
+            ]},
+        }},
+    }]
+}
+
+
+def medir(nombre, funcion, n):
+    segundos = min(timeit.repeat(funcion, number=n, repeat=3))
+    print(f"{nombre:<52}{segundos / n * 1e6:>10.2f} µs")
+
+
+async def peticiones_completas(n):
+    from bolas_locas.main import app
+
+    body = payload_completo("actComprarAlbumMiniApp")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(200):
+            await client.post("/webhook", json=body)
+        inicio = time.perf_counter()
+        for _ in range(n):
+            await client.post("/webhook", json=body)
+        return (time.perf_counter() - inicio) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20000)
+    args = parser.parse_args()
+    n = args.n
+
+    # Importar la app registra todos los handlers en ACCIONES
+    import bolas_locas.webhook  # noqa: F401
+
+    bodies = {
+        "mínimo": json.dumps(payload("actComprarBolitas", rtaTableroID="4", rtaCantBolitas="3")).encode(),
+        "completo": json.dumps(payload_completo("actComprarBolitas", rtaTableroID="4", rtaCantBolitas="3")).encode(),
+        "completo, callback": json.dumps(payload_completo("actTableroSelect", callback=True, rtaTableroID="4")).encode(),
+    }
+
+    print("Parseo del body")
+    for nombre, body in bodies.items():
+        assert parseo_anterior(body) == parseo_modelo(body)
+        medir(f"  json.loads + dicts anidados ({nombre})", lambda: parseo_anterior(body), n)
+        medir(f"  PayloadDialogflow ({nombre})", lambda: parseo_modelo(body), n)
+
+    print("Despacho (última acción de la cadena)")
+    medir("  cadena de if", lambda: despacho_if("actComprarAlbumMiniApp"), n * 10)
+    medir("  ACCIONES.get", lambda: despacho_registro("actComprarAlbumMiniApp"), n * 10)
+
+    print("Serialización de la respuesta (teclado de 20 tableros)")
+    medir("  JSONResponse estándar", lambda: JSONResponseEstandar(content=RESPUESTA_TIPICA), n)
+    medir("  JSONResponse orjson", lambda: JSONResponse(content=RESPUESTA_TIPICA), n)
+
+    print("Petición completa a /webhook (sin MySQL)")
+    print(f"{'  actComprarAlbumMiniApp':<52}{asyncio.run(peticiones_completas(max(1000, n // 10))):>10.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark: throughput de /webhook con peticiones concurrentes, antes y después de run_db.
+
+El modo "bloqueante" reproduce el comportamiento anterior (los handlers corren en
+el event loop); el modo "executor" usa el ejecutor acotado de bolas_locas.db.
+La base de datos se reemplaza por conexiones falsas con latencia fija por consulta.
+
+    python -m benchmarks.bench_event_loop --requests 200 --concurrency 50 --latency 0.005
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks import fake_db
+from benchmarks.payloads import payload
+
+
+async def _inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def run(app, total, concurrency, body):
+    transport = httpx.ASGITransport(app=app)
+    semaforo = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def una():
+            async with semaforo:
+                r = await client.post("/webhook", json=body)
+                r.raise_for_status()
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(una() for _ in range(total)))
+        return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005, help="segundos por consulta simulada")
+    parser.add_argument("--action", default="actTableroSelect")
+    args = parser.parse_args()
+
+    fake_db.install(latency=args.latency)
+
+    from bolas_locas import webhook
+    from bolas_locas.main import app
+
+    body = payload(args.action, rtaTableroID="1", rtaCantBolitas=1)
+    modos = {"bloqueante": _inline, "executor": webhook.run_db}
+
+    for nombre, runner in modos.items():
+        webhook.run_db = runner
+        segundos = asyncio.run(run(app, args.requests, args.concurrency, body))
+        print(f"{nombre:>10}: {args.requests} peticiones en {segundos:.3f}s -> {args.requests / segundos:,.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
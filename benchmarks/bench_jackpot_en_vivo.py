@@ -0,0 +1,135 @@
+"""
+Benchmark del jackpot en vivo: consultas a MySQL con polling vs. el hub de SSE.
+
+Conecta N clientes al hub (repartidos entre varios tableros) y simula compras desde
+hilos, como las hace el webhook. Cuenta las lecturas del jackpot, los mensajes entregados
+y la demora entre una compra y el mensaje que la incluye, y verifica que al final cada
+cliente tenga el último valor. Compara con lo que costaría el polling de la mini-app.
+
+    python -m benchmarks.bench_jackpot_en_vivo [--clientes 5000] [--tableros 5] [--segundos 5]
+                                               [--compras 200] [--polling 3]
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from bolas_locas.respuestas import desde_json
+
+
+class Tableros:
+    """Jackpots falsos: cada compra suma bolitas; la lectura simula la latencia de MySQL."""
+
+    def __init__(self, tableros, latencia):
+        self.acum = Counter()
+        self.pendiente_desde = {}  # tablero -> hora de la compra más vieja aún no leída
+        self.publicada = {}  # (tablero, acum) -> hora de la compra más vieja que incluye
+        self.lecturas = 0
+        self.latencia = latencia
+        self._lock = threading.Lock()
+        for id_tablero in range(1, tableros + 1):
+            self.acum[id_tablero] = 0
+
+    def comprar(self, id_tablero):
+        with self._lock:
+            self.acum[id_tablero] += 1
+            self.pendiente_desde.setdefault(id_tablero, time.monotonic())
+
+    def leer(self, id_tablero):
+        time.sleep(self.latencia)
+        with self._lock:
+            self.lecturas += 1
+            acum = self.acum[id_tablero]
+            desde = self.pendiente_desde.pop(id_tablero, None)
+            if desde is not None:
+                self.publicada[(id_tablero, acum)] = desde
+        return {"id_tablero": id_tablero, "acum_bolitas": acum, "premio_ganador": acum * 600, "premio_sponsor": acum * 60}
+
+
+async def cliente(hub, id_tablero, tableros, vistos, demoras):
+    async for mensaje in hub.eventos(id_tablero, latido=60, max_segundos=3600):
+        if not mensaje.startswith(b"id:"):
+            continue
+        datos = desde_json(mensaje.split(b"data: ", 1)[1])
+        vistos[id(asyncio.current_task())] = (id_tablero, datos["acum_bolitas"])
+        desde = tableros.publicada.get((id_tablero, datos["acum_bolitas"]))
+        if desde is not None:
+            demoras.append(time.monotonic() - desde)
+
+
+async def correr(args):
+    from bolas_locas.jackpot_en_vivo import HubJackpots
+
+    tableros = Tableros(args.tableros, args.latencia)
+    hub = HubJackpots(envios_por_segundo=args.envios, leer=tableros.leer)
+    hub.iniciar(refresco=0)
+    vistos, demoras = {}, []
+
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    tareas = [
+        asyncio.create_task(cliente(hub, i % args.tableros + 1, tableros, vistos, demoras))
+        for i in range(args.clientes)
+    ]
+    while len(vistos) < args.clientes:
+        await asyncio.sleep(0.05)
+    memoria = tracemalloc.get_traced_memory()[0] - antes
+    tracemalloc.stop()
+    lecturas_iniciales = tableros.lecturas
+    demoras.clear()
+
+    # Compras desde otro hilo, como las confirma el webhook en el pool de DB
+    def comprar():
+        rnd = random.Random(7)
+        fin = time.monotonic() + args.segundos
+        while time.monotonic() < fin:
+            id_tablero = rnd.randint(1, args.tableros)
+            tableros.comprar(id_tablero)
+            hub.avisar_compra(id_tablero)
+            time.sleep(1 / args.compras)
+
+    inicio = time.monotonic()
+    await asyncio.to_thread(comprar)
+    await asyncio.sleep(1 / args.envios + 0.5)  # Último envío pendiente
+    segundos = time.monotonic() - inicio
+
+    desactualizados = sum(1 for id_tablero, acum in vistos.values() if acum != tableros.acum[id_tablero])
+    for tarea in tareas:
+        tarea.cancel()
+    await hub.detener()
+    await asyncio.gather(*tareas, return_exceptions=True)
+    return tableros, lecturas_iniciales, demoras, desactualizados, memoria, segundos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=5000)
+    parser.add_argument("--tableros", type=int, default=5)
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--compras", type=float, default=200, help="compras por segundo (todos los tableros)")
+    parser.add_argument("--envios", type=float, default=2, help="JACKPOT_ENVIOS_POR_SEGUNDO")
+    parser.add_argument("--polling", type=float, default=3, help="segundos entre consultas de la mini-app con polling")
+    parser.add_argument("--latencia", type=float, default=0.002, help="segundos por lectura en la base falsa")
+    args = parser.parse_args()
+
+    tableros, iniciales, demoras, desactualizados, memoria, segundos = asyncio.run(correr(args))
+    compras = sum(tableros.acum.values())
+    polling = args.clientes * segundos / args.polling
+    demoras.sort()
+    p50 = demoras[len(demoras) // 2] * 1000 if demoras else 0
+    p99 = demoras[int(len(demoras) * 0.99)] * 1000 if demoras else 0
+    print(f"{args.clientes} clientes en {args.tableros} tableros, {compras} compras en {segundos:.1f}s")
+    print(f"  polling cada {args.polling:g}s: ~{polling:,.0f} consultas a jackpots")
+    print(f"  hub SSE:        {tableros.lecturas - iniciales} consultas (+{iniciales} al conectar), "
+          f"{len(demoras):,} mensajes entregados")
+    print(f"  demora compra -> cliente: p50 {p50:.0f} ms, p99 {p99:.0f} ms  "
+          f"(tope {1000 / args.envios:.0f} ms entre envíos por tablero)")
+    print(f"  memoria por cliente inactivo: {memoria / args.clientes / 1024:.1f} KiB  "
+          f"clientes con valor desactualizado al final: {desactualizados}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Benchmark de /tablero/{id}/jugadores en un tablero grande: memoria pico y tiempo al primer byte.
+
+Compara el endpoint anterior (fetchall + convertir_a_float + un solo JSON) con:
+- lista completa enviada por bloques (sin parámetros, mismo formato que antes)
+- ?formato=ndjson
+- recorrer todas las páginas con ?limit=&after=
+
+La base es falsa: sirve N jugadores respetando `user_id > after` y `LIMIT`, y el jackpot del
+tablero (de ahí sale el ETag de la lista). Termina con error si alguna respuesta no es 200.
+
+    python -m benchmarks.bench_jugadores [--jugadores 200000]
+"""
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+from benchmarks import fake_db
+
+
+class CursorJugadores(fake_db.FakeCursor):
+    def execute(self, query, params=None):
+        self.conn.queries += 1
+        self._jackpot = None
+        if "FROM jackpots" in query:
+            (id_tablero,) = params
+            self._jackpot = {"id_tablero": id_tablero, "acum_bolitas": self.conn.jugadores,
+                             "premio_ganador": Decimal("60000"), "premio_sponsor": Decimal("6000")}
+            return
+        if "r.user_id > %s" in query:
+            _, after, limite = params
+        else:
+            (_, limite), after = params, 0
+        self._siguiente = after + 1
+        self._fin = min(self.conn.jugadores, after + limite)
+
+    def _fila(self, user_id):
+        return {"user_id": user_id, "alias": f"jugador{user_id}", "sponsor": f"sponsor{user_id % 97}",
+                "total_bolitas": Decimal(user_id % 50 + 1)}
+
+    def fetchone(self):
+        return self._jackpot
+
+    def fetchmany(self, size=1):
+        hasta = min(self._fin, self._siguiente + size - 1)
+        filas = [self._fila(i) for i in range(self._siguiente, hasta + 1)]
+        self._siguiente = hasta + 1
+        return filas
+
+    def fetchall(self):
+        return self.fetchmany(self._fin - self._siguiente + 1)
+
+
+class ConexionJugadores(fake_db.FakeConnection):
+    def __init__(self, jugadores):
+        super().__init__(latency=0)
+        self.jugadores = jugadores
+
+    def cursor(self, dictionary=False, **kwargs):
+        return CursorJugadores(self, dictionary=dictionary)
+
+
+def instalar(jugadores):
+    from bolas_locas.db import get_pool
+
+    pool = get_pool()
+    pool.close()
+    pool._connect = lambda: ConexionJugadores(jugadores)
+
+
+# El endpoint tal como estaba antes
+def jugadores_antes(tablero_id: int):
+    from contextlib import closing
+    from bolas_locas.db import db_connection
+    from bolas_locas.respuestas import JSONResponse
+    from bolas_locas.webhook import convertir_a_float
+
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute("SELECT ... WHERE r.id_tablero = %s LIMIT %s", (tablero_id, 10 ** 12))
+        jugadores = cursor.fetchall()
+    return JSONResponse(content=convertir_a_float(jugadores))
+
+
+async def pedir(app, ruta):
+    """Llamada ASGI directa: cuenta bytes sin guardarlos (httpx.ASGITransport junta todo el cuerpo)."""
+    camino, _, query = ruta.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": camino, "raw_path": camino.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    resultado = {"status": None, "primer_byte": None, "bytes": 0, "headers": {}}
+    enviado = False
+    desconexion = asyncio.Event()
+
+    async def receive():
+        nonlocal enviado
+        if not enviado:
+            enviado = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await desconexion.wait()  # El cliente nunca se desconecta
+        return {"type": "http.disconnect"}
+
+    async def send(mensaje):
+        if mensaje["type"] == "http.response.start":
+            resultado["status"] = mensaje["status"]
+            resultado["headers"] = {k.decode().lower(): v.decode() for k, v in mensaje["headers"]}
+        elif mensaje.get("body"):
+            if resultado["primer_byte"] is None:
+                resultado["primer_byte"] = time.perf_counter()
+            resultado["bytes"] += len(mensaje["body"])
+
+    await app(scope, receive, send)
+    return resultado
+
+
+async def medir(app, ruta, paginar=False):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    inicio = time.perf_counter()
+    primer_byte = None
+    total = 0
+    estados = set()
+    siguiente = ruta
+    while siguiente:
+        r = await pedir(app, siguiente)
+        estados.add(r["status"])
+        primer_byte = primer_byte or r["primer_byte"]
+        total += r["bytes"]
+        # En ndjson el cursor de la página siguiente viene en un header
+        after = r["headers"].get("x-siguiente-after") if paginar else None
+        siguiente = f"{ruta}&after={after}" if after else None
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return time.perf_counter() - inicio, primer_byte - inicio, total, pico, estados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jugadores", type=int, default=200000)
+    args = parser.parse_args()
+
+    instalar(args.jugadores)
+    from fastapi import FastAPI
+    from bolas_locas.main import app
+
+    antes = FastAPI()
+    antes.get("/tablero/{tablero_id}/jugadores")(jugadores_antes)
+
+    casos = [
+        ("antes (fetchall)", antes, "/tablero/1/jugadores", False),
+        ("lista por bloques", app, "/tablero/1/jugadores", False),
+        ("ndjson", app, "/tablero/1/jugadores?formato=ndjson", False),
+        ("páginas de 1000", app, "/tablero/1/jugadores?formato=ndjson&limit=1000", True),
+    ]
+    print(f"{args.jugadores} jugadores en el tablero")
+    fallidos = []
+    for nombre, aplicacion, ruta, paginar in casos:
+        segundos, primer_byte, total, pico, estados = asyncio.run(medir(aplicacion, ruta, paginar))
+        print(f"  {nombre:<20} total {segundos:6.2f}s  primer byte {primer_byte * 1000:8.1f} ms  "
+              f"{total / 1e6:6.1f} MB enviados  memoria pico {pico / 1e6:7.1f} MB")
+        if estados != {200}:
+            fallidos.append(f"{nombre}: respuestas {sorted(estados, key=str)}")
+    for fallido in fallidos:
+        print(f"❌ {fallido}")
+    if fallidos:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark del cliente de Bold contra el stub local (benchmarks/stub_bold.py), con sockets reales.
+
+Escenarios:
+1. sano: requests.post en el threadpool, como antes (conexión nueva por llamada), vs ClienteBold (keep-alive).
+   El stub es HTTP plano y local: la cifra que importa es cuántas conexiones se abren, porque contra
+   Bold real cada una es un handshake TLS de varias decenas de ms.
+2. errores intermitentes: 20% de 500; reintentos con Idempotency-Key sin pagos duplicados
+3. Bold colgado: cada llamada espera el read timeout hasta que el circuito se abre; luego fallan al instante
+
+    python -m benchmarks.bench_pagos [--llamadas 500] [--concurrencia 50] [--latencia 0.05]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.stub_bold import EstadoStub, StubEnHilo
+from bolas_locas.pagos import CircuitBreaker, ClienteBold, ErrorPasarela
+
+
+def percentiles(latencias):
+    ordenados = sorted(latencias)
+    if not ordenados:
+        return "sin datos"
+    p = lambda q: ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))] * 1000
+    return f"p50 {p(0.50):7.1f} ms  p99 {p(0.99):7.1f} ms"
+
+
+async def en_paralelo(llamadas, concurrencia, funcion):
+    semaforo = asyncio.Semaphore(concurrencia)
+    latencias, errores = [], 0
+
+    async def una(i):
+        nonlocal errores
+        async with semaforo:
+            inicio = time.perf_counter()
+            try:
+                await funcion(i)
+            except Exception:
+                errores += 1
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una(i) for i in range(llamadas)))
+    return time.perf_counter() - inicio, latencias, errores
+
+
+def payload(i):
+    return {"amount": 15000, "currency": "COP", "description": "bench", "reference": f"bench-{i}-{time.monotonic_ns()}"}
+
+
+async def escenario_sano(args):
+    import requests
+    from starlette.concurrency import run_in_threadpool
+
+    estado = EstadoStub(latencia=args.latencia)
+    with StubEnHilo(estado) as stub:
+        async def con_requests(i):
+            r = await run_in_threadpool(requests.post, f"{stub.url}/payments", json=payload(i))
+            r.raise_for_status()
+
+        cliente = ClienteBold(base_url=stub.url)
+
+        async def con_cliente(i):
+            datos = payload(i)
+            await cliente.crear_pago(datos, idempotency_key=datos["reference"])
+
+        print("1. Bold sano")
+        for nombre, funcion in (("requests + threadpool", con_requests), ("ClienteBold keep-alive", con_cliente)):
+            estado.conexiones.clear()
+            segundos, latencias, errores = await en_paralelo(args.llamadas, args.concurrencia, funcion)
+            print(f"   {nombre:<24}{args.llamadas / segundos:8.1f} pagos/s  {percentiles(latencias)}  "
+                  f"conexiones {len(estado.conexiones):>4}  errores {errores}")
+        await cliente.cerrar()
+
+
+async def escenario_intermitente(args):
+    estado = EstadoStub(latencia=args.latencia, tasa_error=0.2, seed=1)
+    with StubEnHilo(estado) as stub:
+        cliente = ClienteBold(
+            base_url=stub.url, reintentos=2, backoff_base=0.05,
+            breaker=CircuitBreaker(umbral_fallas=10_000, segundos_abierto=1),
+        )
+
+        async def con_cliente(i):
+            datos = payload(i)
+            await cliente.crear_pago(datos, idempotency_key=datos["reference"])
+
+        segundos, latencias, errores = await en_paralelo(args.llamadas, args.concurrencia, con_cliente)
+        print("2. 20% de errores 500 con 2 reintentos")
+        print(f"   éxito {args.llamadas - errores}/{args.llamadas}  peticiones a Bold {estado.peticiones}  "
+              f"pagos creados {len(estado.pagos)}  {percentiles(latencias)}")
+        await cliente.cerrar()
+
+
+async def escenario_colgado(args):
+    estado = EstadoStub(modo="colgado", colgado_segundos=30)
+    with StubEnHilo(estado) as stub:
+        breaker = CircuitBreaker(umbral_fallas=5, segundos_abierto=30)
+        cliente = ClienteBold(base_url=stub.url, read_timeout=args.read_timeout, reintentos=1, backoff_base=0.01, breaker=breaker)
+
+        print(f"3. Bold colgado (read timeout {args.read_timeout}s, circuito se abre tras 5 fallas)")
+        for i in range(10):
+            inicio = time.perf_counter()
+            try:
+                await cliente.consultar_pago(f"ref-{i}")
+            except ErrorPasarela as e:
+                resultado = type(e).__name__
+            print(f"   llamada {i + 1:>2}: {resultado:<22}{(time.perf_counter() - inicio) * 1000:9.1f} ms  circuito {breaker.estado}")
+        await cliente.cerrar()
+        estado.modo = "ok"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llamadas", type=int, default=500)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--latencia", type=float, default=0.05, help="latencia simulada de Bold en segundos")
+    parser.add_argument("--read-timeout", type=float, default=0.3)
+    args = parser.parse_args()
+
+    asyncio.run(escenario_sano(args))
+    asyncio.run(escenario_intermitente(args))
+    asyncio.run(escenario_colgado(args))
+
+
+if __name__ == "__main__":
+    main()
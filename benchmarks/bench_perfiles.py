@@ -0,0 +1,111 @@
+"""
+Benchmark de la caché de perfiles: consultas a jugadores por toque del bot.
+
+Simula una sesión típica (Jugar, Mi cuenta, Mis tableros ganados y algún cambio de
+Nequi) de N jugadores y cuenta las consultas por user_id a la tabla jugadores, con la
+caché de perfiles apagada (como antes) y encendida. Verifica además que el saldo que
+muestra "Mi cuenta" sea siempre el de la base y que el celular cambiado se vea al instante.
+
+    python -m benchmarks.bench_perfiles [--jugadores 2000] [--toques 20]
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+from benchmarks import fake_db
+
+
+class CursorContador(fake_db.FakeCursor):
+    def execute(self, query, params=None):
+        super().execute(query, params)
+        sql = " ".join(query.split())
+        self._sql, self._params = sql, params
+        base = self.conn.base
+        if "FROM jugadores WHERE user_id" in sql and sql.startswith("SELECT"):
+            base.consultas["perfil" if "alias" in sql or "numero_celular" in sql else "saldo"] += 1
+        elif sql.startswith("UPDATE jugadores SET numero_celular"):
+            base.celulares[params[1]] = params[0]
+
+    def fetchone(self):
+        if "FROM jugadores WHERE user_id" in self._sql:
+            user_id = self._params[0]
+            base = self.conn.base
+            return {"alias": f"jugador{user_id}", "sponsor": "sponsor", "saldo": base.saldos[user_id],
+                    "numero_celular": base.celulares.get(user_id, "3000000000")}
+        return super().fetchone()
+
+
+class BaseContadora:
+    def __init__(self):
+        self.consultas = Counter()
+        self.saldos = Counter()
+        self.celulares = {}
+
+
+class ConexionContadora(fake_db.FakeConnection):
+    def __init__(self, base):
+        super().__init__(latency=0)
+        self.base = base
+
+    def cursor(self, dictionary=False, **kwargs):
+        return CursorContador(self, dictionary=dictionary)
+
+
+def sesion(rnd, jugadores, toques):
+    acciones = ["actJugar"] * 5 + ["actDatosCuenta"] * 3 + ["actMisTabGanados"]
+    for _ in range(jugadores * toques):
+        user_id = rnd.randint(1, jugadores)
+        yield ("actCambiarNequi" if rnd.random() < 0.01 else rnd.choice(acciones)), user_id
+
+
+def correr(con_cache, jugadores, toques):
+    from bolas_locas.acciones import ACCIONES
+    from bolas_locas import cache as modulo_cache
+    from bolas_locas.db import get_pool
+    from bolas_locas.respuestas import desde_json
+
+    base = BaseContadora()
+    pool = get_pool()
+    pool.close()
+    pool._connect = lambda: ConexionContadora(base)
+    modulo_cache.perfiles.clear()
+    modulo_cache.perfiles.maxsize = modulo_cache.PERFILES_MAX_ENTRIES if con_cache else 0
+
+    rnd = random.Random(7)
+    errores = 0
+    inicio = time.perf_counter()
+    for accion, user_id in sesion(rnd, jugadores, toques):
+        base.saldos[user_id] += 1000  # El saldo cambia entre toques (recargas, compras)
+        if accion == "actCambiarNequi":
+            ACCIONES[accion].handler(user_id, f"3{rnd.randint(10**8, 10**9 - 1)}")
+            continue
+        respuesta = ACCIONES[accion].handler(user_id)
+        if accion == "actDatosCuenta":
+            texto = desde_json(respuesta.body)["fulfillmentMessages"][0]["payload"]["telegram"]["text"]
+            saldo = "${:,.0f}".format(base.saldos[user_id]).replace(",", ".")
+            celular = base.celulares.get(user_id, "3000000000")
+            errores += saldo not in texto or celular not in texto
+    segundos = time.perf_counter() - inicio
+    return base.consultas, segundos, errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jugadores", type=int, default=2000)
+    parser.add_argument("--toques", type=int, default=20, help="toques por jugador")
+    args = parser.parse_args()
+
+    from bolas_locas import webhook  # noqa: F401  registra las acciones
+
+    total = args.jugadores * args.toques
+    print(f"{total} toques de {args.jugadores} jugadores")
+    for con_cache in (False, True):
+        consultas, segundos, errores = correr(con_cache, args.jugadores, args.toques)
+        print(f"  {'con caché' if con_cache else 'sin caché':<10} perfil {consultas['perfil']:6}  "
+              f"solo saldo {consultas['saldo']:6}  ({sum(consultas.values()) / total:.2f} por toque)  "
+              f"{segundos:5.2f}s  datos desactualizados: {errores}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Benchmark del registro de una campaña de inscripción (N jugadores, con un porcentaje de conflictos).
+
+Compara:
+- "antes": lo que hacía handle_registrar_usuario por jugador (consulta de registro,
+  SELECT * del sponsor e INSERT, cada uno con su conexión)
+- "uno_a_uno": registro.registrar por jugador (una transacción, INSERT ... SELECT)
+- "masivo": registro.importar (validación con IN por lote e INSERT multi-fila)
+
+Después importa una campaña con sponsor "auto" con cada estrategia de bolas_locas.sponsors
+y verifica el reparto: con "ultimo" cada jugador queda con el registrado justo antes, con
+"menos_referidos" ningún sponsor recibe más que su parte, y en todas los contadores de
+referidos coinciden con los sponsors asignados.
+
+La base es falsa pero hace cumplir la unicidad de user_id, alias y celular, así que
+también verifica que los rechazos tengan el motivo correcto y que no entren repetidos.
+
+    python -m benchmarks.bench_registro [--jugadores 5000] [--conflictos 0.05] [--latencia 0.0005] [--auto 2000]
+"""
+import argparse
+import math
+import random
+import re
+import sys
+import time
+from collections import Counter
+
+from mysql.connector import errorcode, errors
+
+from benchmarks import fake_db
+from config import REGISTRO_LOTE
+
+
+class BaseJugadores:
+    def __init__(self, sponsors):
+        self.por_user_id = {}
+        self.aliases = set()  # En minúsculas, como la collation de MySQL
+        self.celulares = set()
+        self.orden = []  # Alias en orden de registro: id_registro = posición + 1
+        self.referidos = Counter()  # Columna referidos, por alias en minúsculas
+        self.rotacion = 0  # sponsor_rotacion.siguiente
+        self.conexiones = []
+        for i, alias in enumerate(sponsors):
+            self.insertar(f"39{i:08d}", alias, None, str(10 ** 6 + i))
+
+    def insertar(self, celular, alias, sponsor, user_id):
+        self.por_user_id[str(user_id)] = {"numero_celular": celular, "alias": alias, "sponsor": sponsor}
+        self.aliases.add(alias.lower())
+        self.celulares.add(celular)
+        self.orden.append(alias)
+
+    def conflicto(self, celular, alias, user_id):
+        if str(user_id) in self.por_user_id:
+            return "PRIMARY"
+        if alias.lower() in self.aliases:
+            return "uq_jugadores_alias"
+        if celular in self.celulares:
+            return "uq_jugadores_celular"
+        return None
+
+    def consultas(self):
+        return sum(c.queries for c in self.conexiones)
+
+
+def _duplicado(clave):
+    return errors.IntegrityError(msg=f"Duplicate entry for key 'jugadores.{clave}'", errno=errorcode.ER_DUP_ENTRY)
+
+
+class CursorJugadores(fake_db.FakeCursor):
+    def execute(self, query, params=None):
+        super().execute(query, params)
+        base = self.conn.base
+        sql = " ".join(query.split())
+        self._filas = []
+        self.rowcount = 1
+        if sql.startswith("INSERT INTO jugadores (numero_celular, alias, sponsor, user_id) SELECT"):
+            celular, alias, user_id, sponsor = params
+            if sponsor.lower() not in base.aliases:
+                self.rowcount = 0
+                return
+            self._insertar([(celular, alias, sponsor, user_id)])
+        elif sql.startswith("INSERT INTO jugadores"):
+            self._insertar([params])
+        elif m := re.match(r"SELECT (\w+) FROM jugadores WHERE \w+ IN", sql):
+            columna = m.group(1)
+            buscados = {str(p).lower() for p in params}
+            self._filas = [{columna: uid if columna == "user_id" else j[columna]}
+                           for uid, j in base.por_user_id.items()
+                           if str(uid if columna == "user_id" else j[columna]).lower() in buscados]
+        elif sql.startswith("SELECT numero_celular FROM jugadores WHERE user_id"):
+            j = base.por_user_id.get(str(params[0]))
+            self._filas = [j] if j else []
+        elif sql.startswith("SELECT * FROM jugadores WHERE alias"):
+            self._filas = [j for j in base.por_user_id.values() if j["alias"] == params[0]][:1]
+        # Estrategias de bolas_locas.sponsors
+        elif sql.startswith("SELECT alias FROM jugadores ORDER BY id_registro DESC"):
+            self._filas = [{"alias": base.orden[-1]}] if base.orden else []
+        elif sql.startswith("SELECT alias FROM jugadores ORDER BY referidos, id_registro"):
+            if base.orden:
+                posicion = min(range(len(base.orden)), key=lambda i: (base.referidos[base.orden[i].lower()], i))
+                self._filas = [{"alias": base.orden[posicion]}]
+        elif sql.startswith("SELECT MAX(id_registro)"):
+            self._filas = [{"ultimo": len(base.orden) or None}]
+        elif sql.startswith("UPDATE sponsor_rotacion"):
+            base.rotacion += 1
+        elif sql.startswith("SELECT LAST_INSERT_ID()"):
+            self._filas = [{"turno": base.rotacion}]
+        elif sql.startswith("SELECT alias FROM jugadores WHERE id_registro >="):
+            self._filas = [{"alias": alias} for alias in base.orden[params[0] - 1:params[0]]]
+        elif m := re.match(r"UPDATE jugadores SET referidos = referidos \+ (\S+) WHERE alias", sql):
+            cantidad, alias = (1, params[0]) if m.group(1) == "1" else params
+            base.referidos[alias.lower()] += cantidad
+
+    def _insertar(self, filas):
+        base = self.conn.base
+        for celular, alias, _, user_id in filas:
+            clave = base.conflicto(celular, alias, user_id)
+            if clave:
+                raise _duplicado(clave)
+        for fila in filas:
+            base.insertar(*fila)
+
+    def executemany(self, query, seq):
+        seq = list(seq)
+        if query.startswith("UPDATE"):
+            # mysql-connector envía un UPDATE por fila
+            for fila in seq:
+                self.execute(query, fila)
+            return
+        super().execute(query)  # Un INSERT ... VALUES multi-fila es una sola sentencia
+        self._insertar(seq)
+
+    def fetchone(self):
+        return self._filas[0] if self._filas else None
+
+    def fetchall(self):
+        return self._filas
+
+
+class ConexionJugadores(fake_db.FakeConnection):
+    def __init__(self, base, latency):
+        super().__init__(latency=latency)
+        self.base = base
+
+    def cursor(self, dictionary=False, **kwargs):
+        return CursorJugadores(self, dictionary=dictionary)
+
+
+def campana(jugadores, conflictos, sponsors, seed=7):
+    """Filas de la campaña y el motivo esperado de cada conflicto sembrado."""
+    rnd = random.Random(seed)
+    filas, esperados = [], Counter()
+    for i in range(jugadores):
+        fila = {"user_id": str(2 * 10 ** 6 + i), "numero_celular": f"31{i:08d}", "alias": f"nuevo{i}",
+                "sponsor": rnd.choice(sponsors)}
+        if rnd.random() < conflictos:
+            tipo = rnd.choice(["alias_en_uso", "celular_en_uso", "sponsor_inexistente", "celular_invalido"])
+            if tipo == "alias_en_uso":
+                fila["alias"] = rnd.choice(sponsors).upper()
+            elif tipo == "celular_en_uso":
+                fila["numero_celular"] = "3900000000"
+            elif tipo == "sponsor_inexistente":
+                fila["sponsor"] = "nadie"
+            else:
+                fila["numero_celular"] = "12345"
+            esperados[tipo] += 1
+        filas.append(fila)
+    return filas, esperados
+
+
+# Lo que hacía handle_registrar_usuario antes, sin los mensajes
+def registrar_antes(fila):
+    from contextlib import closing
+    from bolas_locas.db import db_connection
+
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute("SELECT numero_celular FROM jugadores WHERE user_id = %s", (fila["user_id"],))
+        if cursor.fetchone():
+            return "usuario_registrado"
+    celular = re.sub(r"\D", "", fila["numero_celular"])
+    if not re.fullmatch(r"3\d{9}", celular):
+        return "celular_invalido"
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute("SELECT * FROM jugadores WHERE alias = %s", (fila["sponsor"],))
+        if not cursor.fetchone():
+            return "sponsor_inexistente"
+    try:
+        with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+            cursor.execute(
+                "INSERT INTO jugadores (numero_celular, alias, sponsor, user_id) VALUES (%s, %s, %s, %s)",
+                (celular, fila["alias"], fila["sponsor"], fila["user_id"])
+            )
+            conn.commit()
+    except Exception:
+        return "error"  # El bot solo podía decir "Hubo un error al registrar el usuario"
+    return None
+
+
+def registrar_uno_a_uno(fila):
+    from contextlib import closing
+    from bolas_locas import registro
+    from bolas_locas.db import db_connection
+
+    celular = registro.normalizar_celular(fila["numero_celular"])
+    if celular is None:
+        return registro.CELULAR_INVALIDO
+    try:
+        with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+            registro.registrar(conn, cursor, fila["user_id"], celular, fila["alias"], fila["sponsor"])
+    except registro.ConflictoRegistro as conflicto:
+        return conflicto.motivo
+    return None
+
+
+def correr(modo, filas, sponsors, latencia):
+    from bolas_locas import registro
+    from bolas_locas.db import get_pool
+
+    base = BaseJugadores(sponsors)
+    pool = get_pool()
+    pool.close()
+    pool._connect = lambda: base.conexiones.append(ConexionJugadores(base, latencia)) or base.conexiones[-1]
+
+    inicio = time.perf_counter()
+    if modo == "masivo":
+        resultado = registro.importar(filas)
+        motivos = Counter(r["motivo"] for r in resultado["rechazados"])
+    else:
+        registrar = registrar_antes if modo == "antes" else registrar_uno_a_uno
+        motivos = Counter(m for m in map(registrar, filas) if m)
+    segundos = time.perf_counter() - inicio
+    registrados = len(base.por_user_id) - len(sponsors)
+    return segundos, base.consultas(), registrados, motivos
+
+
+def campana_auto(jugadores):
+    return [{"user_id": str(3 * 10 ** 6 + i), "numero_celular": f"32{i:08d}", "alias": f"auto{i}", "sponsor": "auto"}
+            for i in range(jugadores)]
+
+
+def repartir(estrategia, filas, sponsors, latencia):
+    """Importa filas con sponsor "auto"; devuelve (registrados, referidos por sponsor, errores)."""
+    from bolas_locas import registro
+    from bolas_locas.db import get_pool
+
+    base = BaseJugadores(sponsors)
+    pool = get_pool()
+    pool.close()
+    pool._connect = lambda: base.conexiones.append(ConexionJugadores(base, latencia)) or base.conexiones[-1]
+
+    registro.importar(filas, estrategia=estrategia)
+    nuevos = base.orden[len(sponsors):]
+    asignados = Counter(base.por_user_id[f["user_id"]]["sponsor"].lower() for f in filas if f["user_id"] in base.por_user_id)
+
+    errores = []
+    if len(nuevos) != len(filas):
+        errores.append(f"registrados {len(nuevos)} de {len(filas)}")
+    if +base.referidos != asignados:
+        errores.append("los contadores de referidos no coinciden con los sponsors asignados")
+    if estrategia == "ultimo":
+        sponsor_de = {j["alias"]: j["sponsor"] for j in base.por_user_id.values()}
+        anteriores = [sponsors[-1]] + nuevos[:-1]
+        if any(sponsor_de[alias] != anterior for alias, anterior in zip(nuevos, anteriores)):
+            errores.append("algún jugador no quedó con el registrado justo antes")
+    elif estrategia == "menos_referidos":
+        # Cada lote se reparte entre quienes ya estaban registrados antes de empezarlo
+        parte = math.ceil(min(len(filas), REGISTRO_LOTE) / len(sponsors))
+        if max(asignados.values()) > parte:
+            errores.append(f"un sponsor recibió {max(asignados.values())} referidos (máximo esperado {parte})")
+    return len(nuevos), asignados, errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jugadores", type=int, default=5000)
+    parser.add_argument("--conflictos", type=float, default=0.05, help="fracción de filas con algún conflicto")
+    parser.add_argument("--latencia", type=float, default=0.0005, help="segundos por consulta en la base falsa")
+    parser.add_argument("--auto", type=int, default=2000, help="jugadores de la campaña con sponsor automático")
+    args = parser.parse_args()
+
+    sponsors = [f"sponsor{i}" for i in range(50)]
+    filas, esperados = campana(args.jugadores, args.conflictos, sponsors)
+    print(f"{args.jugadores} jugadores, conflictos sembrados: {dict(esperados)}")
+    for modo in ("antes", "uno_a_uno", "masivo"):
+        segundos, consultas, registrados, motivos = correr(modo, filas, sponsors, args.latencia)
+        ok = "OK" if motivos == esperados else "DISTINTOS"
+        print(f"  {modo:<10} {segundos:6.2f}s  consultas {consultas:6}  registrados {registrados}  "
+              f"rechazos {dict(motivos)} ({ok})")
+
+    print(f"{args.auto} jugadores con sponsor automático (importar, lotes de {REGISTRO_LOTE})")
+    fallas = 0
+    for estrategia in ("ultimo", "rotativo", "menos_referidos"):
+        registrados, asignados, errores = repartir(estrategia, campana_auto(args.auto), sponsors, args.latencia)
+        print(f"  {estrategia:<16} registrados {registrados}  sponsors distintos {len(asignados)}  "
+              f"máximo por sponsor {max(asignados.values(), default=0)}  ({'OK' if not errores else 'MAL'})")
+        for error in errores:
+            print(f"    ❌ {error}")
+        fallas += len(errores)
+    if fallas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
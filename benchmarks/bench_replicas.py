@@ -0,0 +1,163 @@
+"""
+Ruteo de lecturas a réplicas: a dónde va cada consulta de una sesión del bot.
+
+Simula jugadores que consultan sus tableros (Mis tableros abiertos, Consultar tablero,
+Mis tableros ganados, jugadores del tablero) y de vez en cuando compran, con dos réplicas falsas.
+Cuenta las consultas que atiende la primaria y cada réplica y verifica que:
+- las lecturas declaradas (@solo_lectura) vayan a las réplicas, repartidas
+- después de su propia compra, las lecturas del jugador vayan a la primaria
+- una réplica caída o atrasada deje de recibir lecturas (respaldo en la otra o en la
+  primaria) y vuelva a recibirlas cuando chequear_replicas() la ve sana
+
+    python -m benchmarks.bench_replicas [--jugadores 200] [--toques 20]
+"""
+import argparse
+import os
+import random
+from collections import Counter
+
+# La sesión simulada dura segundos: la ventana de lectura propia se achica en proporción
+os.environ.setdefault("DB_LECTURA_PROPIA_SEGUNDOS", "0.01")
+
+from benchmarks import fake_db  # noqa: E402
+
+
+class CursorReplica(fake_db.FakeCursor):
+    def execute(self, query, params=None):
+        super().execute(query, params)
+        self._estado = "REPLICA STATUS" in query or "SLAVE STATUS" in query
+        self._leido = False
+
+    def fetchone(self):
+        if self._estado:
+            return {"Seconds_Behind_Source": self.conn.nodo.retraso}
+        return super().fetchone()
+
+    def fetchmany(self, size):
+        # Una sola tanda por consulta
+        if self._leido:
+            return []
+        self._leido = True
+        return self.fetchall()[:size]
+
+
+class Nodo:
+    """Un servidor falso: cuenta consultas y puede caerse o atrasarse."""
+
+    def __init__(self, nombre, consultas):
+        self.nombre = nombre
+        self.consultas = consultas
+        self.caido = False
+        self.retraso = 0
+
+    def conectar(self):
+        if self.caido:
+            raise ConnectionRefusedError(f"{self.nombre} no responde")
+        return ConexionNodo(self)
+
+
+class ConexionNodo(fake_db.FakeConnection):
+    def __init__(self, nodo):
+        super().__init__(latency=0)
+        self.nodo = nodo
+
+    def cursor(self, dictionary=False, **kwargs):
+        self.nodo.consultas[self.nodo.nombre] += 1
+        return CursorReplica(self, dictionary=dictionary)
+
+
+def instalar(consultas):
+    from bolas_locas import db
+
+    primaria = Nodo("primaria", consultas)
+    pool = db.get_pool()
+    pool.close()
+    pool._connect = primaria.conectar
+
+    db.cerrar_replicas()
+    nodos = []
+    db._replicas = []
+    for nombre in ("replica1", "replica2"):
+        nodo = Nodo(nombre, consultas)
+        replica = db.Replica(nombre, {})
+        replica.pool._connect = nodo.conectar
+        db._replicas.append(replica)
+        nodos.append(nodo)
+    return nodos
+
+
+def leer(rnd, user_id):
+    from bolas_locas import webhook
+    from bolas_locas.db import usuario_en_curso
+
+    usuario_en_curso(user_id)  # Lo que hace el webhook con cada petición
+    opcion = rnd.randrange(4)
+    if opcion == 0:
+        webhook.handle_mis_tableros_abiertos(user_id)
+    elif opcion == 1:
+        webhook.handle_consulta_tablero(1)
+    elif opcion == 2:
+        webhook.handle_mis_tableros_ganados(user_id)
+    else:
+        webhook.leer_jugadores_tablero(1)
+
+
+def sesion(jugadores, toques, consultas):
+    """Lecturas por jugador con alguna compra; devuelve las lecturas post-compra que no fueron a la primaria."""
+    from bolas_locas import webhook
+
+    rnd = random.Random(7)
+    fallas = 0
+    for _ in range(jugadores * toques):
+        user_id = rnd.randint(1, jugadores)
+        if rnd.random() < 0.05:
+            webhook.comprar_bolitas(user_id, 1, 5)
+            antes = consultas["primaria"]
+            leer(rnd, user_id)
+            fallas += consultas["primaria"] == antes
+        else:
+            leer(rnd, user_id)
+    return fallas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jugadores", type=int, default=200)
+    parser.add_argument("--toques", type=int, default=20, help="toques por jugador")
+    args = parser.parse_args()
+
+    from bolas_locas.db import chequear_replicas, get_replicas
+    from config import DB_REPLICA_MAX_LAG
+
+    consultas = Counter()
+    replica1, replica2 = instalar(consultas)
+    toques = args.jugadores * args.toques
+
+    fallas = sesion(args.jugadores, args.toques, consultas)
+    print(f"{toques} toques de {args.jugadores} jugadores (5% compras)")
+    print(f"  réplicas sanas:  {dict(consultas)}  lecturas propias fuera de la primaria: {fallas}")
+
+    consultas.clear()
+    replica1.caido = True
+    get_replicas()[0].pool.close()  # Sus conexiones se cortan y no puede abrir nuevas
+    fallas = sesion(args.jugadores, args.toques, consultas)
+    sanas = [r.nombre for r in get_replicas() if r.sana]
+    print(f"  replica1 caída:  {dict(consultas)}  sanas: {sanas}  lecturas propias fuera de la primaria: {fallas}")
+
+    consultas.clear()
+    replica2.retraso = DB_REPLICA_MAX_LAG + 1
+    chequear_replicas()
+    sesion(args.jugadores, args.toques, consultas)
+    sanas = [r.nombre for r in get_replicas() if r.sana]
+    print(f"  + replica2 atrasada: {dict(consultas)}  sanas: {sanas}")
+
+    consultas.clear()
+    replica1.caido, replica2.retraso = False, 0
+    chequear_replicas()
+    sesion(args.jugadores, args.toques, consultas)
+    sanas = [r.nombre for r in get_replicas() if r.sana]
+    print(f"  recuperadas:     {dict(consultas)}  sanas: {sanas}")
+
+
+if __name__ == "__main__":
+    main()
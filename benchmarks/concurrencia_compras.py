@@ -0,0 +1,133 @@
+"""
+Prueba de concurrencia de compras: dispara compras en paralelo contra un mismo tablero
+y verifica que no se rompan los invariantes.
+
+Necesita un MySQL de pruebas (usa config.py / variables MYSQL*). Modifica el saldo de
+los jugadores elegidos, así que NO correr contra producción.
+
+    python -m benchmarks.concurrencia_compras --tablero 4 --jugadores 20 --compras 10 --hilos 32 --si
+    python -m benchmarks.concurrencia_compras --tablero 4 --agrupadas --si   # por lotes (compras_agrupadas)
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from bolas_locas.compras_agrupadas import ColaCompras
+from bolas_locas.db import db_connection
+from bolas_locas.esquema import EsquemaIncompleto, verificar_claves
+from bolas_locas.webhook import comprar_bolitas
+
+
+def snapshot(id_tablero, user_ids):
+    marcadores = ", ".join(["%s"] * len(user_ids))
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute(f"SELECT user_id, saldo FROM jugadores WHERE user_id IN ({marcadores})", user_ids)
+        saldos = {r["user_id"]: r["saldo"] for r in cursor.fetchall()}
+        cursor.execute(
+            f"""SELECT user_id, COALESCE(SUM(cantidad_bolitas), 0) AS bolitas, COALESCE(SUM(monto_pagado), 0) AS pagado
+                FROM jugadores_tableros WHERE id_tablero = %s AND user_id IN ({marcadores}) GROUP BY user_id""",
+            [id_tablero, *user_ids],
+        )
+        compras = {r["user_id"]: r for r in cursor.fetchall()}
+        cursor.execute(
+            "SELECT COALESCE(SUM(cantidad_bolitas), 0) AS bolitas, COALESCE(SUM(monto_pagado), 0) AS pagado FROM jugadores_tableros WHERE id_tablero = %s",
+            (id_tablero,),
+        )
+        log = cursor.fetchone()
+        cursor.execute(
+            "SELECT COUNT(*) AS filas, COALESCE(SUM(acum_bolitas), 0) AS acum_bolitas, COALESCE(SUM(monto_acumulado), 0) AS monto_acumulado FROM jackpots WHERE id_tablero = %s",
+            (id_tablero,),
+        )
+        jackpot = cursor.fetchone()
+        cursor.execute("SELECT min_bolitas_por_jugador, max_bolitas_por_jugador FROM tableros WHERE id_tablero = %s", (id_tablero,))
+        tablero = cursor.fetchone()
+    return saldos, compras, log, jackpot, tablero
+
+
+async def comprar_agrupadas(id_tablero, pedidos):
+    cola = ColaCompras()
+    respuestas = await asyncio.gather(*(cola.comprar(user_id, id_tablero, cantidad) for user_id, cantidad in pedidos))
+    await cola.detener()
+    return respuestas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tablero", type=int, required=True)
+    parser.add_argument("--jugadores", type=int, default=20)
+    parser.add_argument("--compras", type=int, default=10, help="compras por jugador")
+    parser.add_argument("--hilos", type=int, default=32)
+    parser.add_argument("--saldo", type=int, default=50000, help="saldo inicial de cada jugador")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--agrupadas", action="store_true", help="comprar por lotes con ColaCompras en vez de una transacción por compra")
+    parser.add_argument("--si", action="store_true", help="confirmar que la base es de pruebas")
+    args = parser.parse_args()
+
+    if not args.si:
+        sys.exit("Este script modifica saldos. Agrega --si si la base es de pruebas.")
+    # Sin UNIQUE(id_tablero) el upsert de cada compra agrega otra fila a jackpots
+    try:
+        verificar_claves()
+    except EsquemaIncompleto as e:
+        sys.exit(f"❌ {e}")
+
+    with db_connection() as conn, closing(conn.cursor()) as cursor:
+        cursor.execute("SELECT user_id FROM jugadores ORDER BY user_id LIMIT %s", (args.jugadores,))
+        user_ids = [r[0] for r in cursor.fetchall()]
+        marcadores = ", ".join(["%s"] * len(user_ids))
+        cursor.execute(f"UPDATE jugadores SET saldo = %s WHERE user_id IN ({marcadores})", [args.saldo, *user_ids])
+        conn.commit()
+
+    saldos_0, compras_0, log_0, jackpot_0, tablero = snapshot(args.tablero, user_ids)
+
+    rnd = random.Random(args.seed)
+    pedidos = [
+        (user_id, rnd.randint(tablero["min_bolitas_por_jugador"], tablero["max_bolitas_por_jugador"]))
+        for user_id in user_ids
+        for _ in range(args.compras)
+    ]
+    rnd.shuffle(pedidos)
+
+    inicio = time.perf_counter()
+    if args.agrupadas:
+        respuestas = asyncio.run(comprar_agrupadas(args.tablero, pedidos))
+    else:
+        with ThreadPoolExecutor(max_workers=args.hilos) as pool:
+            respuestas = list(pool.map(lambda p: comprar_bolitas(p[0], args.tablero, p[1]), pedidos))
+    segundos = time.perf_counter() - inicio
+
+    saldos_1, compras_1, log_1, jackpot_1, _ = snapshot(args.tablero, user_ids)
+
+    errores = []
+    for user_id in user_ids:
+        if saldos_1[user_id] < 0:
+            errores.append(f"saldo negativo para {user_id}: {saldos_1[user_id]}")
+        bolitas = compras_1.get(user_id, {}).get("bolitas", 0)
+        if bolitas > tablero["max_bolitas_por_jugador"] and bolitas != compras_0.get(user_id, {}).get("bolitas", 0):
+            errores.append(f"{user_id} superó el límite: {bolitas} > {tablero['max_bolitas_por_jugador']}")
+        pagado = compras_1.get(user_id, {}).get("pagado", 0) - compras_0.get(user_id, {}).get("pagado", 0)
+        if saldos_0[user_id] - saldos_1[user_id] != pagado:
+            errores.append(f"{user_id}: debitado {saldos_0[user_id] - saldos_1[user_id]} pero registrado {pagado}")
+
+    if jackpot_1["filas"] > 1:
+        errores.append(f"el tablero {args.tablero} tiene {jackpot_1['filas']} filas en jackpots")
+    if jackpot_1["acum_bolitas"] - jackpot_0["acum_bolitas"] != log_1["bolitas"] - log_0["bolitas"]:
+        errores.append("jackpots.acum_bolitas no coincide con jugadores_tableros")
+    if jackpot_1["monto_acumulado"] - jackpot_0["monto_acumulado"] != log_1["pagado"] - log_0["pagado"]:
+        errores.append("jackpots.monto_acumulado no coincide con jugadores_tableros")
+
+    exitosas = sum(1 for r in respuestas if r.startswith("✅"))
+    print(f"{len(pedidos)} compras en {segundos:.3f}s ({len(pedidos) / segundos:,.1f}/s), {exitosas} exitosas")
+    for error in errores:
+        print(f"❌ {error}")
+    if errores:
+        sys.exit(1)
+    print("✅ Invariantes OK")
+
+
+if __name__ == "__main__":
+    main()
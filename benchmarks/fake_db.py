@@ -0,0 +1,121 @@
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+
+# Fila genérica con todas las columnas que leen los handlers de webhook.py
+FILA_GENERICA = {
+    "id_tablero": 1,
+    "nombre": "Tablero",
+    "precio_por_bolita": Decimal("1000"),
+    "id_album": 1,
+    "descripcion": "Álbum",
+    "precio": Decimal("20000"),
+    "max_bolitas": 10000,
+    "min_bolitas_por_jugador": 1,
+    "max_bolitas_por_jugador": 100,
+    "estado": "abierto",
+    "fecha_creacion": datetime(2025, 1, 1),
+    "mes": date(2025, 1, 1),
+    "saldo": Decimal("1000000"),
+    "numero_celular": "3000000000",
+    "alias": "jugador",
+    "sponsor": "sponsor",
+    "user_id": 1,
+    "inscritos": 10,
+    "bolitas_compradas": 100,
+    "compradas": 100,
+    "compradas_por_jugador": 0,
+    "cantidad_bolitas": 5,
+    "jugadores": 10,
+    "monto_acumulado": Decimal("100000"),
+    "acum_bolitas": 100,
+    "premio_ganador": Decimal("60000"),
+    "premio_sponsor": Decimal("6000"),
+    "ganancia_bruta": Decimal("34000"),
+    "porcentaje_casa": Decimal("0.34"),
+    "porcentaje_sponsor": Decimal("0.06"),
+    "porcentaje_ganador": Decimal("0.60"),
+    "alias_ganador": None,
+    "sponsor_ganador": None,
+    "link_soporte": None,
+    "fecha_pago": None,
+    "bolitas_compradas_usuario": 5,
+    "bolitas_totales_tablero": 100,
+    "acumulado_tablero": Decimal("60000"),
+}
+
+# Lo que devuelve information_schema.statistics: (index_name, non_unique, column_name).
+# Arrancar la app revisa que jackpots tenga UNIQUE(id_tablero) (esquema.verificar_claves)
+INDICES = [("uq_jackpots_tablero", 0, "id_tablero")]
+
+
+class FakeCursor:
+    """Cursor que simula la latencia de MySQL con un sleep bloqueante por consulta."""
+
+    indices = False
+
+    def __init__(self, conn, dictionary=False):
+        self.conn = conn
+        self.dictionary = dictionary
+        self.lastrowid = 1
+        self.rowcount = 1
+
+    def execute(self, query, params=None):
+        self.conn.queries += 1
+        self.indices = "information_schema.statistics" in query
+        time.sleep(self.conn.latency)
+
+    def executemany(self, query, seq):
+        self.execute(query)
+
+    def fetchone(self):
+        return dict(FILA_GENERICA)
+
+    def fetchall(self):
+        if self.indices:
+            return list(INDICES)
+        return [dict(FILA_GENERICA) for _ in range(self.conn.rows)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Conexión de reemplazo para benchmarks sin MySQL local."""
+
+    unread_result = False
+    in_transaction = False
+
+    def __init__(self, latency=0.005, rows=10):
+        self.latency = latency
+        self.rows = rows
+        self.queries = 0
+
+    def cursor(self, dictionary=False, **kwargs):
+        return FakeCursor(self, dictionary=dictionary)
+
+    def commit(self):
+        time.sleep(self.latency)
+
+    def rollback(self):
+        pass
+
+    def start_transaction(self, **kwargs):
+        pass
+
+    def ping(self, **kwargs):
+        pass
+
+    def close(self):
+        pass
+
+
+def install(latency=0.005, rows=10):
+    """Hace que el pool del proceso entregue conexiones falsas."""
+    from bolas_locas import db
+
+    pool = db.get_pool()
+    pool.close()
+    pool._connect = lambda: FakeConnection(latency=latency, rows=rows)
+    return pool
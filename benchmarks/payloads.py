@@ -0,0 +1,65 @@
+"""Generadores de payloads de Dialogflow para cada acción que enruta /webhook."""
+import random
+
+
+def payload(action, user_id=1, callback=False, **parameters):
+    origen = {"from": {"id": user_id}}
+    data = {"callback_query": origen} if callback else origen
+    return {
+        "originalDetectIntentRequest": {"payload": {"data": data}},
+        "queryResult": {"action": action, "parameters": parameters},
+    }
+
+
+def _celular(rnd):
+    return "3" + "".join(str(rnd.randint(0, 9)) for _ in range(9))
+
+
+# Cada generador recibe (rnd, user_id, contexto) y devuelve el payload.
+# contexto: {"tableros": [...], "tablero_cerrado": id, "mes": m, "anio": a}
+GENERADORES = {
+    "actDatosCuenta": lambda rnd, u, ctx: payload("actDatosCuenta", u),
+    "actCambiarNequi": lambda rnd, u, ctx: payload("actCambiarNequi", u, rtaNuevoNequi=_celular(rnd)),
+    "actJugar": lambda rnd, u, ctx: payload("actJugar", u, callback=True),
+    "actRegistrarUsuario": lambda rnd, u, ctx: payload(
+        "actRegistrarUsuario", u,
+        rtaCelularNequi=_celular(rnd), rtaAlias=f"bench{u}_{rnd.randint(0, 10**6)}", rtaSponsor="auto",
+    ),
+    "actTableroSelect": lambda rnd, u, ctx: payload(
+        "actTableroSelect", u, callback=True, rtaTableroID=f"|{rnd.choice(ctx['tableros'])}"
+    ),
+    "actComprarBolitas": lambda rnd, u, ctx: payload(
+        "actComprarBolitas", u, callback=True,
+        rtaTableroID=f"|{rnd.choice(ctx['tableros'])}", rtaCantBolitas=float(rnd.randint(1, 5)),
+    ),
+    "actMisTabAbiertos": lambda rnd, u, ctx: payload("actMisTabAbiertos", u),
+    "actMisTabJugados": lambda rnd, u, ctx: payload("actMisTabJugados", u, rtaMes=ctx["mes"], rtaAnio=ctx["anio"]),
+    "actConsultaTablero": lambda rnd, u, ctx: payload("actConsultaTablero", u, rtaIDTablero=ctx["tablero_cerrado"]),
+    "actMisTabGanados": lambda rnd, u, ctx: payload("actMisTabGanados", u),
+    "actComprarAlbum": lambda rnd, u, ctx: payload("actComprarAlbum", u),
+    "actComprarAlbumMiniApp": lambda rnd, u, ctx: payload("actComprarAlbumMiniApp", u),
+}
+
+# Mezcla por defecto: lecturas frecuentes, compras moderadas, registro y cambios raros
+PESOS_POR_DEFECTO = {
+    "actJugar": 20,
+    "actTableroSelect": 20,
+    "actComprarBolitas": 15,
+    "actDatosCuenta": 10,
+    "actMisTabAbiertos": 10,
+    "actMisTabJugados": 5,
+    "actConsultaTablero": 5,
+    "actMisTabGanados": 5,
+    "actComprarAlbum": 4,
+    "actComprarAlbumMiniApp": 3,
+    "actCambiarNequi": 2,
+    "actRegistrarUsuario": 1,
+}
+
+
+def secuencia(total, pesos, user_ids, contexto, seed=None):
+    """Lista reproducible de (accion, payload)."""
+    rnd = random.Random(seed)
+    acciones = list(pesos)
+    elegidas = rnd.choices(acciones, weights=[pesos[a] for a in acciones], k=total)
+    return [(a, GENERADORES[a](rnd, rnd.choice(user_ids), contexto)) for a in elegidas]
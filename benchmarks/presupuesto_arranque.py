@@ -0,0 +1,122 @@
+"""
+Chequeo del presupuesto de arranque (para CI o antes de desplegar).
+
+En procesos nuevos de Python mide:
+- importar bolas_locas.webhook: debe ser rápido y sin efectos secundarios
+  (nada impreso, sin hilos, sin `requests` cargado, sin app propia)
+- tiempo hasta la primera respuesta: importar bolas_locas.main, correr el lifespan
+  (calentamiento de pool y cachés contra la base falsa) y atender un /webhook actJugar
+
+Sale con código 1 si algún valor (mediana de --repeticiones) supera su presupuesto.
+
+    python -m benchmarks.presupuesto_arranque [--max-import-ms 900] [--max-primera-ms 1500]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEDIR_IMPORT = r"""
+import json, sys, threading, time
+inicio = time.perf_counter()
+import bolas_locas.webhook as webhook
+ms = (time.perf_counter() - inicio) * 1000
+print(json.dumps({
+    "ms": ms,
+    "hilos": threading.active_count(),
+    "requests_cargado": "requests" in sys.modules,
+    "simulacion_cargada": "bolas_locas.simulacion" in sys.modules,
+    "app_propia": hasattr(webhook, "app"),
+}))
+"""
+
+MEDIR_PRIMERA = r"""
+import asyncio, json, time
+inicio = time.perf_counter()
+from benchmarks import fake_db
+fake_db.install(latency=LATENCIA, rows=3)
+from benchmarks.payloads import payload
+import httpx
+from bolas_locas.main import app
+importado = time.perf_counter()
+
+async def main():
+    async with app.router.lifespan_context(app):
+        listo = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://arranque") as client:
+            r = await client.post("/webhook", json=payload("actJugar"))
+        return listo, r.status_code
+
+listo, estado = asyncio.run(main())
+fin = time.perf_counter()
+print(json.dumps({
+    "import_ms": (importado - inicio) * 1000,
+    "lifespan_ms": (listo - importado) * 1000,
+    "primera_ms": (fin - inicio) * 1000,
+    "estado": estado,
+}))
+"""
+
+
+def correr(codigo):
+    r = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True, check=True)
+    lineas = r.stdout.strip().splitlines()
+    # La última línea es la medición; cualquier otra salida es un efecto secundario
+    return json.loads(lineas[-1]), lineas[:-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-import-ms", type=float, default=900)
+    parser.add_argument("--max-primera-ms", type=float, default=1500)
+    parser.add_argument("--latencia", type=float, default=0.002, help="segundos por consulta en la base falsa")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    fallas = []
+
+    imports = []
+    for _ in range(args.repeticiones):
+        medicion, salida = correr(MEDIR_IMPORT)
+        imports.append(medicion["ms"])
+        if salida:
+            fallas.append(f"importar webhook imprimió {len(salida)} línea(s): {salida[0]!r}")
+        for clave in ("requests_cargado", "simulacion_cargada", "app_propia"):
+            if medicion[clave]:
+                fallas.append(f"importar webhook dejó {clave}=True")
+        if medicion["hilos"] != 1:
+            fallas.append(f"importar webhook arrancó hilos ({medicion['hilos']} activos)")
+
+    primeras = []
+    for _ in range(args.repeticiones):
+        medicion, _ = correr(MEDIR_PRIMERA.replace("LATENCIA", repr(args.latencia)))
+        primeras.append(medicion)
+        if medicion["estado"] != 200:
+            fallas.append(f"la primera petición respondió {medicion['estado']}")
+
+    import_ms = statistics.median(imports)
+    primera_ms = statistics.median(m["primera_ms"] for m in primeras)
+    print(f"import bolas_locas.webhook      {import_ms:8.1f} ms  (presupuesto {args.max_import_ms:.0f} ms)")
+    print(f"  import bolas_locas.main       {statistics.median(m['import_ms'] for m in primeras):8.1f} ms")
+    print(f"  lifespan (pool + cachés)      {statistics.median(m['lifespan_ms'] for m in primeras):8.1f} ms")
+    print(f"primera respuesta               {primera_ms:8.1f} ms  (presupuesto {args.max_primera_ms:.0f} ms)")
+
+    if import_ms > args.max_import_ms:
+        fallas.append(f"import {import_ms:.0f} ms > {args.max_import_ms:.0f} ms")
+    if primera_ms > args.max_primera_ms:
+        fallas.append(f"primera respuesta {primera_ms:.0f} ms > {args.max_primera_ms:.0f} ms")
+
+    for falla in dict.fromkeys(fallas):
+        print(f"❌ {falla}")
+    if fallas:
+        sys.exit(1)
+    print("✅ Arranque dentro del presupuesto.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Benchmark de /webhook: reproduce una mezcla realista de acciones de Dialogflow y reporta
+throughput y latencias p50/p95/p99 por acción.
+
+Destino:
+  --modo proceso   la app corre en este proceso (httpx + ASGI), sin red
+  --modo http      contra un servidor ya levantado (--url http://127.0.0.1:8000)
+
+Base de datos (solo modo proceso):
+  --db falsa       conexiones de reemplazo con latencia fija (--latencia) y --filas filas por consulta
+  --db mysql       la base de config.py; con --sembrar-jugadores/--sembrar-compras se siembra antes
+
+En modo proceso también cuenta como error la excepción que un handler atrapa, registra con
+log.exception y contesta con un 200: la latencia de esa petición sería la de la rama de error.
+
+Los resultados se guardan en JSON con claves ordenadas para poder comparar corridas:
+
+    python -m benchmarks.replay_webhook --peticiones 2000 --concurrencia 50 --salida base.json
+    python -m benchmarks.replay_webhook --peticiones 2000 --concurrencia 50 --comparar base.json
+"""
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from datetime import date
+
+import httpx
+
+from benchmarks.payloads import GENERADORES, PESOS_POR_DEFECTO, secuencia
+
+
+# Excepciones registradas durante la petición en curso; run_db copia el contexto al hilo de la DB
+_excepciones = contextvars.ContextVar("excepciones", default=None)
+
+
+class ContarExcepciones(logging.Handler):
+    """Anota en la petición en curso cada log con excepción (log.exception) de bolas_locas."""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record):
+        excepciones = _excepciones.get()
+        if record.exc_info and excepciones is not None:
+            excepciones.append(record.exc_info[0].__name__)
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
+
+
+def resumir(latencias, errores, segundos):
+    ordenados = sorted(latencias)
+    return {
+        "peticiones": len(latencias),
+        "errores": errores,
+        "rps": round(len(latencias) / segundos, 2) if segundos else 0.0,
+        "media_ms": round(sum(ordenados) / len(ordenados), 3) if ordenados else 0.0,
+        "p50_ms": round(percentil(ordenados, 50), 3),
+        "p95_ms": round(percentil(ordenados, 95), 3),
+        "p99_ms": round(percentil(ordenados, 99), 3),
+        "max_ms": round(ordenados[-1], 3) if ordenados else 0.0,
+    }
+
+
+async def ejecutar(client, pedidos, concurrencia):
+    latencias = {}
+    errores = {}
+    cola = asyncio.Queue()
+    for pedido in pedidos:
+        cola.put_nowait(pedido)
+
+    async def trabajador():
+        while True:
+            try:
+                accion, body = cola.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            excepciones = []
+            _excepciones.set(excepciones)
+            inicio = time.perf_counter()
+            try:
+                r = await client.post("/webhook", json=body)
+                fallo = r.status_code >= 400 or bool(excepciones)
+            except httpx.HTTPError:
+                fallo = True
+            latencias.setdefault(accion, []).append((time.perf_counter() - inicio) * 1000)
+            if fallo:
+                errores[accion] = errores.get(accion, 0) + 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    return latencias, errores, time.perf_counter() - inicio
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _pesos(texto):
+    if not texto:
+        return dict(PESOS_POR_DEFECTO)
+    pesos = {}
+    for parte in texto.split(","):
+        accion, _, peso = parte.partition("=")
+        if accion not in GENERADORES:
+            sys.exit(f"Acción desconocida: {accion}. Opciones: {', '.join(sorted(GENERADORES))}")
+        pesos[accion] = float(peso or 1)
+    return pesos
+
+
+def _preparar_db(args):
+    """Devuelve (user_ids, contexto) para generar los payloads."""
+    hoy = date.today()
+    contexto = {"tableros": [1], "tablero_cerrado": 1, "mes": hoy.month, "anio": hoy.year}
+
+    if args.modo == "http" or args.db == "falsa":
+        if args.modo == "proceso":
+            from benchmarks import fake_db
+            fake_db.install(latency=args.latencia, rows=args.filas)
+        return list(range(1, args.usuarios + 1)), contexto
+
+    from contextlib import closing
+    from bolas_locas.db import db_connection
+
+    if args.sembrar_compras:
+        from bolas_locas.simulacion import simular_compras_masivas
+        with db_connection() as conn, closing(conn.cursor()) as cursor:
+            cursor.execute("SELECT id_tablero FROM tableros WHERE estado = 'abierto'")
+            abiertos = [r[0] for r in cursor.fetchall()]
+        simular_compras_masivas(
+            abiertos, jugadores=args.sembrar_jugadores, compras_por_jugador=args.sembrar_compras,
+            seed=args.seed, saldo_inicial=10**9, crear_jugadores=True,
+        )
+
+    with db_connection() as conn, closing(conn.cursor()) as cursor:
+        cursor.execute("SELECT user_id FROM jugadores ORDER BY user_id LIMIT %s", (args.usuarios,))
+        user_ids = [r[0] for r in cursor.fetchall()]
+        cursor.execute("SELECT id_tablero FROM tableros WHERE estado = 'abierto'")
+        contexto["tableros"] = [r[0] for r in cursor.fetchall()] or [1]
+        cursor.execute("SELECT id_tablero FROM tableros WHERE estado != 'abierto' ORDER BY id_tablero DESC LIMIT 1")
+        cerrado = cursor.fetchone()
+        contexto["tablero_cerrado"] = cerrado[0] if cerrado else contexto["tableros"][0]
+    return user_ids or [1], contexto
+
+
+def comparar(actual, base):
+    print(f"\n{'acción':<24}{'p50 base':>10}{'p50':>10}{'Δ%':>8}{'p99 base':>10}{'p99':>10}{'Δ%':>8}{'rps Δ%':>9}")
+    for accion in sorted(set(actual["acciones"]) | set(base["acciones"])):
+        a = actual["acciones"].get(accion)
+        b = base["acciones"].get(accion)
+        if not a or not b:
+            print(f"{accion:<24} (solo en {'actual' if a else 'base'})")
+            continue
+
+        def delta(x, y):
+            return f"{(x - y) / y * 100:+.1f}" if y else "n/a"
+
+        print(f"{accion:<24}{b['p50_ms']:>10.2f}{a['p50_ms']:>10.2f}{delta(a['p50_ms'], b['p50_ms']):>8}"
+              f"{b['p99_ms']:>10.2f}{a['p99_ms']:>10.2f}{delta(a['p99_ms'], b['p99_ms']):>8}{delta(a['rps'], b['rps']):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modo", choices=("proceso", "http"), default="proceso")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--db", choices=("falsa", "mysql"), default="falsa")
+    parser.add_argument("--latencia", type=float, default=0.002, help="segundos por consulta con --db falsa")
+    parser.add_argument("--filas", type=int, default=20, help="filas por consulta con --db falsa")
+    parser.add_argument("--sembrar-jugadores", type=int, default=1000)
+    parser.add_argument("--sembrar-compras", type=int, default=0, help="compras por jugador a sembrar con --db mysql")
+    parser.add_argument("--usuarios", type=int, default=500, help="usuarios distintos en los payloads")
+    parser.add_argument("--peticiones", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--calentamiento", type=int, default=100)
+    parser.add_argument("--acciones", default="", help="pesos, p. ej. actJugar=5,actComprarBolitas=2")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--salida", help="guardar resultados en este JSON")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--verbose", action="store_true", help="no silenciar la salida de los handlers")
+    args = parser.parse_args()
+
+    user_ids, contexto = _preparar_db(args)
+    pesos = _pesos(args.acciones)
+    calentamiento = secuencia(args.calentamiento, pesos, user_ids, contexto, seed=args.seed + 1)
+    pedidos = secuencia(args.peticiones, pesos, user_ids, contexto, seed=args.seed)
+
+    async def correr():
+        if args.modo == "proceso":
+            from bolas_locas.main import app
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+        else:
+            limites = httpx.Limits(max_connections=args.concurrencia, max_keepalive_connections=args.concurrencia)
+            client = httpx.AsyncClient(base_url=args.url, limits=limites, timeout=30)
+        async with client:
+            await ejecutar(client, calentamiento, args.concurrencia)
+            return await ejecutar(client, pedidos, args.concurrencia)
+
+    contador = ContarExcepciones()
+    logging.getLogger("bolas_locas").addHandler(contador)
+    silencio = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with silencio:
+            latencias, errores, segundos = asyncio.run(correr())
+    finally:
+        logging.getLogger("bolas_locas").removeHandler(contador)
+
+    todas = [ms for lista in latencias.values() for ms in lista]
+    resultado = {
+        "parametros": {
+            "modo": args.modo,
+            "db": args.db if args.modo == "proceso" else "remota",
+            "latencia_s": args.latencia if args.db == "falsa" else None,
+            "filas": args.filas if args.db == "falsa" else None,
+            "peticiones": args.peticiones,
+            "concurrencia": args.concurrencia,
+            "usuarios": len(user_ids),
+            "seed": args.seed,
+            "pesos": pesos,
+        },
+        "commit": _commit_actual(),
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "total": resumir(todas, sum(errores.values()), segundos),
+        "acciones": {a: resumir(latencias[a], errores.get(a, 0), segundos) for a in sorted(latencias)},
+    }
+
+    print(f"{'acción':<24}{'n':>7}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for accion, r in list(resultado["acciones"].items()) + [("TOTAL", resultado["total"])]:
+        print(f"{accion:<24}{r['peticiones']:>7}{r['errores']:>6}{r['rps']:>10.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, sort_keys=True, ensure_ascii=False)
+            f.write("\n")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(resultado, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
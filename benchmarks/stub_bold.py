@@ -0,0 +1,155 @@
+"""
+Servidor falso de la API de Bold para pruebas y benchmarks del cliente de pagos.
+
+    python -m benchmarks.stub_bold --port 8099 --latencia 0.05 --tasa-error 0.1
+
+POST /payments crea un pago (respeta Idempotency-Key: la misma clave devuelve el mismo pago)
+GET  /payments/{referencia} devuelve el estado
+POST /_control cambia el comportamiento en caliente, p. ej. {"modo": "caido"}
+GET  /_stats   cuenta peticiones, conexiones TCP y pagos creados
+
+Modos: "ok", "caido" (responde 503), "colgado" (no responde hasta --colgado-segundos),
+"rechazo" (responde 400). --tasa-error agrega 500 aleatorios en modo "ok".
+
+Apuntar la app al stub: BOLD_API_URL=http://127.0.0.1:8099
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+import uuid
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+class EstadoStub:
+    def __init__(self, latencia=0.0, tasa_error=0.0, modo="ok", colgado_segundos=60.0, seed=None):
+        self.latencia = latencia
+        self.tasa_error = tasa_error
+        self.modo = modo
+        self.colgado_segundos = colgado_segundos
+        self.rnd = random.Random(seed)
+        self.peticiones = 0
+        self.pagos = {}  # referencia -> pago
+        self.por_clave = {}  # Idempotency-Key -> referencia
+        self.duplicados_evitados = 0
+        self.conexiones = set()  # (host, puerto) del cliente: cada uno es una conexión TCP distinta
+
+
+def crear_app(estado):
+    async def comportamiento(request):
+        estado.peticiones += 1
+        estado.conexiones.add(tuple(request.client or ()))
+        if estado.modo == "colgado":
+            await asyncio.sleep(estado.colgado_segundos)
+        if estado.latencia:
+            await asyncio.sleep(estado.latencia)
+        if estado.modo == "caido":
+            return JSONResponse({"error": "service unavailable"}, status_code=503)
+        if estado.modo == "rechazo":
+            return JSONResponse({"error": "invalid request"}, status_code=400)
+        if estado.tasa_error and estado.rnd.random() < estado.tasa_error:
+            return JSONResponse({"error": "internal error"}, status_code=500)
+        return None
+
+    async def crear_pago(request: Request):
+        error = await comportamiento(request)
+        if error is not None:
+            return error
+        datos = await request.json()
+        clave = request.headers.get("idempotency-key")
+        if clave and clave in estado.por_clave:
+            estado.duplicados_evitados += 1
+            pago = estado.pagos[estado.por_clave[clave]]
+        else:
+            referencia = datos.get("reference") or uuid.uuid4().hex
+            pago = {
+                "reference": referencia,
+                "status": "pendiente",
+                "amount": datos.get("amount"),
+                "payment_url": f"https://checkout.bold.test/{referencia}",
+            }
+            estado.pagos[referencia] = pago
+            if clave:
+                estado.por_clave[clave] = referencia
+        return JSONResponse(pago, status_code=201)
+
+    async def consultar_pago(request: Request):
+        error = await comportamiento(request)
+        if error is not None:
+            return error
+        pago = estado.pagos.get(request.path_params["referencia"])
+        if pago is None:
+            return JSONResponse({"error": "not found"}, status_code=404)
+        return JSONResponse(pago)
+
+    async def control(request: Request):
+        for clave, valor in (await request.json()).items():
+            setattr(estado, clave, valor)
+        return JSONResponse({"modo": estado.modo, "latencia": estado.latencia, "tasa_error": estado.tasa_error})
+
+    async def stats(request: Request):
+        return JSONResponse({
+            "peticiones": estado.peticiones,
+            "pagos": len(estado.pagos),
+            "duplicados_evitados": estado.duplicados_evitados,
+            "conexiones": len(estado.conexiones),
+        })
+
+    return Starlette(routes=[
+        Route("/payments", crear_pago, methods=["POST"]),
+        Route("/payments/{referencia}", consultar_pago, methods=["GET"]),
+        Route("/_control", control, methods=["POST"]),
+        Route("/_stats", stats, methods=["GET"]),
+    ])
+
+
+class StubEnHilo:
+    """Levanta el stub con uvicorn en un hilo aparte (para benchmarks que necesitan sockets reales)."""
+
+    def __init__(self, estado, port=0, host="127.0.0.1"):
+        import uvicorn
+
+        self.estado = estado
+        config = uvicorn.Config(crear_app(estado), host=host, port=port, log_level="warning", lifespan="off")
+        self.server = uvicorn.Server(config)
+        self.hilo = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.hilo.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.hilo.join(timeout=5)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latencia", type=float, default=0.0)
+    parser.add_argument("--tasa-error", type=float, default=0.0)
+    parser.add_argument("--modo", choices=("ok", "caido", "colgado", "rechazo"), default="ok")
+    parser.add_argument("--colgado-segundos", type=float, default=60.0)
+    args = parser.parse_args()
+
+    estado = EstadoStub(args.latencia, args.tasa_error, args.modo, args.colgado_segundos)
+    uvicorn.run(crear_app(estado), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
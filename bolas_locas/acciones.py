@@ -0,0 +1,91 @@
+"""
+Registro de acciones de Dialogflow y modelo del payload del webhook.
+
+Cada handler se registra con el nombre de su acción y los parámetros de
+queryResult.parameters que recibe, en el orden de sus argumentos:
+
+    @accion("actTableroSelect", "rtaTableroID")
+    def handle_seleccionar_tablero(user_id, rtaTableroID): ...
+
+El webhook valida el body una sola vez (PayloadDialogflow) y despacha con una
+búsqueda en ACCIONES en vez de una cadena de if.
+"""
+from typing import Any
+
+from pydantic import BaseModel, Field
+
+
+class _Remitente(BaseModel):
+    id: int | str
+
+
+class _CallbackQuery(BaseModel):
+    remitente: _Remitente | None = Field(None, alias="from")
+
+
+class _DatosTelegram(BaseModel):
+    remitente: _Remitente | None = Field(None, alias="from")
+    callback_query: _CallbackQuery | None = None
+
+
+class _PayloadOriginal(BaseModel):
+    data: _DatosTelegram | None = None
+
+
+class _DetectIntentOriginal(BaseModel):
+    payload: _PayloadOriginal | None = None
+
+
+class _QueryResult(BaseModel):
+    action: str | None = None
+    parameters: dict[str, Any] = Field(default_factory=dict)
+
+
+class PayloadDialogflow(BaseModel):
+    """Solo los campos que usa el bot; el resto del body de Dialogflow se ignora."""
+
+    queryResult: _QueryResult
+    originalDetectIntentRequest: _DetectIntentOriginal | None = None
+
+    @property
+    def user_id(self):
+        """ID de Telegram del mensaje, o del callback si el usuario tocó un botón."""
+        original = self.originalDetectIntentRequest
+        datos = original.payload.data if original and original.payload else None
+        if datos is None:
+            return None
+        if datos.remitente is not None:
+            return datos.remitente.id
+        if datos.callback_query is not None and datos.callback_query.remitente is not None:
+            return datos.callback_query.remitente.id
+        return None
+
+
+class Accion:
+    __slots__ = ("nombre", "handler", "parametros", "usa_user_id", "bloqueante")
+
+    def __init__(self, nombre, handler, parametros, usa_user_id, bloqueante):
+        self.nombre = nombre
+        self.handler = handler
+        self.parametros = parametros
+        self.usa_user_id = usa_user_id
+        self.bloqueante = bloqueante
+
+    def argumentos(self, user_id, parameters):
+        valores = [parameters.get(nombre) for nombre in self.parametros]
+        return [user_id, *valores] if self.usa_user_id else valores
+
+
+ACCIONES = {}
+
+
+# ✅ Registrar un handler para una acción de Dialogflow
+# usa_user_id: el handler recibe el user_id como primer argumento
+# bloqueante: usa MySQL y debe correr fuera del event loop (run_db); si no, el handler puede ser async
+def accion(nombre, *parametros, usa_user_id=True, bloqueante=True):
+    def registrar(handler):
+        if nombre in ACCIONES:
+            raise ValueError(f"La acción {nombre} ya tiene un handler registrado.")
+        ACCIONES[nombre] = Accion(nombre, handler, parametros, usa_user_id, bloqueante)
+        return handler
+    return registrar
@@ -0,0 +1,366 @@
+"""
+Auditoría de los planes de consulta de webhook.py contra una base local.
+
+1. con --sembrar aplica las migraciones y llena la base: tableros abiertos y cerrados
+   a lo largo de un año, miles de jugadores con sus compras (bolas_locas.simulacion),
+   ganadores, álbumes, láminas y compras de álbumes
+2. ejecuta todas las acciones del bot y los endpoints REST grabando cada consulta
+   junto con el archivo y la línea desde donde se hizo
+3. corre EXPLAIN de cada SELECT/UPDATE/DELETE grabado (y del SELECT de los INSERT ... SELECT)
+   y marca recorridos completos de tabla (type=ALL), de índice (type=index con muchas filas)
+   y "Using filesort" / "Using temporary"
+4. lista los cursor.execute de webhook.py que no se ejecutaron (consultas sin auditar)
+
+Sale con código 1 si hay hallazgos, para usarlo en CI contra una base de prueba.
+Solo para bases locales: las acciones compran bolitas, registran jugadores y cambian Nequi.
+
+    python -m bolas_locas.auditoria --sembrar [--jugadores 5000]
+    python -m bolas_locas.auditoria [--permitir tableros] [--verbose]
+"""
+import argparse
+import ast
+import asyncio
+import inspect
+import os
+import sys
+from contextlib import closing
+from datetime import date, timedelta
+
+from bolas_locas.db import db_connection, get_pool
+
+
+# Tablas de catálogo con pocas filas: recorrerlas completas es lo esperado
+TABLAS_PEQUENAS = {"configuracion_pagos", "albumes", "esquema_version"}
+
+# type=index por debajo de estas filas estimadas es un ORDER BY ... LIMIT resuelto con el índice
+FILAS_INDICE_MAX = 1000
+
+NOMBRE_SEMILLA = "auditoria"
+USER_ID_NUEVO = 8_999_999_999_001  # Jugador sin registrar para actRegistrarUsuario
+
+_AQUI = os.path.abspath(__file__)
+_WEBHOOK = os.path.join(os.path.dirname(_AQUI), "webhook.py")
+
+
+##### 🟡🟡🟡 Grabación de consultas
+
+class _CursorGrabador:
+    """Cursor que anota (sql, params, archivo, línea) antes de ejecutar."""
+
+    def __init__(self, cursor, grabadas):
+        self._cursor = cursor
+        self._grabadas = grabadas
+
+    def _grabar(self, sql, params):
+        marco = sys._getframe(2)
+        while marco is not None and os.path.abspath(marco.f_code.co_filename) == _AQUI:
+            marco = marco.f_back
+        archivo = os.path.abspath(marco.f_code.co_filename) if marco else "?"
+        self._grabadas.append((sql, params, archivo, marco.f_lineno if marco else 0))
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        self._grabar(sql, params)
+        return self._cursor.execute(sql, params, *args, **kwargs)
+
+    def executemany(self, sql, filas, *args, **kwargs):
+        filas = list(filas)
+        self._grabar(sql, filas[0] if filas else None)
+        return self._cursor.executemany(sql, filas, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class _ConexionGrabadora:
+    def __init__(self, conn, grabadas):
+        self._conn = conn
+        self._grabadas = grabadas
+
+    def cursor(self, *args, **kwargs):
+        return _CursorGrabador(self._conn.cursor(*args, **kwargs), self._grabadas)
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+
+def grabar_consultas():
+    """Hace que las conexiones nuevas del pool graben sus consultas; devuelve la lista donde quedan."""
+    grabadas = []
+    pool = get_pool()
+    pool.close()  # Las conexiones libres de antes no graban
+    conectar = pool._connect
+    pool._connect = lambda: _ConexionGrabadora(conectar(), grabadas)
+    return grabadas
+
+##### 🟡🟡🟡 Fin Grabación de consultas
+
+
+##### 🟡🟡🟡 Base de prueba
+
+# ✅ Llenar una base local con datos parecidos a producción (idempotente: reusa lo ya sembrado)
+def sembrar(jugadores=5000, meses=12, tableros_por_mes=4):
+    from bolas_locas.esquema import migrar
+    from bolas_locas import ganancias
+    from bolas_locas.historial import sincronizar
+    from bolas_locas.simulacion import simular_compras_masivas
+
+    migrar()
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute("""
+            INSERT IGNORE INTO configuracion_pagos (id_config, porcentaje_casa, porcentaje_sponsor, porcentaje_ganador)
+            VALUES (1, 0.34, 0.06, 0.60)
+        """)
+        cursor.execute("SELECT COUNT(*) AS total FROM tableros WHERE nombre LIKE %s", (f"{NOMBRE_SEMILLA}%",))
+        if cursor.fetchone()["total"]:
+            conn.commit()
+            return
+
+        hoy = date.today()
+        filas = []
+        for atras in range(meses, 0, -1):
+            mes = (hoy.replace(day=1) - timedelta(days=30 * atras)).replace(day=1)
+            for i in range(tableros_por_mes):
+                filas.append((f"{NOMBRE_SEMILLA} {mes:%Y-%m} #{i}", mes + timedelta(days=7 * i), "cerrado"))
+        for i in range(3):
+            filas.append((f"{NOMBRE_SEMILLA} abierto #{i}", hoy, "abierto"))
+        cursor.executemany("""
+            INSERT INTO tableros (nombre, precio_por_bolita, max_bolitas, min_bolitas_por_jugador,
+                                  max_bolitas_por_jugador, estado, fecha_creacion)
+            VALUES (%s, 1000, 1000000, 1, 20, %s, %s)
+        """, [(nombre, estado, fecha) for nombre, fecha, estado in filas])
+
+        cursor.execute("SELECT id_tablero FROM tableros WHERE nombre LIKE %s", (f"{NOMBRE_SEMILLA}%",))
+        ids = [fila["id_tablero"] for fila in cursor.fetchall()]
+        cursor.executemany("INSERT IGNORE INTO jackpots (id_tablero) VALUES (%s)", [(i,) for i in ids])
+
+        cursor.execute("INSERT INTO albumes (nombre, precio) VALUES (%s, 20000)", (f"{NOMBRE_SEMILLA} álbum",))
+        id_album = cursor.lastrowid
+        cursor.executemany("INSERT INTO laminas (id_album, nombre) VALUES (%s, %s)",
+                           [(id_album, f"lámina {i}") for i in range(1, 101)])
+        conn.commit()
+
+    simular_compras_masivas(ids, jugadores=jugadores, seed=7, saldo_inicial=1_000_000, crear_jugadores=True)
+
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute("SELECT user_id, alias, sponsor FROM jugadores ORDER BY user_id LIMIT %s", (jugadores,))
+        participantes = cursor.fetchall()
+        cursor.execute("""
+            UPDATE jackpots j JOIN tableros t ON t.id_tablero = j.id_tablero
+            SET j.alias_ganador = %s, j.sponsor_ganador = %s, j.estado = 'pagado'
+            WHERE t.estado = 'cerrado' AND t.nombre LIKE %s
+        """, (participantes[0]["alias"], participantes[0]["sponsor"], f"{NOMBRE_SEMILLA}%"))
+        cursor.execute("SELECT id_lamina FROM laminas WHERE id_album = %s", (id_album,))
+        laminas = [fila["id_lamina"] for fila in cursor.fetchall()]
+        cursor.executemany("INSERT INTO laminas_obtenidas (user_id, id_lamina) VALUES (%s, %s)",
+                           [(j["user_id"], laminas[n % len(laminas)]) for n, j in enumerate(participantes)])
+        cursor.executemany("INSERT INTO compras_albumes (user_id, id_album, estado) VALUES (%s, %s, %s)",
+                           [(j["user_id"], id_album, "completado" if n % 3 else "pendiente")
+                            for n, j in enumerate(participantes)])
+        conn.commit()
+
+    sincronizar()
+    ganancias.sincronizar()
+
+##### 🟡🟡🟡 Fin Base de prueba
+
+
+##### 🟡🟡🟡 Ejercicio de la app
+
+def _muestra():
+    """IDs reales de la base para las llamadas: un jugador con compras, tableros y un álbum."""
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute("SELECT id_tablero FROM tableros WHERE estado = 'abierto' ORDER BY id_tablero LIMIT 1")
+        abierto = cursor.fetchone()["id_tablero"]
+        cursor.execute("SELECT id_tablero FROM tableros WHERE estado != 'abierto' ORDER BY id_tablero DESC LIMIT 1")
+        cerrado = cursor.fetchone()["id_tablero"]
+        cursor.execute("SELECT user_id FROM jugadores_tableros_resumen WHERE id_tablero = %s LIMIT 1", (cerrado,))
+        user_id = cursor.fetchone()["user_id"]
+        cursor.execute("SELECT alias FROM jugadores WHERE user_id = %s", (user_id,))
+        alias = cursor.fetchone()["alias"]
+        cursor.execute("SELECT fecha_creacion FROM tableros WHERE id_tablero = %s", (cerrado,))
+        fecha = cursor.fetchone()["fecha_creacion"]
+        cursor.execute("SELECT id_album FROM albumes WHERE estado = 'activo' LIMIT 1")
+        album = cursor.fetchone()
+    return {
+        "abierto": abierto, "cerrado": cerrado, "user_id": user_id, "alias": alias,
+        "mes": fecha.month, "anio": fecha.year, "id_album": album["id_album"] if album else None,
+    }
+
+
+def _parametros(muestra):
+    return {
+        "rtaTableroID": str(muestra["abierto"]),
+        "rtaIDTablero": str(muestra["cerrado"]),
+        "rtaCantBolitas": "1",
+        "rtaMes": f"{max(1, muestra['mes'] - 2)}-{muestra['mes']}",
+        "rtaAnio": str(muestra["anio"]),
+        "rtaCelularNequi": "3000000001",
+        "rtaAlias": f"{NOMBRE_SEMILLA}{USER_ID_NUEVO % 10000}",
+        "rtaSponsor": muestra["alias"],
+        "rtaNuevoNequi": "3000000002",
+    }
+
+
+# ✅ Ejecutar cada acción de Dialogflow, los endpoints REST y el registro de compra de álbum
+def ejercitar():
+    from bolas_locas.acciones import ACCIONES
+    from bolas_locas.cache import cache
+    from bolas_locas import webhook
+
+    muestra = _muestra()
+    parametros = _parametros(muestra)
+    cache.clear()  # Que las consultas cacheadas también lleguen a la base
+
+    for nombre, registrada in ACCIONES.items():
+        user_id = USER_ID_NUEVO if nombre == "actRegistrarUsuario" else muestra["user_id"]
+        respuesta = registrada.handler(*registrada.argumentos(user_id, parametros))
+        if inspect.isawaitable(respuesta):
+            asyncio.run(respuesta)
+    # El sponsor automático pasa por otra consulta
+    ACCIONES["actRegistrarUsuario"].handler(USER_ID_NUEVO + 1, "3000000003", f"{NOMBRE_SEMILLA}auto", "auto")
+
+    if muestra["id_album"] is not None:
+        webhook.registrar_compra_album(muestra["user_id"], muestra["id_album"])
+
+    asyncio.run(_ejercitar_rest(muestra))
+
+
+async def _ejercitar_rest(muestra):
+    import httpx
+    from bolas_locas.main import app
+
+    cerrado = muestra["cerrado"]
+    rutas = [
+        "/tableros_abiertos",
+        f"/tablero/{cerrado}/jugadores",
+        f"/tablero/{cerrado}/jugadores?limit=50",
+        f"/tablero/{cerrado}/jugadores?limit=50&after={muestra['user_id']}",
+        f"/tablero/{cerrado}/jackpot",
+        "/albumes_disponibles",
+    ]
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://auditoria") as client:
+        for ruta in rutas:
+            await client.get(ruta)
+
+##### 🟡🟡🟡 Fin Ejercicio de la app
+
+
+##### 🟡🟡🟡 EXPLAIN
+
+def _explicable(sql):
+    """La parte de la sentencia a la que se le puede pedir EXPLAIN (None si no aplica)."""
+    limpio = " ".join(sql.split())
+    primera = limpio.split(" ", 1)[0].upper()
+    if primera in ("SELECT", "UPDATE", "DELETE"):
+        return limpio
+    if primera == "INSERT" and " SELECT " in limpio.upper():
+        return limpio[limpio.upper().index(" SELECT ") + 1:]
+    return None
+
+
+def hallazgos_del_plan(filas, permitidas):
+    hallazgos = []
+    for fila in filas:
+        tabla = fila.get("table") or ""
+        if tabla.startswith("<") or tabla in permitidas:
+            continue  # Tablas derivadas/uniones materializadas o catálogos pequeños
+        extra = fila.get("Extra") or ""
+        filas_estimadas = fila.get("rows") or 0
+        if fila.get("type") == "ALL":
+            hallazgos.append(f"{tabla}: recorre toda la tabla (~{filas_estimadas} filas)")
+        elif fila.get("type") == "index" and filas_estimadas > FILAS_INDICE_MAX:
+            hallazgos.append(f"{tabla}: recorre todo el índice {fila.get('key')} (~{filas_estimadas} filas)")
+        for aviso in ("Using filesort", "Using temporary"):
+            if aviso in extra:
+                hallazgos.append(f"{tabla}: {aviso}")
+    return hallazgos
+
+
+# ✅ EXPLAIN de cada consulta distinta; devuelve [(sitios, sql, plan, hallazgos)]
+def explicar(grabadas, permitidas):
+    consultas = {}
+    for sql, params, archivo, linea in grabadas:
+        explicable = _explicable(sql)
+        if explicable is None:
+            continue
+        sitios, _ = consultas.setdefault(explicable, (set(), params))
+        sitios.add((archivo, linea))
+
+    resultados = []
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        for sql, (sitios, params) in consultas.items():
+            cursor.execute(f"EXPLAIN {sql}", params)
+            plan = cursor.fetchall()
+            resultados.append((sorted(sitios), sql, plan, hallazgos_del_plan(plan, permitidas)))
+        conn.rollback()
+    return resultados
+
+
+# ✅ Líneas de webhook.py con un .execute(...) (rango de líneas de cada llamada)
+def sitios_de_consulta(ruta=_WEBHOOK):
+    with open(ruta, encoding="utf-8") as archivo:
+        arbol = ast.parse(archivo.read())
+    return sorted(
+        (nodo.lineno, nodo.end_lineno)
+        for nodo in ast.walk(arbol)
+        if isinstance(nodo, ast.Call) and isinstance(nodo.func, ast.Attribute)
+        and nodo.func.attr in ("execute", "executemany")
+    )
+
+
+def sin_ejecutar(grabadas, ruta=_WEBHOOK):
+    lineas = {linea for _, _, archivo, linea in grabadas if archivo == ruta}
+    return [(inicio, fin) for inicio, fin in sitios_de_consulta(ruta)
+            if not any(inicio <= linea <= fin for linea in lineas)]
+
+##### 🟡🟡🟡 Fin EXPLAIN
+
+
+def _sitio(archivo, linea):
+    return f"{os.path.relpath(archivo)}:{linea}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sembrar", action="store_true", help="migrar y llenar la base local antes de auditar")
+    parser.add_argument("--jugadores", type=int, default=5000, help="jugadores a sembrar")
+    parser.add_argument("--permitir", nargs="*", default=[], help="otras tablas que se pueden recorrer completas")
+    parser.add_argument("--verbose", action="store_true", help="mostrar el plan de todas las consultas")
+    args = parser.parse_args(argv)
+
+    if args.sembrar:
+        sembrar(args.jugadores)
+        print("🌱 Base sembrada.")
+
+    grabadas = grabar_consultas()
+    ejercitar()
+    resultados = explicar(grabadas, TABLAS_PEQUENAS | set(args.permitir))
+
+    con_hallazgos = 0
+    for sitios, sql, plan, hallazgos in resultados:
+        if not hallazgos and not args.verbose:
+            continue
+        con_hallazgos += bool(hallazgos)
+        print(f"{'❌' if hallazgos else '✅'} {', '.join(_sitio(*s) for s in sitios)}")
+        print(f"   {sql[:200]}")
+        for fila in plan:
+            print(f"   · {fila.get('table')}: type={fila.get('type')} key={fila.get('key')} "
+                  f"rows={fila.get('rows')} {fila.get('Extra') or ''}")
+        for hallazgo in hallazgos:
+            print(f"   ⚠️ {hallazgo}")
+
+    faltan = sin_ejecutar(grabadas)
+    for inicio, fin in faltan:
+        print(f"⏳ Sin auditar: {_sitio(_WEBHOOK, inicio)}-{fin}")
+
+    print(f"📊 {len(resultados)} consultas distintas, {con_hallazgos} con hallazgos, {len(faltan)} sin ejecutar")
+    if con_hallazgos:
+        sys.exit(1)
+    print("✅ Ninguna consulta auditada recorre tablas completas ni ordena en archivo.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import OrderedDict
+
+from config import CACHE_MAX_ENTRIES, PERFILES_MAX_ENTRIES, PERFILES_TTL
+
+
+class _Carga:
+    """Carga en curso de una clave: la comparten los hilos que esperan el mismo `loader()`."""
+
+    __slots__ = ("lock", "generacion", "esperando")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generacion = 0  # La sube cada invalidación que llega durante la carga
+        self.esperando = 0
+
+
+class TTLCache:
+    """
+    Caché en memoria con TTL por clave y desalojo LRU al superar `maxsize`.
+
+    Es por proceso: con varios workers de uvicorn cada uno tiene la suya, por eso
+    los TTL deben ser cortos para datos que otros procesos pueden modificar.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._datos = OrderedDict()  # clave -> (expira_en, valor)
+        self._lock = threading.Lock()
+        self._cargando = {}  # clave -> _Carga, para que un solo hilo recargue cada clave
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._datos.get(key)
+            if item is not None:
+                expira_en, valor = item
+                if expira_en > time.monotonic():
+                    self._datos.move_to_end(key)
+                    self._hits += 1
+                    return valor
+                del self._datos[key]
+            self._misses += 1
+            return default
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._guardar(key, value, ttl)
+
+    def _guardar(self, key, value, ttl):
+        # Requiere self._lock
+        self._datos[key] = (time.monotonic() + ttl, value)
+        self._datos.move_to_end(key)
+        while len(self._datos) > self.maxsize:
+            self._datos.popitem(last=False)
+            self._evictions += 1
+
+    def get_or_load(self, key, loader, ttl):
+        """
+        Devuelve el valor en caché o lo carga con `loader()`; las cargas concurrentes de una clave se agrupan.
+
+        Si la clave se invalida mientras `loader()` corre, lo cargado puede ser anterior a la
+        escritura: se devuelve a quien lo pidió pero no se guarda.
+        """
+        centinela = object()
+        valor = self.get(key, centinela)
+        if valor is not centinela:
+            return valor
+
+        with self._lock:
+            carga = self._cargando.setdefault(key, _Carga())
+            carga.esperando += 1
+
+        try:
+            with carga.lock:
+                # Otro hilo pudo haberlo cargado mientras esperábamos
+                with self._lock:
+                    item = self._datos.get(key)
+                    if item is not None and item[0] > time.monotonic():
+                        return item[1]
+                    generacion = carga.generacion
+                valor = loader()
+                with self._lock:
+                    if carga.generacion == generacion:
+                        self._guardar(key, valor, ttl)
+            return valor
+        finally:
+            with self._lock:
+                carga.esperando -= 1
+                if not carga.esperando:
+                    self._cargando.pop(key, None)
+
+    def _invalidar_carga(self, key):
+        # Requiere self._lock
+        carga = self._cargando.get(key)
+        if carga is not None:
+            carga.generacion += 1
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._invalidar_carga(key)
+                if self._datos.pop(key, None) is not None:
+                    self._invalidations += 1
+
+    def invalidate_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._cargando if isinstance(k, str) and k.startswith(prefix)]:
+                self._invalidar_carga(key)
+            for key in [k for k in self._datos if isinstance(k, str) and k.startswith(prefix)]:
+                del self._datos[key]
+                self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for carga in self._cargando.values():
+                carga.generacion += 1
+            self._datos.clear()
+
+    def stats(self):
+        with self._lock:
+            consultas = self._hits + self._misses
+            return {
+                "entries": len(self._datos),
+                "maxsize": self.maxsize,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / consultas, 4) if consultas else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+
+# Caché compartida del proceso
+cache = TTLCache(CACHE_MAX_ENTRIES)
+
+# Perfiles de jugadores (alias, sponsor, celular) por user_id de Telegram, aparte para que
+# miles de jugadores no desalojen las entradas de la caché compartida. El saldo no se guarda:
+# se lee siempre de MySQL. Tampoco se guardan los "no registrado", así un registro hecho
+# en otro worker se ve de inmediato.
+perfiles = TTLCache(PERFILES_MAX_ENTRIES)
+
+# Claves de la caché
+KEY_TABLEROS_ABIERTOS = "tableros_abiertos"
+KEY_ALBUMES_ACTIVOS = "albumes_activos"
+KEY_CONFIGURACION_PAGOS = "configuracion_pagos"
+
+# Versiones por recurso de la API REST: las sube cada escritura del proceso y forman parte
+# de la clave de las respuestas cacheadas (ver bolas_locas/revalidacion.py)
+RECURSO_TABLEROS = "tableros"  # Listado de tableros abiertos
+RECURSO_ALBUMES = "albumes"
+TODOS_LOS_TABLEROS = "tablero:*"  # Se sube cuando cambian tableros sin saber cuáles
+_versiones = {}
+_versiones_lock = threading.Lock()
+
+
+def recurso_tablero(id_tablero):
+    return f"tablero:{id_tablero}"
+
+
+def version_tablero(id_tablero):
+    return version(TODOS_LOS_TABLEROS, recurso_tablero(id_tablero))
+
+
+def version(*recursos):
+    return tuple(_versiones.get(recurso, 0) for recurso in recursos)
+
+
+def subir_version(*recursos):
+    with _versiones_lock:
+        for recurso in recursos:
+            _versiones[recurso] = _versiones.get(recurso, 0) + 1
+
+
+# ✅ Ganchos de invalidación para las rutas que escriben
+def invalidar_tableros(id_tablero=None):
+    """Llamar tras una compra o un cambio de tableros/jackpots (el listado incluye el acumulado).
+    Sin `id_tablero` se dan por cambiados todos los tableros."""
+    cache.invalidate(KEY_TABLEROS_ABIERTOS)
+    subir_version(RECURSO_TABLEROS, recurso_tablero(id_tablero) if id_tablero is not None else TODOS_LOS_TABLEROS)
+
+
+# La app no escribe álbumes ni configuracion_pagos: hoy se editan por fuera y se ven al
+# vencer CACHE_TTL_ALBUMES / CACHE_TTL_CONFIG_PAGOS. Una ruta que los modifique debe llamar a estos
+def invalidar_albumes():
+    cache.invalidate(KEY_ALBUMES_ACTIVOS)
+    subir_version(RECURSO_ALBUMES)
+
+
+def invalidar_configuracion_pagos():
+    cache.invalidate(KEY_CONFIGURACION_PAGOS)
+
+
+def _clave_perfil(user_id):
+    return str(user_id)  # Dialogflow manda el ID como número o como texto
+
+
+def perfil_en_cache(user_id):
+    return perfiles.get(_clave_perfil(user_id))
+
+
+def guardar_perfil(user_id, perfil):
+    """Escribir el perfil tras registrarlo o modificarlo (write-through)."""
+    perfiles.set(_clave_perfil(user_id), perfil, PERFILES_TTL)
+
+
+def invalidar_perfil(user_id):
+    perfiles.invalidate(_clave_perfil(user_id))
+
+
+def cache_stats():
+    return cache.stats()
+
+
+def perfiles_stats():
+    return perfiles.stats()
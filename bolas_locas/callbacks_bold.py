@@ -0,0 +1,329 @@
+"""
+Callbacks de pago de Bold (POST /callback_bold).
+
+El endpoint solo valida y encola: responde de inmediato, sin tocar MySQL.
+Un worker por proceso (arrancado en el lifespan) junta los eventos en lotes y aplica
+cada lote en una sola transacción:
+- deduplica por referencia, dentro del lote y contra el estado guardado: una compra
+  'completado' no se vuelve a aplicar, así que los reintentos de Bold son inocuos
+- actualiza compras_albumes con un UPDATE por estado, no uno por callback
+- asigna las láminas de todas las compras recién completadas con un solo INSERT ... SELECT
+
+El endpoint solo acepta callbacks firmados por Bold (header x-bold-signature, con
+BOLD_WEBHOOK_SECRET) y con un estado de ESTADOS_VALIDOS.
+
+Si la cola se llena el endpoint responde 503 y Bold reintenta más tarde. El worker
+reintenta un lote solo si MySQL no responde (errores de conexión u operativos); si el
+lote falla por sus datos, se aplica evento por evento y el que siga fallando va a
+callbacks_descartados en vez de trabar la cola. Si el proceso muere con eventos en
+cola, esas compras quedan 'pendiente'; para recuperarlas:
+
+    python -m bolas_locas.callbacks_bold reconciliar [--limite 500]
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+from collections import OrderedDict, defaultdict
+from contextlib import closing
+
+from mysql.connector.errors import InterfaceError, OperationalError
+
+from bolas_locas.db import db_connection, run_db
+from bolas_locas.metricas import CALLBACKS, CALLBACKS_EN_COLA, CALLBACKS_LOTE
+from config import BOLD_WEBHOOK_SECRET, CALLBACK_COLA_MAX, CALLBACK_LOTE_MAX, CALLBACK_LOTE_MS
+
+
+log = logging.getLogger(__name__)
+
+ESTADO_COMPLETADO = "completado"
+ESTADO_PENDIENTE = "pendiente"
+# Estados que se guardan en compras_albumes.estado (VARCHAR(20)); cualquier otro se rechaza
+ESTADOS_VALIDOS = frozenset({ESTADO_COMPLETADO, ESTADO_PENDIENTE, "rechazado", "cancelado", "fallido"})
+
+# MySQL caído o la conexión cortada: vale la pena reintentar el mismo lote
+ERRORES_TRANSITORIOS = (InterfaceError, OperationalError)
+
+
+# ✅ ¿El cuerpo viene firmado por Bold? HMAC-SHA256 (hex) del cuerpo en Base64 con la llave secreta
+def firma_valida(cuerpo, firma, secreto=BOLD_WEBHOOK_SECRET):
+    if not secreto or not firma:
+        return False
+    esperada = hmac.new(secreto.encode(), base64.b64encode(cuerpo), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(esperada, firma.strip().lower())
+
+
+def _marcadores(valores):
+    return ", ".join(["%s"] * len(valores))
+
+
+# ✅ Aplicar un lote de eventos (referencia, estado) en una transacción; devuelve cuántos hubo de cada tipo
+def aplicar_lote(eventos):
+    # Dentro del lote gana "completado"; si no, el último estado recibido
+    estados = {}
+    for referencia, estado in eventos:
+        if estados.get(referencia) != ESTADO_COMPLETADO:
+            estados[referencia] = estado
+    resultado = {"aplicados": 0, "duplicados": len(eventos) - len(estados), "desconocidos": 0, "completados": 0}
+    if not estados:
+        return resultado
+
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        conn.start_transaction()
+        try:
+            cursor.execute(
+                f"SELECT id_compra_album, estado FROM compras_albumes "
+                f"WHERE id_compra_album IN ({_marcadores(estados)}) FOR UPDATE",
+                tuple(estados)
+            )
+            actuales = {fila["id_compra_album"]: fila["estado"] for fila in cursor.fetchall()}
+
+            # Solo lo que cambia, agrupado por estado nuevo; una compra completada ya no se toca
+            cambios = defaultdict(list)
+            for referencia, estado in estados.items():
+                actual = actuales.get(referencia)
+                if actual is None:
+                    resultado["desconocidos"] += 1
+                elif actual == estado or actual == ESTADO_COMPLETADO:
+                    resultado["duplicados"] += 1
+                else:
+                    cambios[estado].append(referencia)
+
+            for estado, referencias in cambios.items():
+                cursor.execute(
+                    f"UPDATE compras_albumes SET estado = %s, fecha_confirmacion = NOW() "
+                    f"WHERE id_compra_album IN ({_marcadores(referencias)})",
+                    (estado, *referencias)
+                )
+                resultado["aplicados"] += len(referencias)
+
+            # Láminas de todas las compras completadas del lote en una sola sentencia.
+            # DISTINCT: dos compras del mismo álbum no duplican la colección; NOT EXISTS: no repite filas ya asignadas
+            completadas = cambios.get(ESTADO_COMPLETADO)
+            if completadas:
+                cursor.execute(f"""
+                    INSERT INTO coleccion_laminas (user_id, id_album, id_lamina, cantidad)
+                    SELECT lo.user_id, l.id_album, lo.id_lamina, COUNT(*)
+                    FROM (
+                        SELECT DISTINCT user_id, id_album
+                        FROM compras_albumes
+                        WHERE id_compra_album IN ({_marcadores(completadas)})
+                    ) c
+                    JOIN laminas l ON l.id_album = c.id_album
+                    JOIN laminas_obtenidas lo ON lo.user_id = c.user_id AND lo.id_lamina = l.id_lamina
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM coleccion_laminas cl
+                        WHERE cl.user_id = lo.user_id AND cl.id_album = l.id_album AND cl.id_lamina = lo.id_lamina
+                    )
+                    GROUP BY lo.user_id, l.id_album, lo.id_lamina
+                """, tuple(completadas))
+                resultado["completados"] = len(completadas)
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return resultado
+
+
+# ✅ Guardar un callback que no se pudo aplicar (dead letter) para revisarlo a mano
+def descartar(referencia, estado, error):
+    with db_connection() as conn, closing(conn.cursor()) as cursor:
+        cursor.execute(
+            "INSERT INTO callbacks_descartados (referencia, estado, error) VALUES (%s, %s, %s)",
+            (referencia, str(estado)[:255], str(error)[:500])
+        )
+        conn.commit()
+
+
+class ColaCallbacks:
+    """Cola en memoria + worker asíncrono que aplica los callbacks por lotes."""
+
+    def __init__(self, maximo=CALLBACK_COLA_MAX, lote_max=CALLBACK_LOTE_MAX, lote_ms=CALLBACK_LOTE_MS,
+                 aplicar=aplicar_lote, recientes_max=10000):
+        self.lote_max = lote_max
+        self.lote_segundos = lote_ms / 1000
+        self._aplicar = aplicar
+        self._cola = asyncio.Queue(maxsize=maximo)
+        self._tarea = None
+        # Referencias ya completadas en este proceso: los reintentos de Bold se confirman sin encolar
+        self._recientes = OrderedDict()
+        self._recientes_max = recientes_max
+
+    def encolar(self, referencia, estado):
+        """False si la cola está llena (el endpoint responde 503 para que Bold reintente)."""
+        if referencia in self._recientes:
+            CALLBACKS.labels("duplicado").inc()
+            return True
+        try:
+            self._cola.put_nowait((referencia, estado))
+        except asyncio.QueueFull:
+            CALLBACKS.labels("cola_llena").inc()
+            log.warning("⚠️ Cola de callbacks llena, se rechaza la referencia %s", referencia)
+            return False
+        CALLBACKS.labels("recibido").inc()
+        CALLBACKS_EN_COLA.inc()
+        return True
+
+    def pendientes(self):
+        return self._cola.qsize()
+
+    def iniciar(self):
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._trabajar(), name="callbacks_bold")
+
+    async def detener(self, timeout=10):
+        """Esperar a que se vacíe la cola (hasta `timeout` segundos) y parar el worker."""
+        if self._tarea is None:
+            return
+        try:
+            await asyncio.wait_for(self._cola.join(), timeout)
+        except asyncio.TimeoutError:
+            log.error("❌ Se apagó con %s callbacks sin aplicar (quedan 'pendiente', usar reconciliar)", self.pendientes())
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+        self._tarea = None
+
+    async def _siguiente_lote(self):
+        lote = [await self._cola.get()]
+        # Si hay poco en cola, esperar un momento para juntar la ráfaga en una sola transacción
+        if self._cola.qsize() < self.lote_max - 1 and self.lote_segundos > 0:
+            await asyncio.sleep(self.lote_segundos)
+        while len(lote) < self.lote_max and not self._cola.empty():
+            lote.append(self._cola.get_nowait())
+        return lote
+
+    async def _trabajar(self):
+        while True:
+            lote = await self._siguiente_lote()
+            descartadas = set()
+            resultado = await self._procesar(lote, descartadas)
+
+            for referencia, estado in lote:
+                if estado == ESTADO_COMPLETADO and referencia not in descartadas:
+                    self._recordar(referencia)
+                self._cola.task_done()
+            CALLBACKS_EN_COLA.dec(len(lote))
+            CALLBACKS_LOTE.observe(len(lote))
+            for clave in ("aplicados", "duplicados", "desconocidos", "descartados"):
+                if resultado.get(clave):
+                    CALLBACKS.labels(clave).inc(resultado[clave])
+            if resultado.get("desconocidos"):
+                log.warning("⚠️ %s callbacks de Bold con referencia desconocida", resultado["desconocidos"])
+            log.info("💳 Lote de callbacks: %s eventos, %s", len(lote), resultado)
+
+    async def _procesar(self, lote, descartadas):
+        """Aplicar un lote; si falla por sus datos, evento por evento, y descartar el que siga fallando."""
+        try:
+            return await self._aplicar_con_reintentos(lote)
+        except Exception as e:
+            if len(lote) > 1:
+                log.warning("⚠️ Falló un lote de %s callbacks de Bold, se aplican uno por uno", len(lote), exc_info=True)
+                total = defaultdict(int)
+                for evento in lote:
+                    for clave, valor in (await self._procesar([evento], descartadas)).items():
+                        total[clave] += valor
+                return dict(total)
+            referencia, estado = lote[0]
+            log.error("❌ Callback de Bold descartado (referencia %s, estado %r): %s", referencia, estado, e)
+            descartadas.add(referencia)
+            await self._descartar_seguro(referencia, estado, e)
+            return {"descartados": 1}
+
+    async def _aplicar_con_reintentos(self, lote):
+        espera = 0.5
+        while True:
+            try:
+                return await run_db(self._aplicar, lote)
+            except ERRORES_TRANSITORIOS:
+                # MySQL caído: reintentar el mismo lote; mientras tanto la cola se llena y Bold recibe 503
+                log.exception("❌ Error al aplicar %s callbacks de Bold, reintentando en %.1fs", len(lote), espera)
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, 30)
+
+    @staticmethod
+    async def _descartar_seguro(referencia, estado, error):
+        try:
+            await run_db(descartar, referencia, estado, error)
+        except Exception:
+            log.exception("❌ No se pudo guardar el callback descartado %s en callbacks_descartados", referencia)
+
+    def _recordar(self, referencia):
+        self._recientes[referencia] = True
+        if len(self._recientes) > self._recientes_max:
+            self._recientes.popitem(last=False)
+
+
+_cola = None
+
+
+# ✅ Cola compartida por el proceso (el lifespan arranca y detiene su worker)
+def get_cola_callbacks():
+    global _cola
+    if _cola is None:
+        _cola = ColaCallbacks()
+    return _cola
+
+
+async def detener_cola_callbacks():
+    global _cola
+    cola, _cola = _cola, None
+    if cola is not None:
+        await cola.detener()
+
+
+def _compras_pendientes(limite):
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute(
+            "SELECT id_compra_album FROM compras_albumes WHERE estado = %s ORDER BY id_compra_album LIMIT %s",
+            (ESTADO_PENDIENTE, limite)
+        )
+        return [fila["id_compra_album"] for fila in cursor.fetchall()]
+
+
+# ✅ Consultar en Bold las compras que siguen pendientes y aplicar su estado (callbacks perdidos)
+async def reconciliar(limite=500):
+    from bolas_locas.pagos import ErrorPasarela, cerrar_cliente_bold, get_cliente_bold
+
+    eventos = []
+    try:
+        for referencia in await run_db(_compras_pendientes, limite):
+            try:
+                pago = await get_cliente_bold().consultar_pago(str(referencia))
+            except ErrorPasarela as e:
+                log.warning("⚠️ No se pudo consultar la compra %s en Bold: %s", referencia, e)
+                continue
+            estado = str(pago.get("status") or "").strip().lower()
+            if estado not in ESTADOS_VALIDOS:
+                log.warning("⚠️ Estado desconocido %r de Bold para la compra %s", estado, referencia)
+            elif estado != ESTADO_PENDIENTE:
+                eventos.append((referencia, estado))
+    finally:
+        await cerrar_cliente_bold()
+
+    total = defaultdict(int)
+    for i in range(0, len(eventos), CALLBACK_LOTE_MAX):
+        for clave, valor in (await run_db(aplicar_lote, eventos[i:i + CALLBACK_LOTE_MAX])).items():
+            total[clave] += valor
+    return dict(total)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    rec = sub.add_parser("reconciliar", help="consultar en Bold las compras pendientes y aplicar su estado")
+    rec.add_argument("--limite", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    resultado = asyncio.run(reconciliar(args.limite))
+    print(f"✅ Compras reconciliadas: {resultado or 'ninguna'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Compras agrupadas (group commit) para tableros con mucho tráfico.
+
+Con una transacción por compra, todas las compras de un tablero se turnan el bloqueo de
+sus filas de jackpots y tableros_resumen, así que el tablero admite a lo sumo una
+compra por commit. En los tableros de COMPRAS_AGRUPADAS cada compra se encola en la
+fila de su tablero y un worker por tablero las confirma por lotes cada COMPRAS_LOTE_MS:
+- una transacción por lote: bloquea las filas de los jugadores del lote (en orden de
+  user_id) y valida cada pedido en orden de llegada con el saldo y las bolitas que van
+  quedando, con las mismas reglas y mensajes que comprar_bolitas
+- un UPDATE de saldos, un INSERT multi-fila en jugadores_tableros, un upsert de
+  contadores por jugador y uno solo de tableros_resumen y de jackpots para todo el lote
+- cada comprador recibe su propia respuesta de éxito o de rechazo
+
+Si el lote falla antes del commit (p. ej. un deadlock), sus compras se reintentan una
+por una, así un pedido problemático no arrastra a los demás. Si falla el commit mismo
+no se reintenta nada: el lote pudo haber quedado confirmado y se cobraría dos veces. La cola vive en el proceso: con
+varios workers cada uno agrupa las compras que atiende.
+
+    COMPRAS_AGRUPADAS=*        # todos los tableros
+    COMPRAS_AGRUPADAS=4,7      # solo los tableros 4 y 7
+"""
+import asyncio
+import contextvars
+import logging
+from collections import defaultdict
+from contextlib import closing
+
+from bolas_locas.cache import invalidar_tableros
+from bolas_locas.contadores import bolitas_de_jugadores, registrar_lote_en_contadores
+from bolas_locas.db import db_connection, marcar_escritura, run_db
+from bolas_locas.jackpot_en_vivo import get_hub
+from bolas_locas.metricas import COMPRAS_LOTE
+from config import COMPRAS_AGRUPADAS, COMPRAS_LOTE_MAX, COMPRAS_LOTE_MS
+
+
+log = logging.getLogger(__name__)
+
+TABLERO_NO_ENCONTRADO = "❌ Tablero no encontrado."
+FUERA_DE_RANGO = "❌ Cantidad de bolitas fuera del rango permitido."
+NO_REGISTRADO = "❌ No estás registrado en el sistema."
+SIN_SALDO = "❌ No tienes saldo suficiente."
+COMPRA_EXITOSA = "✅ Compra realizada con éxito."
+
+class CommitIncierto(Exception):
+    """Falló el commit de un lote: pudo haber quedado confirmado, así que no se reintenta."""
+
+
+_tableros = {t.strip() for t in COMPRAS_AGRUPADAS.split(",") if t.strip()}
+
+
+# ✅ ¿Las compras de este tablero van por lotes?
+def activo(id_tablero):
+    return "*" in _tableros or str(id_tablero).strip() in _tableros
+
+
+def _marcadores(valores):
+    return ", ".join(["%s"] * len(valores))
+
+
+# ✅ Aplicar un lote de pedidos (user_id, cantidad) de un tablero en una transacción
+# Devuelve (un mensaje por pedido en el mismo orden, user_ids con compras confirmadas).
+# Si falla el commit lanza CommitIncierto: el lote pudo quedar confirmado y no se reintenta.
+def aplicar_lote(id_tablero, pedidos):
+    from bolas_locas.webhook import get_configuracion_pagos
+
+    # Se lee antes de pedir la conexión para no ocupar dos conexiones del pool a la vez
+    porcentaje_pagos = get_configuracion_pagos()
+    pedidos = [(int(user_id), cantidad) for user_id, cantidad in pedidos]
+    respuestas = [None] * len(pedidos)
+    aceptados = []  # (user_id, cantidad, costo)
+    etapa = None  # "commit" mientras se confirma, "confirmado" después
+
+    try:
+        with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+            conn.start_transaction(isolation_level="READ COMMITTED")
+            try:
+                cursor.execute(
+                    "SELECT precio_por_bolita, min_bolitas_por_jugador, max_bolitas_por_jugador FROM tableros WHERE id_tablero = %s",
+                    (id_tablero,)
+                )
+                tablero = cursor.fetchone()
+                if not tablero:
+                    conn.rollback()
+                    return [TABLERO_NO_ENCONTRADO] * len(pedidos), []
+                minimo, maximo = tablero["min_bolitas_por_jugador"], tablero["max_bolitas_por_jugador"]
+
+                # 1️⃣ Bloquear las filas de los jugadores del lote, siempre en el mismo orden
+                user_ids = sorted({user_id for user_id, _ in pedidos})
+                cursor.execute(
+                    f"SELECT user_id, saldo FROM jugadores WHERE user_id IN ({_marcadores(user_ids)}) ORDER BY user_id FOR UPDATE",
+                    user_ids
+                )
+                saldos = {fila["user_id"]: fila["saldo"] for fila in cursor.fetchall()}
+                previas = bolitas_de_jugadores(cursor, id_tablero, sorted(saldos))
+                compradas = dict(previas)
+
+                # 2️⃣ Validar en orden de llegada con el saldo y las bolitas que van quedando
+                for i, (user_id, cantidad) in enumerate(pedidos):
+                    if cantidad < minimo or cantidad > maximo:
+                        respuestas[i] = FUERA_DE_RANGO
+                        continue
+                    if user_id not in saldos:
+                        respuestas[i] = NO_REGISTRADO
+                        continue
+                    costo = cantidad * tablero["precio_por_bolita"]
+                    if saldos[user_id] < costo:
+                        respuestas[i] = SIN_SALDO
+                        continue
+                    ya = compradas.get(user_id) or 0
+                    if ya + cantidad > maximo:
+                        respuestas[i] = f"❌ No puedes comprar más bolitas. Ya tienes {ya} y el límite es {maximo}."
+                        continue
+                    saldos[user_id] -= costo
+                    compradas[user_id] = ya + cantidad
+                    aceptados.append((user_id, cantidad, costo))
+                    respuestas[i] = COMPRA_EXITOSA
+
+                if not aceptados:
+                    conn.rollback()
+                    return respuestas, []
+
+                por_jugador = defaultdict(lambda: [0, 0])
+                for user_id, cantidad, costo in aceptados:
+                    por_jugador[user_id][0] += cantidad
+                    por_jugador[user_id][1] += costo
+                cantidad_total = sum(cantidad for _, cantidad, _ in aceptados)
+                costo_total = sum(costo for _, _, costo in aceptados)
+
+                # 3️⃣ Débitos del lote en un solo UPDATE (ya validados con las filas bloqueadas)
+                casos = " ".join(["WHEN %s THEN %s"] * len(por_jugador))
+                cursor.execute(
+                    f"UPDATE jugadores SET saldo = saldo - CASE user_id {casos} END WHERE user_id IN ({_marcadores(por_jugador)})",
+                    [valor for user_id, (_, monto) in por_jugador.items() for valor in (user_id, monto)] + list(por_jugador)
+                )
+
+                # 4️⃣ Una fila por compra en un INSERT multi-fila, y los contadores sumados por jugador
+                cursor.executemany(
+                    "INSERT INTO jugadores_tableros (user_id, id_tablero, cantidad_bolitas, monto_pagado) VALUES (%s, %s, %s, %s)",
+                    [(user_id, id_tablero, cantidad, costo) for user_id, cantidad, costo in aceptados]
+                )
+                nuevos = sum(1 for user_id in por_jugador if previas.get(user_id) is None)
+                registrar_lote_en_contadores(
+                    cursor, id_tablero, {user_id: tuple(totales) for user_id, totales in por_jugador.items()}, nuevos
+                )
+
+                # 5️⃣ Jackpot: el mismo upsert de comprar_bolitas, una vez con los totales del lote
+                cursor.execute("""
+                    INSERT INTO jackpots (id_tablero, acum_bolitas, monto_acumulado, ganancia_bruta, premio_sponsor, premio_ganador)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        acum_bolitas = acum_bolitas + VALUES(acum_bolitas),
+                        monto_acumulado = monto_acumulado + VALUES(monto_acumulado),
+                        ganancia_bruta = monto_acumulado * %s,
+                        premio_sponsor = monto_acumulado * %s,
+                        premio_ganador = monto_acumulado * %s
+                """, (
+                    id_tablero, cantidad_total, costo_total,
+                    costo_total * porcentaje_pagos["porcentaje_casa"],
+                    costo_total * porcentaje_pagos["porcentaje_sponsor"],
+                    costo_total * porcentaje_pagos["porcentaje_ganador"],
+                    porcentaje_pagos["porcentaje_casa"],
+                    porcentaje_pagos["porcentaje_sponsor"],
+                    porcentaje_pagos["porcentaje_ganador"],
+                ))
+
+                etapa = "commit"
+                conn.commit()
+                etapa = "confirmado"
+            except Exception:
+                conn.rollback()
+                raise
+    except Exception as e:
+        if etapa == "commit":
+            raise CommitIncierto(f"No se pudo confirmar el lote de {len(aceptados)} compras del tablero {id_tablero}.") from e
+        if etapa != "confirmado":
+            raise
+        # El lote ya quedó confirmado; falló al devolver la conexión
+        log.warning("⚠️ Error después de confirmar un lote del tablero %s", id_tablero, exc_info=True)
+
+    return respuestas, list(por_jugador)
+
+
+# ✅ Efectos de un lote ya confirmado; nunca lanza (la compra ya está hecha)
+def despues_del_commit(id_tablero, user_ids):
+    if not user_ids:
+        return
+    try:
+        for user_id in user_ids:
+            marcar_escritura(user_id)  # Sus próximas lecturas van a la primaria (leer lo propio)
+        invalidar_tableros(id_tablero)
+        get_hub().avisar_compra(id_tablero)  # Un aviso por lote al jackpot en vivo
+    except Exception:
+        log.exception("❌ Error al avisar el lote confirmado del tablero %s", id_tablero)
+
+
+class ColaCompras:
+    """Una fila de pedidos y un worker por tablero; cada pedido espera la respuesta de su lote."""
+
+    def __init__(self, lote_max=COMPRAS_LOTE_MAX, lote_ms=COMPRAS_LOTE_MS, aplicar=aplicar_lote):
+        self.lote_max = lote_max
+        self.lote_segundos = lote_ms / 1000
+        self._aplicar = aplicar
+        self._filas = {}  # id_tablero -> [(user_id, cantidad, futuro)]
+        self._tareas = {}  # id_tablero -> worker
+        self.lotes = 0
+
+    # ✅ Encolar una compra y esperar su mensaje (el mismo que devolvería comprar_bolitas)
+    async def comprar(self, user_id, id_tablero, cantidad):
+        try:
+            id_tablero = int(id_tablero)
+        except (TypeError, ValueError):
+            return TABLERO_NO_ENCONTRADO
+        futuro = asyncio.get_running_loop().create_future()
+        self._filas.setdefault(id_tablero, []).append((user_id, cantidad, futuro))
+        if id_tablero not in self._tareas:
+            # Contexto vacío: el worker no hereda la medición ni el contexto de log del primer comprador
+            self._tareas[id_tablero] = asyncio.create_task(
+                self._trabajar(id_tablero), name=f"compras_tablero_{id_tablero}", context=contextvars.Context()
+            )
+        return await futuro
+
+    def pendientes(self):
+        return sum(len(fila) for fila in self._filas.values())
+
+    async def detener(self, timeout=10):
+        """Esperar a que se confirmen las compras encoladas (hasta `timeout` segundos)."""
+        tareas = list(self._tareas.values())
+        if not tareas:
+            return
+        _, sin_terminar = await asyncio.wait(tareas, timeout=timeout)
+        if not sin_terminar:
+            return
+        log.error("❌ Se apagó con %s compras sin confirmar", self.pendientes())
+        for tarea in sin_terminar:
+            tarea.cancel()
+        await asyncio.gather(*sin_terminar, return_exceptions=True)
+        for fila in self._filas.values():
+            self._abortar(fila)
+        self._filas.clear()
+
+    @staticmethod
+    def _abortar(pedidos):
+        for _, _, futuro in pedidos:
+            if not futuro.done():
+                futuro.set_exception(RuntimeError("La compra no se procesó: el servidor se está apagando."))
+
+    async def _trabajar(self, id_tablero):
+        lote = []
+        try:
+            while self._filas.get(id_tablero):
+                fila = self._filas[id_tablero]
+                # Si hay poco en la fila, esperar un momento para juntar la ráfaga en una sola transacción
+                if len(fila) < self.lote_max and self.lote_segundos > 0:
+                    await asyncio.sleep(self.lote_segundos)
+                lote = fila[:self.lote_max]
+                del fila[:self.lote_max]
+                await self._confirmar(id_tablero, lote)
+                lote = []
+        except asyncio.CancelledError:
+            self._abortar(lote)  # Quien esperaba el lote en curso no se queda colgado
+            raise
+        finally:
+            del self._tareas[id_tablero]
+            if not self._filas.get(id_tablero):
+                self._filas.pop(id_tablero, None)
+
+    async def _confirmar(self, id_tablero, lote):
+        try:
+            respuestas, confirmados = await run_db(
+                self._aplicar, id_tablero, [(user_id, cantidad) for user_id, cantidad, _ in lote]
+            )
+        except CommitIncierto as e:
+            # Reintentar podría cobrar dos veces: cada comprador recibe el error y revisa su saldo
+            log.error("❌ %s", e, exc_info=True)
+            for _, _, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        except Exception as e:
+            # Falló antes del commit: nada quedó escrito, se puede repartir el lote
+            if len(lote) == 1:
+                if not lote[0][2].done():
+                    lote[0][2].set_exception(e)
+                return
+            log.warning("⚠️ Falló un lote de %s compras del tablero %s, se reintentan una por una",
+                        len(lote), id_tablero, exc_info=True)
+            for pedido in lote:
+                await self._confirmar(id_tablero, [pedido])
+            return
+
+        despues_del_commit(id_tablero, confirmados)
+        self.lotes += 1
+        COMPRAS_LOTE.observe(len(lote))
+        for (_, _, futuro), respuesta in zip(lote, respuestas):
+            if not futuro.done():  # El comprador pudo haberse ido; la compra queda hecha igual
+                futuro.set_result(respuesta)
+
+
+_cola = None
+
+
+# ✅ Cola compartida por el proceso (los workers arrancan con la primera compra de cada tablero)
+def get_cola_compras():
+    global _cola
+    if _cola is None:
+        _cola = ColaCompras()
+    return _cola
+
+
+async def detener_cola_compras():
+    global _cola
+    cola, _cola = _cola, None
+    if cola is not None:
+        await cola.detener()
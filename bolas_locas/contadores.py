@@ -0,0 +1,175 @@
+"""
+Contadores materializados de bolitas por (tablero, jugador) y por tablero.
+
+Se actualizan en la misma transacción de cada compra, así los handlers leen una
+fila por clave primaria en vez de sumar todo jugadores_tableros. Las tablas las crea
+`python -m bolas_locas.esquema migrar`; este módulo permite reconstruirlos o
+verificarlos contra el log de compras:
+
+    python -m bolas_locas.contadores verificar
+    python -m bolas_locas.contadores reconstruir [--tablero ID]
+"""
+import argparse
+import sys
+from contextlib import closing
+
+from bolas_locas.db import db_connection
+
+
+# ✅ Bolitas compradas por un jugador en un tablero (None si nunca compró); requiere cursor dictionary=True
+def bolitas_del_jugador(cursor, id_tablero, user_id):
+    cursor.execute(
+        "SELECT cantidad_bolitas FROM jugadores_tableros_resumen WHERE id_tablero = %s AND user_id = %s",
+        (id_tablero, user_id)
+    )
+    fila = cursor.fetchone()
+    if fila is None:
+        return None
+    return fila["cantidad_bolitas"]
+
+
+# ✅ Bolitas compradas por varios jugadores en un tablero: {user_id: cantidad}, solo los que ya compraron
+def bolitas_de_jugadores(cursor, id_tablero, user_ids):
+    if not user_ids:
+        return {}
+    marcadores = ", ".join(["%s"] * len(user_ids))
+    cursor.execute(
+        f"SELECT user_id, cantidad_bolitas FROM jugadores_tableros_resumen WHERE id_tablero = %s AND user_id IN ({marcadores})",
+        (id_tablero, *user_ids)
+    )
+    return {fila["user_id"]: fila["cantidad_bolitas"] for fila in cursor.fetchall()}
+
+
+# ✅ Sumar una compra a los contadores; `jugador_nuevo` indica si es su primera compra en el tablero
+def registrar_en_contadores(cursor, id_tablero, user_id, cantidad, monto, jugador_nuevo):
+    cursor.execute("""
+        INSERT INTO jugadores_tableros_resumen (id_tablero, user_id, cantidad_bolitas, monto_pagado)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            cantidad_bolitas = cantidad_bolitas + VALUES(cantidad_bolitas),
+            monto_pagado = monto_pagado + VALUES(monto_pagado)
+    """, (id_tablero, user_id, cantidad, monto))
+    cursor.execute("""
+        INSERT INTO tableros_resumen (id_tablero, jugadores, cantidad_bolitas, monto_pagado)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            jugadores = jugadores + VALUES(jugadores),
+            cantidad_bolitas = cantidad_bolitas + VALUES(cantidad_bolitas),
+            monto_pagado = monto_pagado + VALUES(monto_pagado)
+    """, (id_tablero, 1 if jugador_nuevo else 0, cantidad, monto))
+
+
+# ✅ Sumar un lote de compras de un tablero: `compras` = {user_id: (cantidad, monto)} ya agregadas por jugador,
+# `nuevos` = cuántos de esos jugadores compran por primera vez en el tablero
+def registrar_lote_en_contadores(cursor, id_tablero, compras, nuevos):
+    # executemany de un INSERT ... VALUES (también con ON DUPLICATE KEY UPDATE) va como una sola sentencia
+    cursor.executemany("""
+        INSERT INTO jugadores_tableros_resumen (id_tablero, user_id, cantidad_bolitas, monto_pagado)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            cantidad_bolitas = cantidad_bolitas + VALUES(cantidad_bolitas),
+            monto_pagado = monto_pagado + VALUES(monto_pagado)
+    """, [(id_tablero, user_id, cantidad, monto) for user_id, (cantidad, monto) in sorted(compras.items())])
+    cursor.execute("""
+        INSERT INTO tableros_resumen (id_tablero, jugadores, cantidad_bolitas, monto_pagado)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            jugadores = jugadores + VALUES(jugadores),
+            cantidad_bolitas = cantidad_bolitas + VALUES(cantidad_bolitas),
+            monto_pagado = monto_pagado + VALUES(monto_pagado)
+    """, (id_tablero, nuevos, sum(c for c, _ in compras.values()), sum(m for _, m in compras.values())))
+
+
+# ✅ Reconstruir los contadores desde jugadores_tableros (todo o un tablero)
+def reconstruir(id_tablero=None):
+    filtro = "WHERE id_tablero = %s" if id_tablero is not None else ""
+    params = (id_tablero,) if id_tablero is not None else ()
+
+    with db_connection() as conn, closing(conn.cursor()) as cursor:
+        conn.start_transaction()
+        try:
+            cursor.execute(f"DELETE FROM jugadores_tableros_resumen {filtro}", params)
+            cursor.execute(f"DELETE FROM tableros_resumen {filtro}", params)
+            cursor.execute(f"""
+                INSERT INTO jugadores_tableros_resumen (id_tablero, user_id, cantidad_bolitas, monto_pagado)
+                SELECT id_tablero, user_id, SUM(cantidad_bolitas), SUM(monto_pagado)
+                FROM jugadores_tableros {filtro}
+                GROUP BY id_tablero, user_id
+            """, params)
+            cursor.execute(f"""
+                INSERT INTO tableros_resumen (id_tablero, jugadores, cantidad_bolitas, monto_pagado)
+                SELECT id_tablero, COUNT(*), SUM(cantidad_bolitas), SUM(monto_pagado)
+                FROM jugadores_tableros_resumen {filtro}
+                GROUP BY id_tablero
+            """, params)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+# ✅ Comparar los contadores con el log; devuelve la lista de diferencias
+def verificar():
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute("""
+            SELECT l.id_tablero, l.user_id, l.bolitas AS log_bolitas, r.cantidad_bolitas AS resumen_bolitas,
+                   l.pagado AS log_pagado, r.monto_pagado AS resumen_pagado
+            FROM (
+                SELECT id_tablero, user_id, SUM(cantidad_bolitas) AS bolitas, SUM(monto_pagado) AS pagado
+                FROM jugadores_tableros
+                GROUP BY id_tablero, user_id
+            ) l
+            LEFT JOIN jugadores_tableros_resumen r ON r.id_tablero = l.id_tablero AND r.user_id = l.user_id
+            WHERE r.user_id IS NULL OR r.cantidad_bolitas <> l.bolitas OR r.monto_pagado <> l.pagado
+            UNION ALL
+            SELECT r.id_tablero, r.user_id, NULL, r.cantidad_bolitas, NULL, r.monto_pagado
+            FROM jugadores_tableros_resumen r
+            WHERE NOT EXISTS (
+                SELECT 1 FROM jugadores_tableros jt WHERE jt.id_tablero = r.id_tablero AND jt.user_id = r.user_id
+            )
+        """)
+        diferencias = [dict(fila, tipo="jugador") for fila in cursor.fetchall()]
+
+        cursor.execute("""
+            SELECT r.id_tablero, r.jugadores, r.cantidad_bolitas, r.monto_pagado,
+                   t.jugadores AS total_jugadores, t.cantidad_bolitas AS total_bolitas, t.monto_pagado AS total_pagado
+            FROM (
+                SELECT id_tablero, COUNT(*) AS jugadores, SUM(cantidad_bolitas) AS cantidad_bolitas, SUM(monto_pagado) AS monto_pagado
+                FROM jugadores_tableros_resumen
+                GROUP BY id_tablero
+            ) r
+            LEFT JOIN tableros_resumen t ON t.id_tablero = r.id_tablero
+            WHERE t.id_tablero IS NULL OR t.jugadores <> r.jugadores
+               OR t.cantidad_bolitas <> r.cantidad_bolitas OR t.monto_pagado <> r.monto_pagado
+            UNION ALL
+            SELECT t.id_tablero, NULL, NULL, NULL, t.jugadores, t.cantidad_bolitas, t.monto_pagado
+            FROM tableros_resumen t
+            WHERE NOT EXISTS (SELECT 1 FROM jugadores_tableros_resumen r WHERE r.id_tablero = t.id_tablero)
+        """)
+        diferencias += [dict(fila, tipo="tablero") for fila in cursor.fetchall()]
+
+    return diferencias
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("verificar", help="comparar contadores con jugadores_tableros")
+    rec = sub.add_parser("reconstruir", help="recalcular contadores desde jugadores_tableros")
+    rec.add_argument("--tablero", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.comando == "reconstruir":
+        reconstruir(args.tablero)
+        print("✅ Contadores reconstruidos.")
+    else:
+        diferencias = verificar()
+        for diferencia in diferencias:
+            print(f"❌ {diferencia}")
+        if diferencias:
+            sys.exit(1)
+        print("✅ Contadores consistentes con jugadores_tableros.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""
+Esquema de la base: tablas, índices y su versión.
+
+Cada migración tiene un número y una lista de pasos; las aplicadas quedan en
+`esquema_version`. En MySQL el DDL hace commit implícito, así que una migración no es
+atómica: por eso todos los pasos son idempotentes (CREATE TABLE IF NOT EXISTS, índices
+que se agregan solo si no hay uno equivalente) y volver a correr `migrar` tras una falla
+termina el trabajo.
+
+Sobre una base existente las tablas ya están y solo se agregan los índices que falten.
+
+    python -m bolas_locas.esquema migrar
+    python -m bolas_locas.esquema estado
+
+Para revisar los planes de las consultas de webhook.py: python -m bolas_locas.auditoria
+"""
+import argparse
+import logging
+import sys
+from contextlib import closing
+
+from bolas_locas.db import db_connection
+
+
+log = logging.getLogger(__name__)
+
+
+class Indice:
+    """Índice que se agrega solo si la tabla no tiene ya uno con las mismas primeras columnas."""
+
+    def __init__(self, tabla, nombre, columnas, unico=False):
+        self.tabla = tabla
+        self.nombre = nombre
+        self.columnas = tuple(columnas)
+        self.unico = unico
+
+    def __repr__(self):
+        return f"{'UNIQUE ' if self.unico else ''}INDEX {self.nombre} ON {self.tabla} ({', '.join(self.columnas)})"
+
+    def existente(self, cursor):
+        cursor.execute("""
+            SELECT index_name, non_unique, column_name
+            FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s
+            ORDER BY index_name, seq_in_index
+        """, (self.tabla,))
+        indices = {}
+        for nombre, non_unique, columna in cursor.fetchall():
+            indices.setdefault(nombre, (not non_unique, []))[1].append(columna)
+        for nombre, (unico, columnas) in indices.items():
+            if self.unico:
+                # Un único sirve solo si es exactamente sobre las mismas columnas
+                if unico and tuple(columnas) == self.columnas:
+                    return nombre
+            elif tuple(columnas[:len(self.columnas)]) == self.columnas:
+                return nombre
+        return None
+
+    def aplicar(self, cursor):
+        nombre = self.existente(cursor)
+        if nombre:
+            log.info("✅ %s ya cubierto por %s", self, nombre)
+            return
+        log.info("🛠️ Creando %s", self)
+        cursor.execute(
+            f"ALTER TABLE {self.tabla} ADD {'UNIQUE ' if self.unico else ''}INDEX {self.nombre} ({', '.join(self.columnas)})"
+        )
+
+
+class Columna:
+    """Columna que se agrega solo si la tabla todavía no la tiene."""
+
+    def __init__(self, tabla, nombre, definicion):
+        self.tabla = tabla
+        self.nombre = nombre
+        self.definicion = definicion
+
+    def __repr__(self):
+        return f"COLUMN {self.tabla}.{self.nombre} {self.definicion}"
+
+    def existente(self, cursor):
+        cursor.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (self.tabla, self.nombre))
+        return cursor.fetchone() is not None
+
+    def aplicar(self, cursor):
+        if self.existente(cursor):
+            log.info("✅ %s ya existe", self)
+            return
+        log.info("🛠️ Creando %s", self)
+        cursor.execute(f"ALTER TABLE {self.tabla} ADD COLUMN {self.nombre} {self.definicion}")
+
+
+# Migración 1: las tablas que usa la app (sobre la base de producción ya existen y no se tocan)
+TABLAS_BASE = [
+    """
+    CREATE TABLE IF NOT EXISTS jugadores (
+        user_id BIGINT NOT NULL PRIMARY KEY,
+        numero_celular VARCHAR(15) NOT NULL,
+        alias VARCHAR(50) NOT NULL,
+        sponsor VARCHAR(50) NULL,
+        saldo DECIMAL(15, 2) NOT NULL DEFAULT 0,
+        fecha_registro DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tableros (
+        id_tablero INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        nombre VARCHAR(100) NOT NULL,
+        precio_por_bolita DECIMAL(15, 2) NOT NULL,
+        max_bolitas INT NOT NULL,
+        min_bolitas_por_jugador INT NOT NULL DEFAULT 1,
+        max_bolitas_por_jugador INT NOT NULL,
+        estado VARCHAR(20) NOT NULL DEFAULT 'abierto',
+        fecha_creacion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS jugadores_tableros (
+        id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        id_tablero INT NOT NULL,
+        cantidad_bolitas INT NOT NULL,
+        monto_pagado DECIMAL(15, 2) NOT NULL,
+        fecha_compra DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS jackpots (
+        id_tablero INT NOT NULL PRIMARY KEY,
+        acum_bolitas INT NOT NULL DEFAULT 0,
+        monto_acumulado DECIMAL(15, 2) NOT NULL DEFAULT 0,
+        ganancia_bruta DECIMAL(15, 2) NOT NULL DEFAULT 0,
+        premio_sponsor DECIMAL(15, 2) NOT NULL DEFAULT 0,
+        premio_ganador DECIMAL(15, 2) NOT NULL DEFAULT 0,
+        alias_ganador VARCHAR(50) NULL,
+        sponsor_ganador VARCHAR(50) NULL,
+        estado VARCHAR(20) NOT NULL DEFAULT 'abierto',
+        link_soporte VARCHAR(255) NULL,
+        fecha_pago DATETIME NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS configuracion_pagos (
+        id_config INT NOT NULL PRIMARY KEY,
+        porcentaje_casa DECIMAL(5, 4) NOT NULL,
+        porcentaje_sponsor DECIMAL(5, 4) NOT NULL,
+        porcentaje_ganador DECIMAL(5, 4) NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS albumes (
+        id_album INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        nombre VARCHAR(100) NOT NULL,
+        descripcion TEXT NULL,
+        precio DECIMAL(15, 2) NOT NULL,
+        estado VARCHAR(20) NOT NULL DEFAULT 'activo'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS compras_albumes (
+        id_compra_album BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        id_album INT NOT NULL,
+        estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+        fecha_compra DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        fecha_confirmacion DATETIME NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS laminas (
+        id_lamina INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        id_album INT NOT NULL,
+        nombre VARCHAR(100) NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS laminas_obtenidas (
+        id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        id_lamina INT NOT NULL,
+        fecha DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS coleccion_laminas (
+        user_id BIGINT NOT NULL,
+        id_album INT NOT NULL,
+        id_lamina INT NOT NULL,
+        cantidad INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, id_album, id_lamina)
+    )
+    """,
+]
+
+# Migración 2: contadores materializados (antes en bolas_locas/contadores.py)
+TABLAS_CONTADORES = [
+    """
+    CREATE TABLE IF NOT EXISTS jugadores_tableros_resumen (
+        id_tablero INT NOT NULL,
+        user_id BIGINT NOT NULL,
+        cantidad_bolitas INT NOT NULL DEFAULT 0,
+        monto_pagado DECIMAL(15, 2) NOT NULL DEFAULT 0,
+        PRIMARY KEY (id_tablero, user_id),
+        KEY idx_resumen_user (user_id, id_tablero)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tableros_resumen (
+        id_tablero INT NOT NULL PRIMARY KEY,
+        jugadores INT NOT NULL DEFAULT 0,
+        cantidad_bolitas INT NOT NULL DEFAULT 0,
+        monto_pagado DECIMAL(15, 2) NOT NULL DEFAULT 0
+    )
+    """,
+]
+
+# Migración 3: historial mensual de participación (antes en bolas_locas/historial.py)
+TABLAS_HISTORIAL = [
+    """
+    CREATE TABLE IF NOT EXISTS participacion_mensual (
+        user_id BIGINT NOT NULL,
+        mes DATE NOT NULL,
+        id_tablero INT NOT NULL,
+        cantidad_bolitas INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, mes, id_tablero)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS participacion_tableros (
+        id_tablero INT NOT NULL PRIMARY KEY,
+        fecha_registro DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+# El upsert del jackpot en cada compra depende de que id_tablero sea único: sin esta
+# clave cada compra insertaría otra fila en jackpots (ver verificar_claves)
+JACKPOT_POR_TABLERO = Indice("jackpots", "uq_jackpots_tablero", ["id_tablero"], unico=True)
+
+# Migración 4: índices de las búsquedas calientes
+INDICES_CONSULTAS = [
+    Indice("jugadores", "uq_jugadores_user_id", ["user_id"], unico=True),
+    Indice("jugadores", "idx_jugadores_alias", ["alias"]),
+    Indice("jugadores", "idx_jugadores_celular", ["numero_celular"]),
+    Indice("jugadores_tableros", "idx_jt_tablero_user", ["id_tablero", "user_id"]),
+    Indice("jugadores_tableros", "idx_jt_user_tablero", ["user_id", "id_tablero"]),
+    JACKPOT_POR_TABLERO,
+    Indice("jackpots", "idx_jackpots_alias_ganador", ["alias_ganador"]),
+    Indice("jackpots", "idx_jackpots_sponsor_ganador", ["sponsor_ganador"]),
+    Indice("tableros", "idx_tableros_estado", ["estado"]),
+    Indice("compras_albumes", "idx_compras_albumes_estado", ["estado", "id_compra_album"]),
+    Indice("compras_albumes", "idx_compras_albumes_user_album", ["user_id", "id_album"]),
+    Indice("laminas", "idx_laminas_album", ["id_album"]),
+    Indice("laminas_obtenidas", "idx_laminas_obtenidas_user", ["user_id", "id_lamina"]),
+]
+
+# Migración 5: libro de ganancias por jugador (ver bolas_locas/ganancias.py)
+TABLAS_GANANCIAS = [
+    """
+    CREATE TABLE IF NOT EXISTS ganancias_jugadores (
+        user_id BIGINT NOT NULL,
+        id_tablero INT NOT NULL,
+        ganador TINYINT(1) NOT NULL DEFAULT 0,
+        sponsor TINYINT(1) NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, id_tablero)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ganancias_tableros (
+        id_tablero INT NOT NULL PRIMARY KEY,
+        fecha_registro DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+# Migración 6: asignación automática de sponsor (ver bolas_locas/sponsors.py)
+# Los jugadores que ya existían reciben id_registro en el orden de la tabla (por user_id)
+SPONSORS = [
+    Columna("jugadores", "id_registro", "BIGINT NOT NULL AUTO_INCREMENT UNIQUE KEY"),
+    Columna("jugadores", "referidos", "INT NOT NULL DEFAULT 0"),
+    # Recalcular es idempotente: fija el total, no suma
+    """
+    UPDATE jugadores j
+    JOIN (SELECT sponsor, COUNT(*) AS total FROM jugadores GROUP BY sponsor) r ON r.sponsor = j.alias
+    SET j.referidos = r.total
+    """,
+    Indice("jugadores", "idx_jugadores_referidos", ["referidos", "id_registro"]),
+    """
+    CREATE TABLE IF NOT EXISTS sponsor_rotacion (
+        id TINYINT NOT NULL PRIMARY KEY,
+        siguiente BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT IGNORE INTO sponsor_rotacion (id, siguiente) VALUES (1, 0)",
+]
+
+# Migración 7: alias y celular únicos; el registro se apoya en estas restricciones (ver bolas_locas/registro.py)
+# Si hay repetidos el ALTER falla: listarlos con `python -m bolas_locas.registro duplicados`
+UNICOS_JUGADORES = [
+    Indice("jugadores", "uq_jugadores_alias", ["alias"], unico=True),
+    Indice("jugadores", "uq_jugadores_celular", ["numero_celular"], unico=True),
+]
+
+# Migración 8: callbacks de Bold que no se pudieron aplicar (ver bolas_locas/callbacks_bold.py)
+CALLBACKS_DESCARTADOS = [
+    """
+    CREATE TABLE IF NOT EXISTS callbacks_descartados (
+        id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        referencia BIGINT NOT NULL,
+        estado VARCHAR(255) NOT NULL,
+        error VARCHAR(500) NOT NULL,
+        fecha DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        KEY idx_callbacks_descartados_referencia (referencia)
+    )
+    """,
+]
+
+# Migración 9: con qué ganador y sponsor se registró cada tablero en el libro de ganancias;
+# si jackpots cambia después (p. ej. el sponsor se llena tarde), sincronizar() lo rehace
+GANANCIAS_REGISTRADAS = [
+    Columna("ganancias_tableros", "alias_ganador", "VARCHAR(50) NULL"),
+    Columna("ganancias_tableros", "sponsor_ganador", "VARCHAR(50) NULL"),
+]
+
+# (versión, nombre, pasos); un paso es una sentencia SQL o un objeto con aplicar(cursor)
+MIGRACIONES = [
+    (1, "tablas base", TABLAS_BASE),
+    (2, "contadores materializados", TABLAS_CONTADORES),
+    (3, "historial mensual", TABLAS_HISTORIAL),
+    (4, "índices de consultas", INDICES_CONSULTAS),
+    (5, "libro de ganancias", TABLAS_GANANCIAS),
+    (6, "asignación de sponsor", SPONSORS),
+    (7, "alias y celular únicos", UNICOS_JUGADORES),
+    (8, "callbacks descartados", CALLBACKS_DESCARTADOS),
+    (9, "ganancias registradas", GANANCIAS_REGISTRADAS),
+]
+
+DDL_VERSION = """
+    CREATE TABLE IF NOT EXISTS esquema_version (
+        version INT NOT NULL PRIMARY KEY,
+        nombre VARCHAR(100) NOT NULL,
+        aplicada DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def versiones_aplicadas(cursor):
+    cursor.execute(DDL_VERSION)
+    cursor.execute("SELECT version FROM esquema_version")
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+def pendientes():
+    with db_connection() as conn, closing(conn.cursor()) as cursor:
+        aplicadas = versiones_aplicadas(cursor)
+    return [(version, nombre) for version, nombre, _ in MIGRACIONES if version not in aplicadas]
+
+
+class EsquemaIncompleto(RuntimeError):
+    """Falta una clave de la que depende el código; se arregla con `python -m bolas_locas.esquema migrar`."""
+
+
+# ✅ Claves sin las que las compras corrompen datos en vez de fallar; se revisan al arrancar
+CLAVES_REQUERIDAS = [JACKPOT_POR_TABLERO]
+
+
+def claves_faltantes():
+    with db_connection() as conn, closing(conn.cursor()) as cursor:
+        return [clave for clave in CLAVES_REQUERIDAS if clave.existente(cursor) is None]
+
+
+def verificar_claves():
+    faltan = claves_faltantes()
+    if faltan:
+        raise EsquemaIncompleto(
+            f"Faltan {', '.join(map(repr, faltan))}: correr `python -m bolas_locas.esquema migrar`"
+        )
+
+
+# ✅ Aplicar en orden las migraciones que falten; devuelve la lista de versiones aplicadas
+def migrar(hasta=None):
+    aplicadas_ahora = []
+    with db_connection() as conn, closing(conn.cursor()) as cursor:
+        aplicadas = versiones_aplicadas(cursor)
+        for version, nombre, pasos in MIGRACIONES:
+            if version in aplicadas or (hasta is not None and version > hasta):
+                continue
+            log.info("🛠️ Migración %s: %s", version, nombre)
+            for paso in pasos:
+                if isinstance(paso, str):
+                    cursor.execute(paso)
+                else:
+                    paso.aplicar(cursor)
+            cursor.execute("INSERT INTO esquema_version (version, nombre) VALUES (%s, %s)", (version, nombre))
+            conn.commit()
+            aplicadas_ahora.append(version)
+    return aplicadas_ahora
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    mig = sub.add_parser("migrar", help="aplicar las migraciones pendientes")
+    mig.add_argument("--hasta", type=int, default=None, help="no pasar de esta versión")
+    sub.add_parser("estado", help="listar las migraciones pendientes y las claves que falten")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.comando == "migrar":
+        aplicadas = migrar(args.hasta)
+        print(f"✅ Migraciones aplicadas: {aplicadas or 'ninguna, el esquema está al día'}")
+    else:
+        faltan = pendientes()
+        for version, nombre in faltan:
+            print(f"⏳ {version}: {nombre}")
+        claves = claves_faltantes()
+        for clave in claves:
+            print(f"❌ Falta {clave!r}")
+        if faltan or claves:
+            sys.exit(1)
+        print(f"✅ Esquema al día (versión {MIGRACIONES[-1][0]}).")
+
+
+if __name__ == "__main__":
+    main()
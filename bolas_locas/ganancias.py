@@ -0,0 +1,164 @@
+"""
+Libro de ganancias: una fila por (jugador, tablero) donde el jugador fue ganador o sponsor del ganador.
+
+actMisTabGanados lee esta tabla por su clave primaria (user_id, id_tablero), de a una
+página, en vez de buscar en jackpots con `alias_ganador = %s OR sponsor_ganador = %s`
+(el OR no puede usar un solo índice). Los datos que cambian después de liquidar
+(estado, link de soporte, fecha de pago) se siguen leyendo de jackpots por su PK.
+
+Las filas se escriben al liquidar cada tablero (cuando jackpots tiene alias_ganador):
+- quien liquida el tablero llama a `registrar_liquidacion(id_tablero)` o
+  `python -m bolas_locas.ganancias liquidar ID`
+- por si la liquidación se hizo por fuera, la app corre `sincronizar()` cada
+  GANANCIAS_SINCRONIZAR_SEGUNDOS y registra los tableros liquidados que falten
+
+ganancias_tableros guarda el ganador y el sponsor con que se registró cada tablero:
+si después cambian en jackpots (el sponsor_ganador suele llenarse más tarde),
+`sincronizar()` rehace las filas de ese tablero.
+
+Las tablas las crea `python -m bolas_locas.esquema migrar`.
+
+    python -m bolas_locas.ganancias sincronizar
+    python -m bolas_locas.ganancias liquidar ID
+    python -m bolas_locas.ganancias reconstruir
+"""
+import argparse
+import asyncio
+import logging
+from contextlib import closing
+
+from bolas_locas.db import db_connection, run_db
+
+
+log = logging.getLogger(__name__)
+
+
+def _volcar(cursor, filtro, params):
+    # Rehacer desde cero las filas del tablero: quien dejó de ser ganador o sponsor no queda en el libro
+    cursor.execute(f"""
+        DELETE g FROM ganancias_jugadores g
+        JOIN jackpots j ON j.id_tablero = g.id_tablero
+        WHERE {filtro}
+    """, params)
+    # Un jugador puede ser ganador y sponsor del mismo tablero: una sola fila con las dos marcas
+    cursor.execute(f"""
+        INSERT INTO ganancias_jugadores (user_id, id_tablero, ganador, sponsor)
+        SELECT u.user_id, j.id_tablero,
+               MAX(u.alias = j.alias_ganador), MAX(u.alias <=> j.sponsor_ganador)
+        FROM jackpots j
+        JOIN jugadores u ON u.alias IN (j.alias_ganador, j.sponsor_ganador)
+        WHERE {filtro}
+        GROUP BY u.user_id, j.id_tablero
+        ON DUPLICATE KEY UPDATE ganador = VALUES(ganador), sponsor = VALUES(sponsor)
+    """, params)
+    cursor.execute(f"""
+        INSERT INTO ganancias_tableros (id_tablero, alias_ganador, sponsor_ganador)
+        SELECT j.id_tablero, j.alias_ganador, j.sponsor_ganador FROM jackpots j WHERE {filtro}
+        ON DUPLICATE KEY UPDATE alias_ganador = VALUES(alias_ganador), sponsor_ganador = VALUES(sponsor_ganador)
+    """, params)
+
+
+# ✅ Registrar en el libro al ganador y al sponsor de un tablero liquidado
+def registrar_liquidacion(id_tablero):
+    with db_connection() as conn, closing(conn.cursor()) as cursor:
+        conn.start_transaction()
+        try:
+            _volcar(cursor, "j.id_tablero = %s AND j.alias_ganador IS NOT NULL", (id_tablero,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+# ✅ Registrar los tableros liquidados que faltan en el libro o cuyo ganador/sponsor cambió
+# desde que se registraron; devuelve cuántos eran
+def sincronizar():
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute("""
+            SELECT j.id_tablero
+            FROM jackpots j
+            LEFT JOIN ganancias_tableros g ON g.id_tablero = j.id_tablero
+            WHERE j.alias_ganador IS NOT NULL
+              AND (g.id_tablero IS NULL
+                   OR NOT (g.alias_ganador <=> j.alias_ganador)
+                   OR NOT (g.sponsor_ganador <=> j.sponsor_ganador))
+        """)
+        faltantes = [fila["id_tablero"] for fila in cursor.fetchall()]
+        if not faltantes:
+            return 0
+
+        marcadores = ", ".join(["%s"] * len(faltantes))
+        conn.rollback()  # Cerrar la transacción implícita del SELECT (autocommit apagado)
+        conn.start_transaction()
+        try:
+            _volcar(cursor, f"j.id_tablero IN ({marcadores}) AND j.alias_ganador IS NOT NULL", tuple(faltantes))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    log.info("🏆 Libro de ganancias: %s tableros liquidados registrados o actualizados", len(faltantes))
+    return len(faltantes)
+
+
+# ✅ Rehacer el libro completo desde jackpots
+def reconstruir():
+    with db_connection() as conn, closing(conn.cursor()) as cursor:
+        conn.start_transaction()
+        try:
+            cursor.execute("DELETE FROM ganancias_jugadores")
+            cursor.execute("DELETE FROM ganancias_tableros")
+            _volcar(cursor, "j.alias_ganador IS NOT NULL", ())
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+# ✅ Una página de tableros ganados por el jugador, del más reciente al más viejo
+# Devuelve (filas, hay_mas); requiere cursor dictionary=True
+def pagina_de_ganancias(cursor, user_id, pagina, por_pagina):
+    cursor.execute("""
+        SELECT g.id_tablero, g.ganador, g.sponsor,
+               j.monto_acumulado, j.alias_ganador, j.sponsor_ganador, j.premio_ganador, j.premio_sponsor,
+               j.estado, j.link_soporte, j.fecha_pago, j.acum_bolitas
+        FROM ganancias_jugadores g
+        JOIN jackpots j ON j.id_tablero = g.id_tablero
+        WHERE g.user_id = %s
+        ORDER BY g.id_tablero DESC
+        LIMIT %s OFFSET %s
+    """, (user_id, por_pagina + 1, (pagina - 1) * por_pagina))
+    filas = cursor.fetchall()
+    return filas[:por_pagina], len(filas) > por_pagina
+
+
+async def sincronizar_periodicamente(intervalo):
+    """Tarea del lifespan: mantiene el libro al día aunque la liquidación se haga por fuera."""
+    while True:
+        try:
+            await run_db(sincronizar)
+        except Exception:
+            log.warning("⚠️ No se pudo sincronizar el libro de ganancias", exc_info=True)
+        await asyncio.sleep(intervalo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("sincronizar", help="registrar los tableros liquidados que falten o cambiaron")
+    liquidar = sub.add_parser("liquidar", help="registrar un tablero recién liquidado")
+    liquidar.add_argument("id_tablero", type=int)
+    sub.add_parser("reconstruir", help="rehacer el libro completo")
+    args = parser.parse_args(argv)
+
+    if args.comando == "sincronizar":
+        print(f"✅ Tableros registrados: {sincronizar()}")
+    elif args.comando == "liquidar":
+        registrar_liquidacion(args.id_tablero)
+        print(f"✅ Tablero {args.id_tablero} registrado en el libro de ganancias.")
+    else:
+        reconstruir()
+        print("✅ Libro de ganancias reconstruido.")
+
+
+if __name__ == "__main__":
+    main()
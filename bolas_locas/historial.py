@@ -0,0 +1,150 @@
+"""
+Historial mensual de participación: una fila por (jugador, mes, tablero) de los tableros cerrados.
+
+actMisTabJugados lee esta tabla por rango de meses sobre su clave primaria, en vez de
+recorrer jugadores_tableros con YEAR()/MONTH() (que no pueden usar índices) y DISTINCT.
+El mes es el de la fecha de creación del tablero, como antes.
+
+Las filas se escriben al cerrar cada tablero, de una vez y desde el resumen por jugador:
+- quien cierra el tablero llama a `registrar_cierre(id_tablero)` o
+  `python -m bolas_locas.historial cerrar ID`
+- por si el cierre se hizo por fuera, la app corre `sincronizar()` cada
+  HISTORIAL_SINCRONIZAR_SEGUNDOS y registra los tableros cerrados que falten
+
+Las tablas las crea `python -m bolas_locas.esquema migrar`.
+
+    python -m bolas_locas.historial sincronizar
+    python -m bolas_locas.historial cerrar ID
+    python -m bolas_locas.historial reconstruir
+"""
+import argparse
+import asyncio
+import logging
+from contextlib import closing
+from datetime import date
+
+from bolas_locas.db import db_connection, run_db
+
+
+log = logging.getLogger(__name__)
+
+# Primer día del mes de creación del tablero, sin DATE_FORMAT (evita escapar los % en los parámetros)
+_MES_TABLERO = "DATE_SUB(DATE(t.fecha_creacion), INTERVAL DAY(t.fecha_creacion) - 1 DAY)"
+
+
+def _volcar(cursor, filtro, params):
+    cursor.execute(f"""
+        INSERT IGNORE INTO participacion_mensual (user_id, mes, id_tablero, cantidad_bolitas)
+        SELECT r.user_id, {_MES_TABLERO}, r.id_tablero, r.cantidad_bolitas
+        FROM tableros t
+        JOIN jugadores_tableros_resumen r ON r.id_tablero = t.id_tablero
+        WHERE {filtro}
+    """, params)
+    cursor.execute(f"""
+        INSERT IGNORE INTO participacion_tableros (id_tablero)
+        SELECT t.id_tablero FROM tableros t WHERE {filtro}
+    """, params)
+
+
+# ✅ Volcar al historial los jugadores de un tablero cerrado (una sola sentencia para todo el tablero)
+def registrar_cierre(id_tablero):
+    with db_connection() as conn, closing(conn.cursor()) as cursor:
+        conn.start_transaction()
+        try:
+            _volcar(cursor, "t.id_tablero = %s AND t.estado != 'abierto'", (id_tablero,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+# ✅ Registrar los tableros cerrados que todavía no están en el historial; devuelve cuántos eran
+def sincronizar():
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute("""
+            SELECT t.id_tablero
+            FROM tableros t
+            LEFT JOIN participacion_tableros p ON p.id_tablero = t.id_tablero
+            WHERE t.estado != 'abierto' AND p.id_tablero IS NULL
+        """)
+        faltantes = [fila["id_tablero"] for fila in cursor.fetchall()]
+        if not faltantes:
+            return 0
+
+        marcadores = ", ".join(["%s"] * len(faltantes))
+        conn.rollback()  # Cerrar la transacción implícita del SELECT (autocommit apagado)
+        conn.start_transaction()
+        try:
+            _volcar(cursor, f"t.id_tablero IN ({marcadores}) AND t.estado != 'abierto'", tuple(faltantes))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    log.info("🗂️ Historial mensual: %s tableros cerrados registrados", len(faltantes))
+    return len(faltantes)
+
+
+# ✅ Rehacer el historial completo desde jugadores_tableros_resumen
+def reconstruir():
+    with db_connection() as conn, closing(conn.cursor()) as cursor:
+        conn.start_transaction()
+        try:
+            cursor.execute("DELETE FROM participacion_mensual")
+            cursor.execute("DELETE FROM participacion_tableros")
+            _volcar(cursor, "t.estado != 'abierto'", ())
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+# ✅ Tableros jugados por mes, para los meses [desde, hasta] (fechas del primer día de cada mes)
+# Devuelve {date(anio, mes, 1): [id_tablero, ...]} solo con los meses que tienen tableros
+def tableros_por_mes(cursor, user_id, desde, hasta):
+    cursor.execute("""
+        SELECT mes, id_tablero
+        FROM participacion_mensual
+        WHERE user_id = %s AND mes BETWEEN %s AND %s
+        ORDER BY mes, id_tablero
+    """, (user_id, desde, hasta))
+    meses = {}
+    for fila in cursor.fetchall():
+        meses.setdefault(fila["mes"], []).append(fila["id_tablero"])
+    return meses
+
+
+def primer_dia(anio, mes):
+    return date(anio, mes, 1)
+
+
+async def sincronizar_periodicamente(intervalo):
+    """Tarea del lifespan: mantiene el historial al día aunque el cierre se haga por fuera."""
+    while True:
+        try:
+            await run_db(sincronizar)
+        except Exception:
+            log.warning("⚠️ No se pudo sincronizar el historial mensual", exc_info=True)
+        await asyncio.sleep(intervalo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("sincronizar", help="registrar los tableros cerrados que falten")
+    cerrar = sub.add_parser("cerrar", help="registrar un tablero recién cerrado")
+    cerrar.add_argument("id_tablero", type=int)
+    sub.add_parser("reconstruir", help="rehacer el historial completo")
+    args = parser.parse_args(argv)
+
+    if args.comando == "sincronizar":
+        print(f"✅ Tableros registrados: {sincronizar()}")
+    elif args.comando == "cerrar":
+        registrar_cierre(args.id_tablero)
+        print(f"✅ Tablero {args.id_tablero} registrado en el historial.")
+    else:
+        reconstruir()
+        print("✅ Historial reconstruido.")
+
+
+if __name__ == "__main__":
+    main()
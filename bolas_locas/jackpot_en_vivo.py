@@ -0,0 +1,251 @@
+"""
+Jackpot en vivo: Server-Sent Events por tablero para la mini-app (GET /tablero/{id}/jackpot/eventos).
+
+En vez de que cada cliente consulte /tablero/{id}/jackpot cada pocos segundos, el
+servidor avisa cuando el jackpot cambia:
+- cada compra confirmada llama a `avisar_compra(id_tablero)` (desde el hilo de DB)
+- el hub lee el jackpot UNA vez y lo reparte a todos los suscriptores del tablero; las
+  compras que llegan mientras tanto se juntan en el siguiente envío, a lo sumo
+  JACKPOT_ENVIOS_POR_SEGUNDO por tablero
+- el mensaje se codifica una sola vez; cada suscriptor solo espera un asyncio.Event,
+  así que miles de clientes inactivos no cuestan consultas ni tareas extra
+- cada JACKPOT_REFRESCO_SEGUNDOS se relee el jackpot de los tableros con suscriptores
+  (compras atendidas por otros workers o hechas por fuera de la app)
+
+Cada conexión dura a lo sumo JACKPOT_EVENTOS_MAX_SEGUNDOS; EventSource se reconecta solo
+(campo `retry`), lo que reparte los clientes entre workers y no frena los reinicios.
+
+    const fuente = new EventSource(`/tablero/${id}/jackpot/eventos`);
+    fuente.addEventListener("jackpot", (e) => pintar(JSON.parse(e.data)));
+"""
+import asyncio
+import logging
+import time
+from contextlib import closing
+
+from bolas_locas.db import db_connection, run_db
+from bolas_locas.metricas import JACKPOT_ENVIOS, JACKPOT_SUSCRIPTORES
+from bolas_locas.respuestas import a_json
+from config import (
+    JACKPOT_ENVIOS_POR_SEGUNDO,
+    JACKPOT_REFRESCO_SEGUNDOS,
+    JACKPOT_LATIDO_SEGUNDOS,
+    JACKPOT_EVENTOS_MAX_SEGUNDOS,
+)
+
+
+log = logging.getLogger(__name__)
+
+LATIDO = b": latido\n\n"  # Comentario SSE: mantiene viva la conexión a través de proxies
+
+
+# ✅ Leer el jackpot de un tablero (en la primaria: se publica justo después de una compra)
+def leer_jackpot(id_tablero):
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute(
+            "SELECT id_tablero, acum_bolitas, premio_ganador, premio_sponsor FROM jackpots WHERE id_tablero = %s",
+            (id_tablero,)
+        )
+        return cursor.fetchone()
+
+
+class Canal:
+    """Estado de un tablero: último jackpot publicado y el Event que despierta a sus suscriptores."""
+
+    __slots__ = ("id_tablero", "suscriptores", "datos", "mensaje", "version", "cambio",
+                 "cargado", "pendiente", "ultimo_envio", "tarea")
+
+    def __init__(self, id_tablero):
+        self.id_tablero = id_tablero
+        self.suscriptores = 0
+        self.datos = None
+        self.mensaje = None  # Evento SSE ya codificado
+        self.version = 0
+        self.cambio = asyncio.Event()  # Se reemplaza en cada publicación
+        self.cargado = False
+        self.pendiente = False
+        self.ultimo_envio = 0.0
+        self.tarea = None
+
+
+class HubJackpots:
+    """Reparto en proceso de las actualizaciones de jackpot a los suscriptores de cada tablero."""
+
+    def __init__(self, envios_por_segundo=JACKPOT_ENVIOS_POR_SEGUNDO, leer=leer_jackpot):
+        self.intervalo = 1 / envios_por_segundo if envios_por_segundo > 0 else 0
+        self._leer = leer
+        self._canales = {}
+        self._loop = None
+        self._refresco = None
+        self._cerrado = False
+        self.lecturas = 0
+
+    def iniciar(self, refresco=JACKPOT_REFRESCO_SEGUNDOS):
+        self._loop = asyncio.get_running_loop()
+        self._cerrado = False
+        if self._refresco is None and refresco > 0:
+            self._refresco = asyncio.create_task(self._refrescar(refresco), name="jackpot_en_vivo")
+
+    async def detener(self):
+        """Cortar todos los streams (cada cliente se reconecta a otro worker) y parar el refresco."""
+        self._cerrado = True
+        if self._refresco is not None:
+            self._refresco.cancel()
+            self._refresco = None
+        for canal in list(self._canales.values()):
+            if canal.tarea is not None:
+                canal.tarea.cancel()
+            canal.cambio.set()
+        self._loop = None
+
+    # ✅ Avisar que el jackpot de un tablero cambió; se puede llamar desde cualquier hilo
+    def avisar_compra(self, id_tablero):
+        loop = self._loop
+        try:
+            id_tablero = int(id_tablero)  # Dialogflow manda el ID como texto; los canales usan el de la ruta
+        except (TypeError, ValueError):
+            return
+        if loop is None or id_tablero not in self._canales:
+            return  # Nadie mirando ese tablero en este worker
+        try:
+            loop.call_soon_threadsafe(self._programar, id_tablero)
+        except RuntimeError:
+            pass  # El loop ya se cerró (apagado)
+
+    def _programar(self, id_tablero):
+        canal = self._canales.get(id_tablero)
+        if canal is None:
+            return
+        if canal.tarea is None:
+            canal.tarea = asyncio.create_task(self._enviar(canal))
+        else:
+            canal.pendiente = True  # Va en el próximo envío
+
+    async def _enviar(self, canal):
+        try:
+            while True:
+                espera = canal.ultimo_envio + self.intervalo - time.monotonic()
+                if espera > 0:
+                    await asyncio.sleep(espera)
+                canal.pendiente = False
+                canal.ultimo_envio = time.monotonic()
+                self.lecturas += 1
+                try:
+                    datos = await run_db(self._leer, canal.id_tablero)
+                except Exception:
+                    log.warning("⚠️ No se pudo leer el jackpot del tablero %s", canal.id_tablero, exc_info=True)
+                    self._despertar(canal)  # Quien espera la primera carga no se queda colgado
+                else:
+                    self._publicar(canal, datos)
+                if not canal.pendiente:
+                    break
+        finally:
+            canal.tarea = None
+
+    def _publicar(self, canal, datos):
+        if canal.cargado and datos == canal.datos:
+            return  # Sin cambios (p. ej. un refresco periódico)
+        canal.cargado = True
+        canal.datos = datos
+        canal.version += 1
+        if datos is not None:
+            canal.mensaje = b"id: %d\nevent: jackpot\ndata: %s\n\n" % (canal.version, a_json(datos))
+            JACKPOT_ENVIOS.inc()
+        self._despertar(canal)
+
+    @staticmethod
+    def _despertar(canal):
+        evento, canal.cambio = canal.cambio, asyncio.Event()
+        evento.set()
+
+    def _canal(self, id_tablero):
+        canal = self._canales.get(id_tablero)
+        if canal is None:
+            canal = self._canales[id_tablero] = Canal(id_tablero)
+        return canal
+
+    def _soltar(self, canal):
+        if canal.suscriptores == 0 and canal.tarea is None and self._canales.get(canal.id_tablero) is canal:
+            del self._canales[canal.id_tablero]
+
+    async def _cargar(self, canal):
+        """Primer valor del tablero; los clientes que llegan juntos comparten la misma lectura."""
+        if canal.cargado or self._cerrado:
+            return
+        cambio = canal.cambio
+        self._programar(canal.id_tablero)
+        await cambio.wait()
+        if not canal.cargado and not self._cerrado:
+            raise RuntimeError(f"No se pudo leer el jackpot del tablero {canal.id_tablero}.")
+
+    # ✅ Jackpot actual del tablero (None si no existe), sin leer MySQL si el tablero ya tiene canal
+    # El canal queda abierto para el stream que sigue; el refresco periódico limpia los que nadie usó
+    async def foto(self, id_tablero):
+        canal = self._canal(id_tablero)
+        await self._cargar(canal)
+        if canal.datos is None:
+            self._soltar(canal)
+        return canal.datos
+
+    # ✅ Eventos SSE de un tablero: el valor actual y luego cada cambio, con latidos entre medio
+    async def eventos(self, id_tablero, latido=JACKPOT_LATIDO_SEGUNDOS, max_segundos=JACKPOT_EVENTOS_MAX_SEGUNDOS):
+        canal = self._canal(id_tablero)
+        canal.suscriptores += 1
+        JACKPOT_SUSCRIPTORES.inc()
+        fin = time.monotonic() + max_segundos
+        try:
+            yield b"retry: 3000\n\n"
+            await self._cargar(canal)
+            version = 0
+            while not self._cerrado:
+                if canal.version != version:
+                    version = canal.version
+                    if canal.mensaje is not None:
+                        yield canal.mensaje
+                    continue
+                restante = fin - time.monotonic()
+                if restante <= 0:
+                    break
+                cambio = canal.cambio
+                try:
+                    await asyncio.wait_for(cambio.wait(), min(latido, restante))
+                except asyncio.TimeoutError:
+                    yield LATIDO
+        finally:
+            canal.suscriptores -= 1
+            JACKPOT_SUSCRIPTORES.dec()
+            self._soltar(canal)
+
+    async def _refrescar(self, intervalo):
+        while True:
+            await asyncio.sleep(intervalo)
+            for id_tablero, canal in list(self._canales.items()):
+                if not canal.suscriptores:
+                    self._soltar(canal)
+                elif canal.tarea is None:
+                    self._programar(id_tablero)
+
+    def stats(self):
+        return {
+            "tableros": len(self._canales),
+            "suscriptores": sum(c.suscriptores for c in self._canales.values()),
+            "lecturas": self.lecturas,
+        }
+
+
+_hub = None
+
+
+# ✅ Hub compartido por el proceso (el lifespan lo inicia y lo detiene)
+def get_hub():
+    global _hub
+    if _hub is None:
+        _hub = HubJackpots()
+    return _hub
+
+
+async def detener_hub():
+    global _hub
+    hub, _hub = _hub, None
+    if hub is not None:
+        await hub.detener()
@@ -0,0 +1,194 @@
+"""
+Logging estructurado sin bloquear el event loop.
+
+Los handlers solo encolan el registro (QueueHandler); un hilo aparte (QueueListener)
+lo formatea y lo escribe en stdout. Cada línea lleva los campos de correlación de la
+petición en curso: request_id, ruta, action y user_id.
+
+Configuración (config.py / variables de entorno):
+- LOG_LEVEL: nivel del logger "bolas_locas" (INFO por defecto)
+- LOG_FORMAT: "json" (una línea JSON por registro) o "texto"
+- LOG_MUESTREO: tasas por logger para rutas de alto volumen, p. ej.
+  "bolas_locas.webhook.acciones=0.05,bolas_locas.cache=0.1". Solo se muestrean
+  DEBUG/INFO; WARNING y superiores siempre se escriben.
+- LOG_COLA_MAX: registros en cola; si se llena se descartan (y se cuentan) en vez de esperar
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+from config import LOG_LEVEL, LOG_FORMAT, LOG_MUESTREO, LOG_COLA_MAX
+
+
+LOGGER_RAIZ = "bolas_locas"
+
+_contexto: ContextVar[dict | None] = ContextVar("bolas_locas_log_contexto", default=None)
+
+# Atributos propios de LogRecord; cualquier otro (contexto o `extra=`) se incluye en el JSON
+_ATRIBUTOS_RECORD = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+# ✅ Agregar campos de correlación a la petición en curso (los ve también el hilo de DB)
+def contexto_log(**campos):
+    actual = _contexto.get()
+    if actual is not None:
+        actual.update(campos)
+
+
+class ContextoFilter(logging.Filter):
+    """Copia los campos de la petición en curso al registro, en el hilo que loguea."""
+
+    def filter(self, record):
+        campos = _contexto.get()
+        if campos:
+            for clave, valor in campos.items():
+                setattr(record, clave, valor)
+        return True
+
+
+class MuestreoFilter(logging.Filter):
+    """Deja pasar solo una fracción de los registros DEBUG/INFO de un logger."""
+
+    def __init__(self, tasa):
+        super().__init__()
+        self.tasa = tasa
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.tasa >= 1:
+            return True
+        return random.random() < self.tasa
+
+
+class ColaSinEspera(QueueHandler):
+    """QueueHandler que nunca bloquea: con la cola llena descarta el registro."""
+
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+    def prepare(self, record):
+        # Solo se resuelve el mensaje; el formateo (JSON, trazas) lo hace el hilo del listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        linea = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.msg,
+        }
+        for clave, valor in record.__dict__.items():
+            if clave not in _ATRIBUTOS_RECORD:
+                linea[clave] = valor
+        if record.exc_info:
+            linea["exc"] = self.formatException(record.exc_info)
+        return json.dumps(linea, ensure_ascii=False, default=str)
+
+
+class TextoFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record):
+        texto = super().format(record)
+        campos = " ".join(
+            f"{clave}={getattr(record, clave)}" for clave in ("request_id", "action", "user_id") if hasattr(record, clave)
+        )
+        return f"{texto} [{campos}]" if campos else texto
+
+
+def _parsear_muestreo(texto):
+    tasas = {}
+    for parte in filter(None, (p.strip() for p in texto.split(","))):
+        nombre, _, tasa = parte.partition("=")
+        tasas[nombre.strip()] = float(tasa)
+    return tasas
+
+
+_listener = None
+_handler = None
+
+
+# ✅ Configurar el logger "bolas_locas" una sola vez por proceso (idempotente)
+def configurar_logging():
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextoFormatter())
+
+    cola = queue.Queue(maxsize=LOG_COLA_MAX)
+    nuevo = ColaSinEspera(cola)
+    nuevo.addFilter(ContextoFilter())
+
+    raiz = logging.getLogger(LOGGER_RAIZ)
+    raiz.setLevel(LOG_LEVEL)
+    for anterior in [h for h in raiz.handlers if isinstance(h, ColaSinEspera)]:
+        raiz.removeHandler(anterior)  # Reconfigurar tras detener_logging() no duplica líneas
+    raiz.addHandler(nuevo)
+    _handler = nuevo
+    raiz.propagate = False  # No duplicar en los handlers de uvicorn
+
+    for nombre, tasa in _parsear_muestreo(LOG_MUESTREO).items():
+        logger = logging.getLogger(nombre)
+        for anterior in [f for f in logger.filters if isinstance(f, MuestreoFilter)]:
+            logger.removeFilter(anterior)
+        logger.addFilter(MuestreoFilter(tasa))
+
+    _listener = QueueListener(cola, salida, respect_handler_level=True)
+    _listener.start()
+    atexit.register(detener_logging)
+
+
+# ✅ Vaciar la cola y detener el hilo (al apagar la app)
+def detener_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def registros_descartados():
+    return _handler.descartados if _handler is not None else 0
+
+
+class ContextoLogMiddleware:
+    """Middleware ASGI que abre el contexto de log de cada petición (request_id + ruta)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for nombre, valor in scope["headers"]:
+            if nombre == b"x-request-id":
+                request_id = valor.decode("latin-1")[:64]
+                break
+        token = _contexto.set({"request_id": request_id or uuid.uuid4().hex[:16], "ruta": scope["path"]})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _contexto.reset(token)
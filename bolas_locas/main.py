@@ -1,13 +1,80 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from pydantic import BaseModel
-from fastapi.responses import JSONResponse
-import mysql.connector
-from config import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
-from bolas_locas.webhook import router as webhook_router
-from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+from bolas_locas.db import pool_stats, calentar_pool, cerrar_pool, run_db, vigilar_replicas
+from bolas_locas.cache import cache_stats, perfiles_stats
+from bolas_locas.metricas import MetricasMiddleware, exportar as exportar_metricas
+from bolas_locas.logs import ContextoLogMiddleware, configurar_logging, detener_logging
+from bolas_locas.pagos import cerrar_cliente_bold
+from bolas_locas.callbacks_bold import get_cola_callbacks, detener_cola_callbacks
+from bolas_locas.historial import sincronizar_periodicamente
+from bolas_locas import ganancias
+from bolas_locas.jackpot_en_vivo import get_hub, detener_hub
+from bolas_locas.compras_agrupadas import detener_cola_compras
+from bolas_locas.webhook import router as webhook_router, calentar_caches
+from bolas_locas.esquema import EsquemaIncompleto, verificar_claves
 from fastapi.middleware.cors import CORSMiddleware
+from config import HISTORIAL_SINCRONIZAR_SEGUNDOS, GANANCIAS_SINCRONIZAR_SEGUNDOS, DB_REPLICA_CHECK_SECONDS
+
+log = logging.getLogger("bolas_locas.main")
+
+
+# ✅ Arranque y apagado: nada de esto corre al importar el módulo
+@asynccontextmanager
+async def lifespan(app):
+    # Logs estructurados por un hilo aparte (nivel, formato y muestreo en config.py)
+    configurar_logging()
+
+    # Abrir conexiones y cargar las cachés antes de la primera petición.
+    # Si MySQL no responde, la app arranca igual y las cachés se cargan bajo demanda.
+    inicio = time.perf_counter()
+    try:
+        conexiones = await run_db(calentar_pool)
+        await run_db(calentar_caches)
+        log.info("🔥 Calentamiento listo: %s conexiones nuevas en %.0f ms", conexiones, (time.perf_counter() - inicio) * 1000)
+    except Exception:
+        log.warning("⚠️ No se pudo calentar el pool o las cachés", exc_info=True)
+
+    # Sin UNIQUE(id_tablero) en jackpots cada compra duplicaría el jackpot: mejor no arrancar
+    try:
+        await run_db(verificar_claves)
+    except EsquemaIncompleto:
+        log.error("❌ Esquema incompleto, la app no arranca", exc_info=True)
+        raise
+    except Exception:
+        log.warning("⚠️ No se pudo verificar el esquema", exc_info=True)
+
+    # Worker que aplica los callbacks de Bold encolados por /callback_bold
+    get_cola_callbacks().iniciar()
+    # Historial mensual al día aunque los tableros se cierren por fuera de la app
+    historial = asyncio.create_task(sincronizar_periodicamente(HISTORIAL_SINCRONIZAR_SEGUNDOS))
+    # Libro de ganancias al día aunque los tableros se liquiden por fuera de la app
+    libro = asyncio.create_task(ganancias.sincronizar_periodicamente(GANANCIAS_SINCRONIZAR_SEGUNDOS))
+    # Salud y atraso de las réplicas de lectura (termina enseguida si no hay DB_REPLICAS)
+    replicas = asyncio.create_task(vigilar_replicas(DB_REPLICA_CHECK_SECONDS))
+    # Jackpot en vivo: las compras despiertan a los clientes de /tablero/{id}/jackpot/eventos
+    get_hub().iniciar()
 
-app = FastAPI()
+    yield
+
+    historial.cancel()
+    libro.cancel()
+    replicas.cancel()
+    await detener_hub()
+    # Confirmar las compras que siguen en cola (también necesitan el pool abierto)
+    await detener_cola_compras()
+    # Primero vaciar la cola de callbacks: necesita el pool abierto
+    await detener_cola_callbacks()
+    await cerrar_cliente_bold()
+    cerrar_pool()
+    detener_logging()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Configurar CORS
 app.add_middleware(
@@ -26,15 +93,28 @@ app.add_middleware(
     allow_headers=["*"],  # Permitir todos los headers
 )
 
+# Métricas de cada petición (latencia, tiempo de DB, errores, en curso); ver GET /metrics
+app.add_middleware(MetricasMiddleware)
+# request_id y ruta en cada línea de log de la petición
+app.add_middleware(ContextoLogMiddleware)
+
 
 app.include_router(webhook_router)
 
-# ✅ Función para conectar a la base de datos
-def get_db_connection():
-    return mysql.connector.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_NAME
-    )
+# ✅ Estadísticas del pool de conexiones (en uso, en espera, tiempos de espera, fugas)
+@app.get("/pool_stats")
+def get_pool_stats():
+    return JSONResponse(content=pool_stats())
+
+
+# ✅ Aciertos/fallos de la caché en memoria, para ajustar los TTL bajo carga
+@app.get("/cache_stats")
+def get_cache_stats():
+    return JSONResponse(content={**cache_stats(), "perfiles": perfiles_stats()})
+
+
+# ✅ Métricas en formato Prometheus (con PROMETHEUS_MULTIPROC_DIR suma todos los workers)
+@app.get("/metrics")
+def get_metrics():
+    cuerpo, content_type = exportar_metricas()
+    return Response(content=cuerpo, media_type=content_type)
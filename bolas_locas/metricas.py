@@ -0,0 +1,208 @@
+"""
+Métricas estilo Prometheus para la app (expuestas en GET /metrics).
+
+- bolas_locas_requests_total / bolas_locas_request_duration_seconds por handler
+  (acción de Dialogflow como "webhook:actJugar" o plantilla de ruta REST como "/tablero/{tablero_id}/jugadores")
+- bolas_locas_request_db_seconds: tiempo con una conexión del pool prestada durante la petición
+- bolas_locas_errors_total: excepciones y respuestas 5xx por handler
+- bolas_locas_requests_in_progress: peticiones en curso (webhook / rest)
+- bolas_locas_bold_*: llamadas a la pasarela Bold por resultado, latencia y estado del circuito
+- bolas_locas_bold_callbacks_*: callbacks de pago recibidos/aplicados, eventos en cola y tamaño de lote
+- bolas_locas_db_reads_total / bolas_locas_db_replica_healthy: lecturas por réplica o primaria y salud de cada réplica
+- bolas_locas_jackpot_subscribers / bolas_locas_jackpot_broadcasts_total: clientes del jackpot en vivo y envíos
+
+Con varios workers de uvicorn hay que definir PROMETHEUS_MULTIPROC_DIR (un directorio vacío
+al arrancar): cada proceso escribe sus valores ahí y /metrics los suma todos.
+"""
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+
+# Latencias de un bot: la mayoría entre unos ms y un par de segundos
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = Counter(
+    "bolas_locas_requests_total", "Peticiones atendidas", ["handler", "method", "status"]
+)
+DURACION = Histogram(
+    "bolas_locas_request_duration_seconds", "Latencia de cada petición", ["handler"], buckets=BUCKETS
+)
+TIEMPO_DB = Histogram(
+    "bolas_locas_request_db_seconds", "Tiempo con conexión MySQL prestada por petición", ["handler"], buckets=BUCKETS
+)
+ERRORES = Counter(
+    "bolas_locas_errors_total", "Excepciones y respuestas 5xx", ["handler", "tipo"]
+)
+EN_CURSO = Gauge(
+    "bolas_locas_requests_in_progress", "Peticiones en curso", ["tipo"], multiprocess_mode="livesum"
+)
+
+# Pasarela de pagos (bolas_locas/pagos.py)
+BOLD_LLAMADAS = Counter(
+    "bolas_locas_bold_calls_total", "Llamadas a Bold por resultado", ["operacion", "resultado"]
+)
+BOLD_DURACION = Histogram(
+    "bolas_locas_bold_duration_seconds", "Latencia de las respuestas de Bold", ["operacion"], buckets=BUCKETS
+)
+BOLD_CIRCUITO = Gauge(
+    "bolas_locas_bold_circuit_state", "Circuito de Bold: 0 cerrado, 1 semiabierto, 2 abierto", multiprocess_mode="max"
+)
+
+# Callbacks de pago (bolas_locas/callbacks_bold.py)
+CALLBACKS = Counter(
+    "bolas_locas_bold_callbacks_total", "Callbacks de Bold por resultado", ["resultado"]
+)
+CALLBACKS_EN_COLA = Gauge(
+    "bolas_locas_bold_callbacks_queued", "Callbacks esperando al worker", multiprocess_mode="livesum"
+)
+CALLBACKS_LOTE = Histogram(
+    "bolas_locas_bold_callbacks_batch_size", "Eventos aplicados por transacción", buckets=(1, 2, 5, 10, 25, 50, 100, 200, 500)
+)
+
+# Réplicas de lectura (bolas_locas/db.py)
+LECTURAS = Counter(
+    "bolas_locas_db_reads_total", "Conexiones de solo lectura por destino", ["destino"]
+)
+REPLICA_SANA = Gauge(
+    "bolas_locas_db_replica_healthy", "1 si la réplica recibe lecturas", ["replica"], multiprocess_mode="livemin"
+)
+
+# Jackpot en vivo (bolas_locas/jackpot_en_vivo.py)
+JACKPOT_SUSCRIPTORES = Gauge(
+    "bolas_locas_jackpot_subscribers", "Clientes conectados a /tablero/{id}/jackpot/eventos", multiprocess_mode="livesum"
+)
+JACKPOT_ENVIOS = Counter(
+    "bolas_locas_jackpot_broadcasts_total", "Actualizaciones de jackpot publicadas (una por tablero, no por cliente)"
+)
+
+
+# Compras agrupadas (bolas_locas/compras_agrupadas.py)
+COMPRAS_LOTE = Histogram(
+    "bolas_locas_purchases_batch_size", "Compras confirmadas por transacción en los tableros agrupados",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 200, 500)
+)
+
+
+class Medicion:
+    """Datos de la petición en curso; los hilos del pool de DB la ven vía contextvars."""
+
+    __slots__ = ("handler", "db_segundos")
+
+    def __init__(self):
+        self.handler = None
+        self.db_segundos = 0.0
+
+
+_medicion: ContextVar[Medicion | None] = ContextVar("bolas_locas_medicion", default=None)
+
+
+# ✅ El webhook indica qué acción atendió (la ruta sola no distingue entre acciones)
+# Solo nombres registrados (o "desconocida"), para no crear series sin límite
+def etiquetar_accion(action):
+    medicion = _medicion.get()
+    if medicion is not None:
+        medicion.handler = f"webhook:{action}"
+
+
+# ✅ Sumar tiempo de base de datos a la petición en curso (lo llama db_connection)
+def sumar_tiempo_db(segundos):
+    medicion = _medicion.get()
+    if medicion is not None:
+        medicion.db_segundos += segundos
+
+
+# ✅ Contar una excepción que el handler atrapa y convierte en mensaje (la respuesta sigue siendo 200)
+def registrar_error(error):
+    medicion = _medicion.get()
+    handler = medicion.handler if medicion is not None and medicion.handler else "interno"
+    ERRORES.labels(handler, type(error).__name__).inc()
+
+
+class MetricasMiddleware:
+    """Middleware ASGI puro (sin BaseHTTPMiddleware) para que medir cueste lo mínimo."""
+
+    def __init__(self, app, excluir=("/metrics",)):
+        self.app = app
+        self.excluir = set(excluir)
+        self._cache_series = {}  # (handler, método, estado) -> series ya resueltas; evita .labels() por petición
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluir:
+            await self.app(scope, receive, send)
+            return
+
+        tipo = "webhook" if scope["path"] == "/webhook" else "rest"
+        medicion = Medicion()
+        token = _medicion.set(medicion)
+        estado = [500]
+
+        async def send_con_estado(message):
+            if message["type"] == "http.response.start":
+                estado[0] = message["status"]
+            await send(message)
+
+        en_curso = EN_CURSO.labels(tipo)
+        en_curso.inc()
+        inicio = time.perf_counter()
+        excepcion = None
+        try:
+            await self.app(scope, receive, send_con_estado)
+        except Exception as e:
+            excepcion = e
+            raise
+        finally:
+            duracion = time.perf_counter() - inicio
+            en_curso.dec()
+            _medicion.reset(token)
+
+            handler = self._handler(scope, medicion)
+            contador, latencia, tiempo_db = self._series(handler, scope["method"], estado[0])
+            contador.inc()
+            latencia.observe(duracion)
+            tiempo_db.observe(medicion.db_segundos)
+            if excepcion is not None:
+                ERRORES.labels(handler, type(excepcion).__name__).inc()
+            elif estado[0] >= 500:
+                ERRORES.labels(handler, "http_5xx").inc()
+
+    def _series(self, handler, metodo, estado):
+        clave = (handler, metodo, estado)
+        series = self._cache_series.get(clave)
+        if series is None:
+            series = (
+                REQUESTS.labels(handler, metodo, str(estado)),
+                DURACION.labels(handler),
+                TIEMPO_DB.labels(handler),
+            )
+            self._cache_series[clave] = series
+        return series
+
+    @staticmethod
+    def _handler(scope, medicion):
+        if medicion.handler:
+            return medicion.handler
+        # El router deja la ruta encontrada en el scope; se usa su plantilla, no el path con IDs
+        ruta = scope.get("route")
+        return getattr(ruta, "path", None) or "sin_ruta"
+
+
+def exportar():
+    """Devuelve (cuerpo, content_type) con todas las métricas; suma todos los workers si hay multiproceso."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
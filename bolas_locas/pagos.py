@@ -0,0 +1,235 @@
+"""
+Cliente de la pasarela de pagos Bold.
+
+- Un solo httpx.AsyncClient por proceso, con conexiones keep-alive reutilizadas
+- Timeouts estrictos de conexión y de lectura (BOLD_CONNECT_TIMEOUT / BOLD_READ_TIMEOUT)
+- Reintentos acotados con backoff exponencial y jitter, solo en llamadas idempotentes
+  (consultas, o creaciones con Idempotency-Key). Un error al conectar se reintenta siempre:
+  la petición nunca llegó a Bold.
+- Circuit breaker: tras BOLD_BREAKER_FALLAS fallas seguidas las llamadas fallan de inmediato
+  durante BOLD_BREAKER_SEGUNDOS; luego se deja pasar una sola llamada de prueba.
+
+Para pruebas y benchmarks hay un servidor falso en benchmarks/stub_bold.py.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from bolas_locas.metricas import BOLD_LLAMADAS, BOLD_DURACION, BOLD_CIRCUITO
+from bolas_locas.respuestas import a_json
+from config import (
+    BOLD_API_URL,
+    BOLD_API_KEY,
+    BOLD_CONNECT_TIMEOUT,
+    BOLD_READ_TIMEOUT,
+    BOLD_MAX_CONEXIONES,
+    BOLD_REINTENTOS,
+    BOLD_BREAKER_FALLAS,
+    BOLD_BREAKER_SEGUNDOS,
+)
+
+
+log = logging.getLogger(__name__)
+
+
+class ErrorPasarela(Exception):
+    """Bold no respondió o respondió con error."""
+
+    def __init__(self, mensaje, status_code=None):
+        super().__init__(mensaje)
+        self.status_code = status_code
+
+
+class CircuitoAbiertoError(ErrorPasarela):
+    """El circuito está abierto: Bold viene fallando y no se intenta la llamada."""
+
+
+class CircuitBreaker:
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    SEMIABIERTO = "semiabierto"
+
+    def __init__(self, umbral_fallas, segundos_abierto):
+        self.umbral_fallas = umbral_fallas
+        self.segundos_abierto = segundos_abierto
+        self._lock = threading.Lock()
+        self._estado = self.CERRADO
+        self._fallas = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+
+    @property
+    def estado(self):
+        with self._lock:
+            return self._estado
+
+    def permitir(self):
+        """True si la llamada puede salir; en semiabierto solo pasa una a la vez."""
+        with self._lock:
+            if self._estado == self.CERRADO:
+                return True
+            if self._estado == self.ABIERTO:
+                if time.monotonic() - self._abierto_desde < self.segundos_abierto:
+                    return False
+                self._cambiar(self.SEMIABIERTO)
+            if self._prueba_en_curso:
+                return False
+            self._prueba_en_curso = True
+            return True
+
+    def exito(self):
+        with self._lock:
+            self._fallas = 0
+            self._prueba_en_curso = False
+            if self._estado != self.CERRADO:
+                self._cambiar(self.CERRADO)
+
+    def liberar(self):
+        """La llamada se canceló sin resultado: dejar pasar otra prueba."""
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def falla(self):
+        with self._lock:
+            self._fallas += 1
+            self._prueba_en_curso = False
+            if self._estado == self.SEMIABIERTO or self._fallas >= self.umbral_fallas:
+                self._abierto_desde = time.monotonic()
+                if self._estado != self.ABIERTO:
+                    self._cambiar(self.ABIERTO)
+
+    def _cambiar(self, estado):
+        log.warning("⚡ Circuito de Bold: %s -> %s", self._estado, estado)
+        self._estado = estado
+        BOLD_CIRCUITO.set({self.CERRADO: 0, self.SEMIABIERTO: 1, self.ABIERTO: 2}[estado])
+
+
+# Códigos que indican un problema del lado de Bold (cuentan para el breaker y se pueden reintentar)
+_CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+class ClienteBold:
+    def __init__(
+        self,
+        base_url=BOLD_API_URL,
+        api_key=BOLD_API_KEY,
+        connect_timeout=BOLD_CONNECT_TIMEOUT,
+        read_timeout=BOLD_READ_TIMEOUT,
+        max_conexiones=BOLD_MAX_CONEXIONES,
+        reintentos=BOLD_REINTENTOS,
+        breaker=None,
+        backoff_base=0.2,
+        backoff_max=2.0,
+        transport=None,
+    ):
+        import httpx  # Import diferido: solo se carga al primer pago
+
+        self._httpx = httpx
+        self.reintentos = reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker(BOLD_BREAKER_FALLAS, BOLD_BREAKER_SEGUNDOS)
+
+        headers = {"Content-Type": "application/json"}
+        if api_key:
+            headers["Authorization"] = f"x-api-key {api_key}"
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_conexiones,
+                max_keepalive_connections=max_conexiones,
+                keepalive_expiry=30,
+            ),
+            transport=transport,
+        )
+
+    # ✅ Crear la solicitud de pago; con idempotency_key Bold no duplica el cobro si se reintenta
+    async def crear_pago(self, datos, idempotency_key=None):
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        return await self._llamar(
+            "crear_pago", "POST", "/payments",
+            content=a_json(datos), headers=headers, idempotente=idempotency_key is not None,
+        )
+
+    # ✅ Consultar el estado de un pago (siempre idempotente)
+    async def consultar_pago(self, referencia):
+        return await self._llamar("consultar_pago", "GET", f"/payments/{referencia}", idempotente=True)
+
+    async def _llamar(self, operacion, metodo, ruta, idempotente, **kwargs):
+        httpx = self._httpx
+        intento = 0
+        while True:
+            if not self.breaker.permitir():
+                BOLD_LLAMADAS.labels(operacion, "circuito_abierto").inc()
+                raise CircuitoAbiertoError("Bold no está disponible en este momento.")
+
+            inicio = time.perf_counter()
+            try:
+                respuesta = await self._client.request(metodo, ruta, **kwargs)
+            except asyncio.CancelledError:
+                self.breaker.liberar()
+                raise
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                # La petición no salió: reintentar es seguro aunque la llamada no sea idempotente
+                error, resultado, reintentable = ErrorPasarela(f"No se pudo conectar con Bold: {e!r}"), "error_conexion", True
+            except httpx.TimeoutException as e:
+                error, resultado, reintentable = ErrorPasarela(f"Bold no respondió a tiempo: {e!r}"), "timeout", idempotente
+            except httpx.HTTPError as e:
+                error, resultado, reintentable = ErrorPasarela(f"Error de red con Bold: {e!r}"), "error_red", idempotente
+            else:
+                BOLD_DURACION.labels(operacion).observe(time.perf_counter() - inicio)
+                if respuesta.status_code < 400:
+                    self.breaker.exito()
+                    try:
+                        datos = respuesta.json()
+                    except ValueError:
+                        datos = None
+                    if not isinstance(datos, dict):
+                        # Un 2xx que no es un objeto JSON (p. ej. la página de un proxy): no reintentar, el cobro pudo crearse
+                        BOLD_LLAMADAS.labels(operacion, "respuesta_invalida").inc()
+                        raise ErrorPasarela(f"Bold respondió {respuesta.status_code} sin un objeto JSON.", respuesta.status_code)
+                    BOLD_LLAMADAS.labels(operacion, "ok").inc()
+                    return datos
+                if respuesta.status_code not in _CODIGOS_REINTENTABLES:
+                    # Error del lado nuestro (datos inválidos, auth...): Bold está sano
+                    self.breaker.exito()
+                    BOLD_LLAMADAS.labels(operacion, f"http_{respuesta.status_code}").inc()
+                    raise ErrorPasarela(f"Bold rechazó la solicitud ({respuesta.status_code}).", respuesta.status_code)
+                error = ErrorPasarela(f"Bold respondió {respuesta.status_code}.", respuesta.status_code)
+                resultado, reintentable = f"http_{respuesta.status_code}", idempotente
+
+            self.breaker.falla()
+            BOLD_LLAMADAS.labels(operacion, resultado).inc()
+            if not reintentable or intento >= self.reintentos:
+                raise error
+
+            # Backoff exponencial con jitter completo para no sincronizar reintentos entre workers
+            espera = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** intento))
+            intento += 1
+            log.info("🔁 Reintentando %s con Bold (intento %s) en %.2fs: %s", operacion, intento, espera, error)
+            await asyncio.sleep(espera)
+
+    async def cerrar(self):
+        await self._client.aclose()
+
+
+_cliente = None
+
+
+# ✅ Cliente compartido por todo el proceso (se crea al primer uso)
+def get_cliente_bold():
+    global _cliente
+    if _cliente is None:
+        _cliente = ClienteBold()
+    return _cliente
+
+
+async def cerrar_cliente_bold():
+    global _cliente
+    cliente, _cliente = _cliente, None
+    if cliente is not None:
+        await cliente.cerrar()
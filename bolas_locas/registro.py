@@ -0,0 +1,282 @@
+"""
+Registro de jugadores: uno a uno (actRegistrarUsuario) y masivo (campañas de inscripción).
+
+El registro es una sola transacción y se apoya en las restricciones únicas de jugadores
+(user_id, alias y numero_celular; migración 7) en vez de consultar antes de insertar:
+un choque de clave dice exactamente qué dato ya estaba en uso. El sponsor se valida en
+el mismo INSERT ... SELECT (si no existe no se inserta nada).
+
+El registro masivo valida en bloque (celulares, repetidos dentro del archivo, datos ya
+registrados y sponsors, con una consulta IN por lote) e inserta con sentencias multi-fila.
+Entrada: CSV o JSON con user_id, numero_celular, alias y sponsor ("auto" o vacío usa el
+sponsor por defecto o la estrategia de bolas_locas.sponsors). Dentro de un lote cada
+asignación automática ve las anteriores: con "ultimo" el sponsor es la fila aceptada justo
+antes y con "menos_referidos" el referido se suma al asignar, no al final del lote.
+
+    python -m bolas_locas.registro importar jugadores.csv [--sponsor ALIAS] [--lote 1000]
+    python -m bolas_locas.registro duplicados
+"""
+import argparse
+import csv
+import json
+import re
+import sys
+from collections import Counter
+from contextlib import closing
+
+from mysql.connector import errorcode, errors
+
+from bolas_locas.db import db_connection
+from bolas_locas.sponsors import asignar_sponsor, sumar_referido
+from config import REGISTRO_LOTE, SPONSOR_ESTRATEGIA
+
+
+# Motivos de rechazo (claves estables para el registro masivo y el bot)
+USUARIO_REGISTRADO = "usuario_registrado"
+ALIAS_EN_USO = "alias_en_uso"
+CELULAR_EN_USO = "celular_en_uso"
+SPONSOR_INEXISTENTE = "sponsor_inexistente"
+SIN_SPONSOR = "sin_sponsor"
+CELULAR_INVALIDO = "celular_invalido"
+DATOS_INCOMPLETOS = "datos_incompletos"
+REPETIDO_EN_ARCHIVO = "repetido_en_archivo"
+
+
+class ConflictoRegistro(Exception):
+    """El registro chocó con un dato único o le falta el sponsor; `motivo` es una de las constantes."""
+
+    def __init__(self, motivo, valor=None):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.valor = valor
+
+
+# ✅ Normalizar un celular de Nequi: solo dígitos, 10 y empezando por 3 (None si no es válido)
+def normalizar_celular(texto):
+    celular = re.sub(r"\D", "", str(texto or ""))
+    return celular if re.fullmatch(r"3\d{9}", celular) else None
+
+
+# ✅ Traducir un IntegrityError de clave duplicada al dato en conflicto
+def motivo_de_duplicado(error):
+    if getattr(error, "errno", None) != errorcode.ER_DUP_ENTRY:
+        return None
+    # "Duplicate entry '...' for key 'jugadores.uq_jugadores_alias'"; el nombre del índice depende de la base
+    clave = str(error).rsplit("for key", 1)[-1].lower()
+    if "celular" in clave:
+        return CELULAR_EN_USO
+    if "alias" in clave:
+        return ALIAS_EN_USO
+    return USUARIO_REGISTRADO
+
+
+_INSERTAR_CON_SPONSOR = """
+    INSERT INTO jugadores (numero_celular, alias, sponsor, user_id)
+    SELECT %s, %s, alias, %s FROM jugadores WHERE alias = %s LIMIT 1
+"""
+
+
+# ✅ Registrar un jugador en una transacción; devuelve el alias del sponsor o lanza ConflictoRegistro
+# `sponsor` None usa la estrategia de asignación automática
+def registrar(conn, cursor, user_id, celular, alias, sponsor=None):
+    conn.start_transaction()
+    try:
+        if sponsor is None:
+            sponsor = asignar_sponsor(cursor)
+            if not sponsor:
+                raise ConflictoRegistro(SIN_SPONSOR)
+        try:
+            cursor.execute(_INSERTAR_CON_SPONSOR, (celular, alias, user_id, sponsor))
+        except errors.IntegrityError as e:
+            motivo = motivo_de_duplicado(e)
+            if motivo is None:
+                raise
+            raise ConflictoRegistro(motivo, {ALIAS_EN_USO: alias, CELULAR_EN_USO: celular}.get(motivo, user_id))
+        if cursor.rowcount == 0:
+            raise ConflictoRegistro(SPONSOR_INEXISTENTE, sponsor)
+        sumar_referido(cursor, sponsor)
+        conn.commit()
+        return sponsor
+    except Exception:
+        conn.rollback()
+        raise
+
+
+##### 🟡🟡🟡 Registro masivo
+
+def _marcadores(valores):
+    return ", ".join(["%s"] * len(valores))
+
+
+def _existentes(cursor, columna, valores):
+    if not valores:
+        return set()
+    valores = list(valores)
+    cursor.execute(f"SELECT {columna} FROM jugadores WHERE {columna} IN ({_marcadores(valores)})", valores)
+    return {str(fila[columna]).lower() for fila in cursor.fetchall()}
+
+
+def _validar(filas, sponsor_por_defecto):
+    """Validación sin base: datos completos, celular y marca de repetidos dentro del archivo."""
+    aceptadas, rechazos = [], []
+    vistos = {"user_id": set(), "alias": set(), "numero_celular": set()}
+    for numero, fila in enumerate(filas, start=1):
+        user_id = str(fila.get("user_id") or "").strip()
+        alias = str(fila.get("alias") or "").strip()
+        sponsor = str(fila.get("sponsor") or "").strip()
+        if not sponsor or sponsor.lower() == "auto":
+            sponsor = sponsor_por_defecto
+        if not user_id.isdigit() or not alias:
+            rechazos.append({"fila": numero, "motivo": DATOS_INCOMPLETOS})
+            continue
+        celular = normalizar_celular(fila.get("numero_celular"))
+        if celular is None:
+            rechazos.append({"fila": numero, "user_id": user_id, "motivo": CELULAR_INVALIDO})
+            continue
+        datos = {"fila": numero, "user_id": user_id, "alias": alias, "numero_celular": celular, "sponsor": sponsor}
+        # Los alias se comparan sin mayúsculas, como la collation de MySQL. Los repetidos se
+        # rechazan al insertar su lote, así un dato que ya estaba en la base se reporta como "en uso"
+        datos["repetido"] = next((c for c in vistos if datos[c].lower() in vistos[c]), None)
+        for columna in vistos:
+            vistos[columna].add(datos[columna].lower())
+        aceptadas.append(datos)
+    return aceptadas, rechazos
+
+
+def _sponsor_automatico(cursor, validas, estrategia):
+    """Sponsor de una fila "auto" del lote; las filas aceptadas antes todavía no están en la tabla."""
+    if estrategia == "ultimo" and validas:
+        # El registrado inmediatamente antes es la fila anterior del mismo lote
+        return validas[-1]["alias"], False
+    sponsor = asignar_sponsor(cursor, estrategia)
+    if sponsor:
+        # Sumar ya el referido: la siguiente asignación del lote tiene que ver este conteo
+        # (SKIP LOCKED no salta las filas que bloquea la propia transacción)
+        sumar_referido(cursor, sponsor)
+    return sponsor, bool(sponsor)
+
+
+def _insertar_lote(conn, cursor, lote, rechazos, estrategia=None):
+    """Inserta un lote ya validado en una transacción; devuelve cuántos quedaron registrados."""
+    estrategia = estrategia or SPONSOR_ESTRATEGIA
+    conn.start_transaction()
+    try:
+        # Datos que ya están en la base: una consulta IN por columna
+        en_uso = [
+            (USUARIO_REGISTRADO, "user_id", _existentes(cursor, "user_id", {f["user_id"] for f in lote})),
+            (ALIAS_EN_USO, "alias", _existentes(cursor, "alias", {f["alias"] for f in lote})),
+            (CELULAR_EN_USO, "numero_celular", _existentes(cursor, "numero_celular", {f["numero_celular"] for f in lote})),
+        ]
+        # El sponsor puede ser un jugador ya registrado o uno aceptado antes en el mismo archivo
+        sponsors_validos = _existentes(cursor, "alias", {f["sponsor"] for f in lote if f["sponsor"]})
+
+        validas = []
+        ya_sumados = Counter()  # Referidos que _sponsor_automatico sumó al asignar
+        for fila in lote:
+            motivo = next((m for m, columna, valores in en_uso if fila[columna].lower() in valores), None)
+            if motivo is None and fila["repetido"]:
+                motivo = REPETIDO_EN_ARCHIVO
+            if motivo is None and fila["sponsor"] and fila["sponsor"].lower() not in sponsors_validos:
+                motivo = SPONSOR_INEXISTENTE
+            if motivo is None and not fila["sponsor"]:
+                fila["sponsor"], sumado = _sponsor_automatico(cursor, validas, estrategia)
+                if sumado:
+                    ya_sumados[fila["sponsor"]] += 1
+                motivo = None if fila["sponsor"] else SIN_SPONSOR
+            if motivo:
+                rechazos.append({"fila": fila["fila"], "user_id": fila["user_id"], "motivo": motivo})
+            else:
+                validas.append(fila)
+                sponsors_validos.add(fila["alias"].lower())
+
+        insertar = "INSERT INTO jugadores (numero_celular, alias, sponsor, user_id) VALUES (%s, %s, %s, %s)"
+        try:
+            # executemany de un INSERT ... VALUES se envía como una sola sentencia multi-fila
+            cursor.executemany(insertar, [(f["numero_celular"], f["alias"], f["sponsor"], f["user_id"]) for f in validas])
+        except errors.IntegrityError:
+            # Alguien se registró entre la validación y el INSERT: fila por fila para saber cuál chocó
+            # (en InnoDB un INSERT fallido solo deshace esa sentencia, no la transacción)
+            restantes = []
+            for fila in validas:
+                try:
+                    cursor.execute(insertar, (fila["numero_celular"], fila["alias"], fila["sponsor"], fila["user_id"]))
+                    restantes.append(fila)
+                except errors.IntegrityError as e:
+                    motivo = motivo_de_duplicado(e)
+                    if motivo is None:
+                        raise
+                    rechazos.append({"fila": fila["fila"], "user_id": fila["user_id"], "motivo": motivo})
+            validas = restantes
+
+        # Lo que falta sumar (o restar, si una fila con sponsor ya sumado chocó al insertar)
+        referidos = Counter(f["sponsor"] for f in validas)
+        referidos.subtract(ya_sumados)
+        ajustes = [(cantidad, alias) for alias, cantidad in referidos.items() if cantidad]
+        if ajustes:
+            cursor.executemany("UPDATE jugadores SET referidos = referidos + %s WHERE alias = %s", ajustes)
+        conn.commit()
+        return len(validas)
+    except Exception:
+        conn.rollback()
+        raise
+
+
+# ✅ Registrar muchos jugadores; devuelve {"registrados": n, "rechazados": [{fila, user_id, motivo}]}
+def importar(filas, sponsor_por_defecto=None, lote=REGISTRO_LOTE, estrategia=None):
+    aceptadas, rechazos = _validar(filas, sponsor_por_defecto)
+    registrados = 0
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        for inicio in range(0, len(aceptadas), lote):
+            registrados += _insertar_lote(conn, cursor, aceptadas[inicio:inicio + lote], rechazos, estrategia)
+    rechazos.sort(key=lambda r: r["fila"])
+    return {"registrados": registrados, "rechazados": rechazos}
+
+
+# ✅ Alias y celulares repetidos que impiden crear los índices únicos de la migración 7
+def duplicados():
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        encontrados = []
+        for columna in ("alias", "numero_celular"):
+            cursor.execute(f"""
+                SELECT {columna} AS valor, COUNT(*) AS veces, GROUP_CONCAT(user_id) AS usuarios
+                FROM jugadores GROUP BY {columna} HAVING COUNT(*) > 1
+            """)
+            encontrados += [dict(fila, columna=columna) for fila in cursor.fetchall()]
+    return encontrados
+
+##### 🟡🟡🟡 Fin Registro masivo
+
+
+def leer_archivo(ruta):
+    with open(ruta, encoding="utf-8-sig", newline="") as archivo:
+        if ruta.lower().endswith(".json"):
+            return json.load(archivo)
+        return list(csv.DictReader(archivo))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="comando", required=True)
+    imp = sub.add_parser("importar", help="registrar jugadores desde un CSV o JSON")
+    imp.add_argument("archivo")
+    imp.add_argument("--sponsor", default=None, help="sponsor para las filas sin sponsor (si no, asignación automática)")
+    imp.add_argument("--lote", type=int, default=REGISTRO_LOTE)
+    sub.add_parser("duplicados", help="listar alias y celulares repetidos")
+    args = parser.parse_args(argv)
+
+    if args.comando == "importar":
+        resultado = importar(leer_archivo(args.archivo), args.sponsor, args.lote)
+        for rechazo in resultado["rechazados"]:
+            print(f"❌ {rechazo}")
+        print(f"✅ Registrados: {resultado['registrados']}, rechazados: {len(resultado['rechazados'])}")
+    else:
+        encontrados = duplicados()
+        for duplicado in encontrados:
+            print(f"❌ {duplicado}")
+        if encontrados:
+            sys.exit(1)
+        print("✅ Sin alias ni celulares repetidos.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import json
+from decimal import Decimal
+
+from starlette.responses import JSONResponse as _StarletteJSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson viene con fastapi[all]
+    orjson = None
+
+
+def _por_defecto(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+# ✅ Serializar a bytes JSON (orjson si está disponible); lo usan las respuestas y el cliente de Bold
+def a_json(contenido):
+    if orjson is None:
+        return json.dumps(contenido, default=_por_defecto, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return orjson.dumps(contenido, default=_por_defecto, option=orjson.OPT_NON_STR_KEYS)
+
+
+# ✅ Leer JSON (bytes o str)
+def desde_json(datos):
+    if orjson is None:
+        return json.loads(datos)
+    return orjson.loads(datos)
+
+
+class JSONResponse(_StarletteJSONResponse):
+    """
+    Misma interfaz que fastapi.responses.JSONResponse, pero serializa con orjson
+    (varias veces más rápido). Los Decimal de MySQL salen como float y las fechas en ISO 8601.
+    """
+
+    def render(self, content):
+        return a_json(content)
@@ -0,0 +1,131 @@
+"""
+Peticiones condicionales (ETag / Last-Modified), compresión y Cache-Control para la API REST pública.
+
+/tableros_abiertos, /albumes_disponibles y /tablero/{id}/jackpot guardan la respuesta ya
+serializada (y comprimida con gzip si es grande) en la caché del proceso, con la versión
+del recurso en la clave (bolas_locas.cache: cada compra o escritura la sube). Mientras
+la entrada esté vigente:
+- un cliente con el ETag actual (If-None-Match) o con If-Modified-Since recibe 304
+  sin que se toque MySQL ni se serialice nada
+- los demás reciben los bytes guardados; gzip se comprime una vez, no por petición
+
+El ETag es un hash del cuerpo, así que es el mismo en todos los workers y un cliente
+que revalida en otro proceso también recibe 304 si nada cambió. El ETag de
+/tablero/{id}/jugadores se deriva del jackpot del tablero: toda compra cambia el
+acumulado, así que si el jackpot no cambió la lista tampoco.
+
+Las escrituras de otros workers o hechas por fuera de la app se ven al vencer el TTL de
+cada recurso, igual que con la caché de datos.
+"""
+import gzip
+import hashlib
+import time
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+
+from starlette.responses import Response
+
+from bolas_locas.cache import cache
+from bolas_locas.respuestas import a_json
+from config import HTTP_GZIP_MIN_BYTES
+
+
+class Representacion:
+    """Respuesta JSON lista para enviar: cuerpo, cuerpo en gzip (o None) y validadores."""
+
+    __slots__ = ("cuerpo", "cuerpo_gzip", "etag", "modificado")
+
+    def __init__(self, cuerpo, etag, modificado):
+        self.cuerpo = cuerpo
+        self.cuerpo_gzip = comprimir(cuerpo)
+        self.etag = etag
+        self.modificado = modificado
+
+
+# Último (etag, modificado) por recurso: si el contenido recargado es igual, Last-Modified no cambia
+_ultimos = {}
+
+
+def etag_de(cuerpo):
+    # Débil: la versión en gzip y la plana comparten ETag
+    return f'W/"{hashlib.blake2b(cuerpo, digest_size=8).hexdigest()}"'
+
+
+def comprimir(cuerpo):
+    return gzip.compress(cuerpo, 6, mtime=0) if len(cuerpo) >= HTTP_GZIP_MIN_BYTES else None
+
+
+def representar(recurso, contenido):
+    cuerpo = a_json(contenido)
+    etag = etag_de(cuerpo)
+    anterior = _ultimos.get(recurso)
+    modificado = anterior[1] if anterior and anterior[0] == etag else int(time.time())
+    _ultimos[recurso] = (etag, modificado)
+    return Representacion(cuerpo, etag, modificado)
+
+
+# ✅ Representación cacheada de un recurso; None si `cargar()` no devolvió nada (404)
+# `version` viene de bolas_locas.cache y cambia con cada escritura del recurso
+def cacheada(recurso, version, cargar, ttl):
+    def construir():
+        contenido = cargar()
+        return representar(recurso, contenido) if contenido else None
+    return cache.get_or_load(("http", recurso, version), construir, ttl)
+
+
+def _sin_prefijo_debil(etag):
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+# ✅ ¿El cliente ya tiene esta versión? If-None-Match manda; If-Modified-Since solo si no hay ETag
+def vigente(headers, etag, modificado=None):
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        buscado = _sin_prefijo_debil(etag)
+        return any(_sin_prefijo_debil(e) == buscado for e in if_none_match.split(","))
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and modificado is not None:
+        try:
+            return modificado <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def acepta_gzip(headers):
+    for codificacion in headers.get("accept-encoding", "").split(","):
+        nombre, _, parametros = codificacion.strip().partition(";")
+        if nombre.strip().lower() in ("gzip", "*"):
+            return parametros.replace(" ", "").lower() not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def cabeceras(etag, cache_control, modificado=None):
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if modificado is not None:
+        headers["Last-Modified"] = formatdate(modificado, usegmt=True)
+    return headers
+
+
+# ✅ 304 si el cliente está al día; si no, el cuerpo guardado (en gzip si lo acepta)
+def responder(request, representacion, cache_control):
+    headers = cabeceras(representacion.etag, cache_control, representacion.modificado)
+    if vigente(request.headers, representacion.etag, representacion.modificado):
+        return Response(status_code=304, headers=headers)
+    if representacion.cuerpo_gzip is not None and acepta_gzip(request.headers):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=representacion.cuerpo_gzip, media_type="application/json", headers=headers)
+    return Response(content=representacion.cuerpo, media_type="application/json", headers=headers)
+
+
+# ✅ Comprimir un cuerpo enviado por bloques; cada bloque sale completo (sync flush) para no retenerlo
+async def comprimir_stream(bloques):
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: formato gzip
+    async for bloque in bloques:
+        salida = compresor.compress(bloque) + compresor.flush(zlib.Z_SYNC_FLUSH)
+        if salida:
+            yield salida
+    yield compresor.flush()
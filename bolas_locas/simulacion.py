@@ -0,0 +1,265 @@
+"""
+Generador de compras masivas para pruebas de capacidad.
+
+Calcula todas las compras en memoria (saldos, límites por jugador, contadores y
+jackpot) y las escribe con INSERT multi-fila por lotes: un upsert de jackpot y de
+totales por tablero, no uno por compra.
+
+    python -m bolas_locas.simulacion --tableros 4 5 --jugadores 20000 --compras 50 --seed 7 --crear-jugadores --si
+
+Solo para bases de prueba (no hay endpoint): borra las compras de los tableros indicados
+(salvo --sin-reiniciar) y fija el saldo de los participantes; --si confirma que la base es de prueba.
+"""
+import argparse
+import random
+import sys
+import time
+from contextlib import closing
+from decimal import Decimal
+
+from bolas_locas.db import db_connection
+
+
+DISTRIBUCIONES = ("uniforme", "minimo", "maximo", "sesgada")
+
+# Jugadores sintéticos: user_id a partir de esta base para no chocar con IDs reales de Telegram
+BASE_USER_ID_SIMULADO = 9_000_000_000_000
+
+
+def _cantidad(rnd, distribucion, minimo, maximo):
+    if distribucion == "minimo":
+        return minimo
+    if distribucion == "maximo":
+        return maximo
+    if distribucion == "sesgada":
+        # La mayoría compra poco y unos pocos compran cerca del máximo
+        return int(round(rnd.triangular(minimo, maximo, minimo)))
+    return rnd.randint(minimo, maximo)
+
+
+def _lotes(filas, tamano):
+    for i in range(0, len(filas), tamano):
+        yield filas[i:i + tamano]
+
+
+def _crear_jugadores_simulados(cursor, faltantes, saldo, lote):
+    cursor.execute("SELECT COALESCE(MAX(user_id), %s) AS ultimo FROM jugadores WHERE user_id >= %s",
+                   (BASE_USER_ID_SIMULADO, BASE_USER_ID_SIMULADO))
+    ultimo = cursor.fetchone()["ultimo"]
+    filas = []
+    for i in range(1, faltantes + 1):
+        user_id = ultimo + i
+        filas.append((f"3{user_id % 10**9:09d}", f"sim{user_id}", "sim", user_id, saldo))
+    for bloque in _lotes(filas, lote):
+        cursor.executemany(
+            "INSERT INTO jugadores (numero_celular, alias, sponsor, user_id, saldo) VALUES (%s, %s, %s, %s, %s)",
+            bloque
+        )
+
+
+def simular_compras_masivas(
+    tableros,
+    jugadores=None,
+    compras_por_jugador=1,
+    distribucion="uniforme",
+    seed=None,
+    saldo_inicial=None,
+    reiniciar=True,
+    crear_jugadores=False,
+    lote=5000,
+):
+    """
+    Simula compras en `tableros` y devuelve un resumen por tablero.
+
+    - jugadores: cuántos jugadores participan (None = todos los registrados)
+    - compras_por_jugador: intentos de compra de cada jugador en cada tablero
+    - distribucion: cómo se elige la cantidad de bolitas (ver DISTRIBUCIONES)
+    - saldo_inicial: si se indica, el saldo de los participantes se fija a este valor antes de comprar
+    """
+    if distribucion not in DISTRIBUCIONES:
+        raise ValueError(f"Distribución desconocida: {distribucion}. Opciones: {', '.join(DISTRIBUCIONES)}")
+
+    rnd = random.Random(seed)
+    inicio = time.perf_counter()
+    marcadores = ", ".join(["%s"] * len(tableros))
+
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute(
+            f"SELECT id_tablero, precio_por_bolita, min_bolitas_por_jugador, max_bolitas_por_jugador FROM tableros WHERE id_tablero IN ({marcadores})",
+            list(tableros)
+        )
+        datos_tableros = {t["id_tablero"]: t for t in cursor.fetchall()}
+        faltan = set(tableros) - set(datos_tableros)
+        if faltan:
+            raise ValueError(f"Tableros inexistentes: {sorted(faltan)}")
+
+        cursor.execute("SELECT porcentaje_casa, porcentaje_sponsor, porcentaje_ganador FROM configuracion_pagos WHERE id_config = %s", (1,))
+        porcentajes = cursor.fetchone()
+
+        if jugadores is not None and crear_jugadores:
+            cursor.execute("SELECT COUNT(*) AS total FROM jugadores")
+            faltantes = jugadores - cursor.fetchone()["total"]
+            if faltantes > 0:
+                _crear_jugadores_simulados(cursor, faltantes, saldo_inicial or 0, lote)
+
+        if jugadores is None:
+            cursor.execute("SELECT user_id, saldo FROM jugadores ORDER BY user_id")
+        else:
+            cursor.execute("SELECT user_id, saldo FROM jugadores ORDER BY user_id LIMIT %s", (jugadores,))
+        saldos = {j["user_id"]: j["saldo"] for j in cursor.fetchall()}
+        if saldo_inicial is not None:
+            saldos = dict.fromkeys(saldos, Decimal(saldo_inicial))
+
+        if reiniciar:
+            for tabla in ("jugadores_tableros", "jugadores_tableros_resumen", "tableros_resumen"):
+                cursor.execute(f"DELETE FROM {tabla} WHERE id_tablero IN ({marcadores})", list(tableros))
+            cursor.execute(f"""
+                UPDATE jackpots
+                SET monto_acumulado = 0, premio_ganador = 0, premio_sponsor = 0, ganancia_bruta = 0, acum_bolitas = 0
+                WHERE id_tablero IN ({marcadores})
+            """, list(tableros))
+            previas = {}
+        else:
+            cursor.execute(
+                f"SELECT id_tablero, user_id, cantidad_bolitas FROM jugadores_tableros_resumen WHERE id_tablero IN ({marcadores})",
+                list(tableros)
+            )
+            previas = {(r["id_tablero"], r["user_id"]): r["cantidad_bolitas"] for r in cursor.fetchall()}
+
+        # 🧮 Calcular todas las compras en memoria
+        compras = []  # filas para jugadores_tableros
+        por_jugador = {}  # (id_tablero, user_id) -> [bolitas, monto]
+        resumen = {}
+        saldo_inicial_por_jugador = dict(saldos)
+        user_ids = list(saldos)
+
+        for id_tablero in tableros:
+            tablero = datos_tableros[id_tablero]
+            minimo = tablero["min_bolitas_por_jugador"]
+            maximo = tablero["max_bolitas_por_jugador"]
+            precio = tablero["precio_por_bolita"]
+            totales = resumen.setdefault(id_tablero, {"compras": 0, "rechazadas": 0, "jugadores_nuevos": 0, "bolitas": 0, "monto": Decimal(0)})
+
+            for _ in range(compras_por_jugador):
+                rnd.shuffle(user_ids)
+                for user_id in user_ids:
+                    cantidad = _cantidad(rnd, distribucion, minimo, maximo)
+                    costo = cantidad * precio
+                    clave = (id_tablero, user_id)
+                    acumulado = por_jugador.get(clave, [0, Decimal(0)])
+                    ya_tenia = previas.get(clave, 0) + acumulado[0]
+
+                    if saldos[user_id] < costo or ya_tenia + cantidad > maximo:
+                        totales["rechazadas"] += 1
+                        continue
+
+                    saldos[user_id] -= costo
+                    if clave not in por_jugador and clave not in previas:
+                        totales["jugadores_nuevos"] += 1
+                    por_jugador[clave] = [acumulado[0] + cantidad, acumulado[1] + costo]
+                    compras.append((user_id, id_tablero, cantidad, costo))
+                    totales["compras"] += 1
+                    totales["bolitas"] += cantidad
+                    totales["monto"] += costo
+
+        # 💾 Escribir por lotes
+        for bloque in _lotes(compras, lote):
+            cursor.executemany(
+                "INSERT INTO jugadores_tableros (user_id, id_tablero, cantidad_bolitas, monto_pagado) VALUES (%s, %s, %s, %s)",
+                bloque
+            )
+
+        filas_resumen = [(t, u, b, m) for (t, u), (b, m) in por_jugador.items()]
+        for bloque in _lotes(filas_resumen, lote):
+            cursor.executemany("""
+                INSERT INTO jugadores_tableros_resumen (id_tablero, user_id, cantidad_bolitas, monto_pagado)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    cantidad_bolitas = cantidad_bolitas + VALUES(cantidad_bolitas),
+                    monto_pagado = monto_pagado + VALUES(monto_pagado)
+            """, bloque)
+
+        # Saldos: solo los que cambiaron, con un UPDATE ... CASE por lote
+        cambios = [(u, s) for u, s in saldos.items() if saldo_inicial is not None or s != saldo_inicial_por_jugador[u]]
+        for bloque in _lotes(cambios, lote):
+            casos = " ".join(["WHEN %s THEN %s"] * len(bloque))
+            ids = ", ".join(["%s"] * len(bloque))
+            params = [v for fila in bloque for v in fila] + [u for u, _ in bloque]
+            cursor.execute(f"UPDATE jugadores SET saldo = CASE user_id {casos} END WHERE user_id IN ({ids})", params)
+
+        # Un upsert de totales y de jackpot por tablero
+        for id_tablero, totales in resumen.items():
+            if not totales["compras"]:
+                continue
+            cursor.execute("""
+                INSERT INTO tableros_resumen (id_tablero, jugadores, cantidad_bolitas, monto_pagado)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    jugadores = jugadores + VALUES(jugadores),
+                    cantidad_bolitas = cantidad_bolitas + VALUES(cantidad_bolitas),
+                    monto_pagado = monto_pagado + VALUES(monto_pagado)
+            """, (id_tablero, totales["jugadores_nuevos"], totales["bolitas"], totales["monto"]))
+            cursor.execute("""
+                INSERT INTO jackpots (id_tablero, acum_bolitas, monto_acumulado, ganancia_bruta, premio_sponsor, premio_ganador)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    acum_bolitas = acum_bolitas + VALUES(acum_bolitas),
+                    monto_acumulado = monto_acumulado + VALUES(monto_acumulado),
+                    ganancia_bruta = monto_acumulado * %s,
+                    premio_sponsor = monto_acumulado * %s,
+                    premio_ganador = monto_acumulado * %s
+            """, (
+                id_tablero, totales["bolitas"], totales["monto"],
+                totales["monto"] * porcentajes["porcentaje_casa"],
+                totales["monto"] * porcentajes["porcentaje_sponsor"],
+                totales["monto"] * porcentajes["porcentaje_ganador"],
+                porcentajes["porcentaje_casa"],
+                porcentajes["porcentaje_sponsor"],
+                porcentajes["porcentaje_ganador"],
+            ))
+
+        conn.commit()
+
+    segundos = time.perf_counter() - inicio
+    return {
+        "segundos": round(segundos, 3),
+        "jugadores": len(user_ids),
+        "tableros": {
+            str(t): {**r, "monto": float(r["monto"])} for t, r in resumen.items()
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tableros", type=int, nargs="+", required=True)
+    parser.add_argument("--jugadores", type=int, default=None)
+    parser.add_argument("--compras", type=int, default=1, help="intentos de compra por jugador y tablero")
+    parser.add_argument("--distribucion", choices=DISTRIBUCIONES, default="uniforme")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--saldo", type=int, default=None, help="saldo inicial de los participantes")
+    parser.add_argument("--sin-reiniciar", action="store_true", help="sumar a las compras existentes")
+    parser.add_argument("--crear-jugadores", action="store_true", help="crear jugadores sintéticos si faltan")
+    parser.add_argument("--lote", type=int, default=5000)
+    parser.add_argument("--si", action="store_true", help="confirmar que la base es de pruebas")
+    args = parser.parse_args(argv)
+
+    if not args.si:
+        sys.exit("Este script borra compras y modifica saldos. Agrega --si si la base es de pruebas.")
+
+    resultado = simular_compras_masivas(
+        args.tableros,
+        jugadores=args.jugadores,
+        compras_por_jugador=args.compras,
+        distribucion=args.distribucion,
+        seed=args.seed,
+        saldo_inicial=args.saldo,
+        reiniciar=not args.sin_reiniciar,
+        crear_jugadores=args.crear_jugadores,
+        lote=args.lote,
+    )
+    print(resultado)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Asignación automática de sponsor cuando un jugador se registra con rtaSponsor = "auto".
+
+Estrategias (SPONSOR_ESTRATEGIA en config.py):
+- "ultimo": el último jugador registrado (antes se tomaba ORDER BY numero_celular,
+  que ni tiene índice ni es el orden de registro)
+- "rotativo": recorre a todos los jugadores en orden de registro, uno por asignación
+- "menos_referidos": el jugador con menos referidos (el más antiguo si empatan)
+
+Todas leen una sola entrada de un índice: jugadores.id_registro (secuencia de registro),
+(referidos, id_registro) o la fila de sponsor_rotacion. Las columnas y la tabla las crea
+la migración 6 (`python -m bolas_locas.esquema migrar`).
+
+Se llaman dentro de la transacción del registro, con cursor dictionary=True, y el
+registro suma el referido al sponsor en la misma transacción (sumar_referido).
+"""
+from config import SPONSOR_ESTRATEGIA
+
+
+def _ultimo(cursor):
+    cursor.execute("SELECT alias FROM jugadores ORDER BY id_registro DESC LIMIT 1")
+    fila = cursor.fetchone()
+    return fila["alias"] if fila else None
+
+
+def _rotativo(cursor):
+    cursor.execute("SELECT MAX(id_registro) AS ultimo FROM jugadores")
+    ultimo = cursor.fetchone()["ultimo"]
+    if ultimo is None:
+        return None
+    # Turno global: el UPDATE toma el lock de una sola fila y LAST_INSERT_ID queda en esta conexión
+    cursor.execute("UPDATE sponsor_rotacion SET siguiente = LAST_INSERT_ID(siguiente + 1) WHERE id = 1")
+    cursor.execute("SELECT LAST_INSERT_ID() AS turno")
+    posicion = (cursor.fetchone()["turno"] - 1) % ultimo + 1
+    # Los huecos de la secuencia se saltan hacia el siguiente registrado
+    cursor.execute(
+        "SELECT alias FROM jugadores WHERE id_registro >= %s ORDER BY id_registro LIMIT 1",
+        (posicion,)
+    )
+    fila = cursor.fetchone()
+    return fila["alias"] if fila else None
+
+
+def _menos_referidos(cursor):
+    # SKIP LOCKED: los registros simultáneos no esperan ni eligen al mismo sponsor
+    cursor.execute("""
+        SELECT alias FROM jugadores
+        ORDER BY referidos, id_registro
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    """)
+    fila = cursor.fetchone()
+    return fila["alias"] if fila else None
+
+
+ESTRATEGIAS = {
+    "ultimo": _ultimo,
+    "rotativo": _rotativo,
+    "menos_referidos": _menos_referidos,
+}
+
+
+# ✅ Alias del sponsor asignado (None si no hay jugadores registrados)
+def asignar_sponsor(cursor, estrategia=None):
+    estrategia = estrategia or SPONSOR_ESTRATEGIA
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f"Estrategia de sponsor desconocida: {estrategia}. Opciones: {', '.join(ESTRATEGIAS)}")
+    return ESTRATEGIAS[estrategia](cursor)
+
+
+# ✅ Contar un referido más para el sponsor (lo usa menos_referidos)
+def sumar_referido(cursor, alias):
+    cursor.execute("UPDATE jugadores SET referidos = referidos + 1 WHERE alias = %s", (alias,))
@@ -1,171 +1,179 @@
-from fastapi import APIRouter, Request
-from fastapi.responses import JSONResponse
-import mysql.connector
-import re  # Para validaciones
-from config import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+import hmac
+import inspect
+import logging
+from contextlib import closing
+from datetime import MAXYEAR, MINYEAR
 from decimal import Decimal
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-import os  # Importa el módulo os
-import requests  
-
-app = FastAPI()
-
-# Configuración de CORS
-origins = [
-    "https://www.solutions-systems.com",  # Dominio permitido
-    "http://localhost:3000",             # Para desarrollo local
-    "http://localhost:5500",  # Para Live Server de VS Code
-    "http://127.0.0.1:80",  # Si corres FastAPI localmente
-    "http://127.0.0.1:8000",  # Si corres FastAPI localmente
-    "http://127.0.0.1",  # Si corres FastAPI localmente
-        
-        
-]
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,               # Orígenes permitidos
-    allow_credentials=True,              # Permitir cookies/credenciales
-    allow_methods=["*"],                 # Métodos HTTP permitidos
-    allow_headers=["*"],                 # Encabezados permitidos
+from mysql.connector.errors import IntegrityError
+from pydantic import ValidationError
+from bolas_locas.acciones import ACCIONES, PayloadDialogflow, accion
+from bolas_locas.db import db_connection, marcar_escritura, run_db, solo_lectura, usuario_en_curso
+from bolas_locas.respuestas import JSONResponse, a_json, desde_json
+from bolas_locas.contadores import bolitas_del_jugador, registrar_en_contadores
+from bolas_locas.historial import primer_dia, tableros_por_mes
+from bolas_locas.ganancias import pagina_de_ganancias
+from bolas_locas.jackpot_en_vivo import get_hub
+from bolas_locas import revalidacion
+from bolas_locas import compras_agrupadas
+from bolas_locas.compras_agrupadas import get_cola_compras
+from bolas_locas import registro
+from bolas_locas.metricas import etiquetar_accion, registrar_error
+from bolas_locas.logs import contexto_log
+from bolas_locas.pagos import CircuitoAbiertoError, ErrorPasarela, get_cliente_bold
+from bolas_locas.callbacks_bold import ESTADOS_VALIDOS, firma_valida, get_cola_callbacks
+from bolas_locas.cache import (
+    cache,
+    guardar_perfil,
+    invalidar_perfil,
+    perfil_en_cache,
+    invalidar_tableros,
+    version,
+    version_tablero,
+    RECURSO_ALBUMES,
+    RECURSO_TABLEROS,
+    KEY_TABLEROS_ABIERTOS,
+    KEY_ALBUMES_ACTIVOS,
+    KEY_CONFIGURACION_PAGOS,
 )
+from config import (
+    CACHE_TTL_TABLEROS,
+    CACHE_TTL_ALBUMES,
+    CACHE_TTL_CONFIG_PAGOS,
+    BOLD_CALLBACK_URL,
+    BOLD_WEBHOOK_SECRET,
+    JUGADORES_LIMITE_MAX,
+    JUGADORES_LOTE_STREAM,
+    GANANCIAS_POR_PAGINA,
+    TELEGRAM_MAX_CARACTERES,
+    REGISTRO_MASIVO_MAX,
+    REGISTRO_MASIVO_TOKEN,
+    HTTP_CACHE_TABLEROS,
+    HTTP_CACHE_ALBUMES,
+    HTTP_CACHE_JUGADORES,
+)
+
+# Todas las respuestas (también los dict que devuelven los endpoints) se serializan con orjson
+router = APIRouter(default_response_class=JSONResponse)
+
+log = logging.getLogger(__name__)
+# Una línea por acción atendida: alto volumen, se puede muestrear con LOG_MUESTREO
+log_acciones = logging.getLogger("bolas_locas.webhook.acciones")
+
+NDJSON = "application/x-ndjson"
+
 
-# Obtener la ruta absoluta de la carpeta static
-current_dir = os.path.dirname(os.path.abspath(__file__))
-static_dir = os.path.join(current_dir, "bolas_locas", "static")
-
-# Depuración: Imprime los archivos y carpetas en el directorio actual
-print("Archivos en el directorio actual:", os.listdir("."))
-print("Archivos en bolas_locas:", os.listdir("bolas_locas"))
-
-'''
-# Montar la carpeta /static para servir archivos estáticos
-try:
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
-except RuntimeError as e:
-    print("Error al montar la carpeta static:", e)
-'''
-
-router = APIRouter()
-
-# ✅ Función para conectar a la base de datos
-def get_db_connection():
-   
-    return mysql.connector.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_NAME
+# ✅ Perfil del jugador (alias, sponsor, numero_celular) desde la caché de perfiles; None si no está registrado
+def get_perfil(user_id):
+    perfil = perfil_en_cache(user_id)
+    if perfil is None:
+        with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+            perfil = _leer_perfil(cursor, user_id)
+    return perfil
+
+
+# Lee el perfil (y opcionalmente el saldo, que nunca se cachea) y lo guarda en la caché de perfiles
+def _leer_perfil(cursor, user_id, con_saldo=False):
+    cursor.execute(
+        f"SELECT alias, sponsor, numero_celular{', saldo' if con_saldo else ''} FROM jugadores WHERE user_id = %s",
+        (user_id,)
     )
-  
+    fila = cursor.fetchone()
+    if fila is not None:
+        guardar_perfil(user_id, {k: fila[k] for k in ("alias", "sponsor", "numero_celular")})
+    return fila
 
 
 # ✅ Función para verificar si un usuario ya está registrado
 def check_user_registered(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT numero_celular FROM jugadores WHERE user_id = %s", (user_id,))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return result  # Retorna None si el usuario no está registrado
+    return get_perfil(user_id)  # Retorna None si el usuario no está registrado
+
+# ✅ Mensaje para cada motivo de rechazo del registro
+def _mensaje_conflicto(conflicto):
+    mensajes = {
+        registro.USUARIO_REGISTRADO: "⚠️ Esta cuenta de Telegram ya está registrada en el Juego Bolas Locas.",
+        registro.ALIAS_EN_USO: f"❌ El alias {conflicto.valor} ya está en uso. Elige otro y vuelve a intentarlo.",
+        registro.CELULAR_EN_USO: f"❌ El número {conflicto.valor} ya está registrado con otra cuenta.",
+        registro.SPONSOR_INEXISTENTE: f"❌ El usuario {conflicto.valor} no existe. Verifica y vuelve a intentarlo.",
+        registro.SIN_SPONSOR: "❌ No hay usuarios registrados para asignar como sponsor.",
+    }
+    return mensajes[conflicto.motivo]
 
-# ✅ Función para registrar un usuario
-def handle_registrar_usuario(user_id, data):
-    print("📝 Acción detectada: Registro de Usuario")
 
-    # ✅ Verificar si el usuario ya está registrado
-    usuario = check_user_registered(user_id)
-    if usuario:
-        return JSONResponse(content={"fulfillmentText": "⚠️ Esta cuenta de Telegram ya está registrada en el Juego Bolas Locas."})
+# ✅ Función para registrar un usuario
+# Una sola conexión y una sola transacción: los choques de user_id, alias o celular los
+# detectan las restricciones únicas (ver bolas_locas/registro.py)
+@accion("actRegistrarUsuario", "rtaCelularNequi", "rtaAlias", "rtaSponsor")
+def handle_registrar_usuario(user_id, rtaCelularNequi, rtaAlias, rtaSponsor):
+    log_acciones.debug("📝 Acción detectada: Registro de Usuario")
 
-    # ✅ Extraer los parámetros enviados desde Dialogflow
-    rtaCelularNequi = data["queryResult"]["parameters"].get("rtaCelularNequi", "").strip()
-    rtaAlias = data["queryResult"]["parameters"].get("rtaAlias", "").strip()
-    rtaSponsor = data["queryResult"]["parameters"].get("rtaSponsor", "").strip()
+    # ✅ Normalizar los parámetros enviados desde Dialogflow
+    rtaCelularNequi = (rtaCelularNequi or "").strip()
+    rtaAlias = (rtaAlias or "").strip()
+    rtaSponsor = (rtaSponsor or "").strip()
 
-    print(f"📌 Datos recibidos - Celular: {rtaCelularNequi}, Alias: {rtaAlias}, Sponsor: {rtaSponsor}")
+    log.debug("📌 Datos recibidos - Celular: %s, Alias: %s, Sponsor: %s", rtaCelularNequi, rtaAlias, rtaSponsor)
 
     # ✅ Validación de parámetros obligatorios
     if not rtaCelularNequi or not rtaAlias or not rtaSponsor:
         return JSONResponse(content={"fulfillmentText": "❌ Faltan parámetros obligatorios. Verifica la información ingresada."})
 
     # ✅ Validación del número de celular de Nequi
-    rtaCelularNequi = re.sub(r"\D", "", rtaCelularNequi)  # Eliminar caracteres no numéricos
-    if not re.fullmatch(r"3\d{9}", rtaCelularNequi):
+    celular = registro.normalizar_celular(rtaCelularNequi)
+    if celular is None:
         return JSONResponse(content={"fulfillmentText": "❌ El número de celular debe tener 10 dígitos y empezar por 3."})
 
-    # ✅ Verificar si se debe autoasignar el sponsor
-    if rtaSponsor.lower() == "auto":
-        rtaSponsor = get_last_registered_alias()
-        if not rtaSponsor:
-            return JSONResponse(content={"fulfillmentText": "❌ No hay usuarios registrados para asignar como sponsor."})
-    else:
-        # Verificar si el sponsor existe en la base de datos
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM jugadores WHERE alias = %s", (rtaSponsor,))
-        sponsor_exists = cursor.fetchone()
-        cursor.close()
-        conn.close()
-
-        if not sponsor_exists:
-            return JSONResponse(content={"fulfillmentText": f"❌ El usuario {rtaSponsor} no existe. Verifica y vuelve a intentarlo."})
-
-    # ✅ Registrar al usuario en la base de datos
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    # ✅ Registrar al usuario (con "auto" el sponsor se asigna dentro de la misma transacción)
+    sponsor = None if rtaSponsor.lower() == "auto" else rtaSponsor
     try:
-        cursor.execute(
-            "INSERT INTO jugadores (numero_celular, alias, sponsor, user_id) VALUES (%s, %s, %s, %s)",
-            (rtaCelularNequi, rtaAlias, rtaSponsor, user_id)
-        )
-        conn.commit()
-        print(f"✅ Usuario {rtaAlias} registrado correctamente con sponsor {rtaSponsor}.")
+        with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+            sponsor = registro.registrar(conn, cursor, user_id, celular, rtaAlias, sponsor)
+        guardar_perfil(user_id, {"alias": rtaAlias, "sponsor": sponsor, "numero_celular": celular})
+        log.info("✅ Usuario %s registrado correctamente con sponsor %s.", rtaAlias, sponsor)
+    except registro.ConflictoRegistro as conflicto:
+        return JSONResponse(content={"fulfillmentText": _mensaje_conflicto(conflicto)})
     except Exception as e:
-        print(f"❌ Error al registrar el usuario: {e}")
+        log.exception("❌ Error al registrar el usuario")
+        registrar_error(e)
         return JSONResponse(content={"fulfillmentText": "❌ Hubo un error al registrar el usuario."})
-    finally:
-        cursor.close()
-        conn.close()
 
-    return JSONResponse(content={"fulfillmentText": f"✅ Usuario {rtaAlias} registrado correctamente con sponsor {rtaSponsor}."})
+    return JSONResponse(content={"fulfillmentText": f"✅ Usuario {rtaAlias} registrado correctamente con sponsor {sponsor}."})
 
 
-# ✅ Función para obtener tableros disponibles
+# ✅ Función para obtener tableros disponibles junto con su jackpot (una sola consulta)
+# La usan handle_jugar, /tableros_abiertos y la mini-app; se cachea unos segundos y
+# cada compra invalida la entrada para que el acumulado no quede desactualizado
 def get_open_tableros():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id_tablero, nombre, precio_por_bolita FROM tableros WHERE estado = 'abierto'")
-    tableros = cursor.fetchall()
-
-  # Convertir Decimal a float en los valores necesarios
-    for tablero in tableros:
-        if isinstance(tablero["precio_por_bolita"], Decimal):
-            tablero["precio_por_bolita"] = float(tablero["precio_por_bolita"])
-   
-    cursor.close()
-    conn.close()
-    return tableros
-
-# ✅ Función para obtener el último usuario registrado
-def get_last_registered_alias():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT alias FROM jugadores ORDER BY numero_celular DESC LIMIT 1")
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return result["alias"] if result else None
-
-
+    return cache.get_or_load(KEY_TABLEROS_ABIERTOS, _cargar_tableros_abiertos, CACHE_TTL_TABLEROS)
+
+
+def _cargar_tableros_abiertos():
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute("""
+            SELECT
+                t.id_tablero,
+                t.nombre,
+                t.precio_por_bolita,
+                COALESCE(j.acum_bolitas, 0) AS acum_bolitas,
+                COALESCE(j.premio_ganador, 0) AS premio_ganador,
+                COALESCE(j.premio_sponsor, 0) AS premio_sponsor
+            FROM
+                tableros t
+            LEFT JOIN
+                jackpots j ON j.id_tablero = t.id_tablero
+            WHERE
+                t.estado = 'abierto'
+        """)
+        tableros = cursor.fetchall()
+
+    # Convertir Decimal a float en los valores necesarios
+    return convertir_a_float(tableros)
 
 # ✅ Función para manejar la selección de "Jugar"
+@accion("actJugar")
 def handle_jugar(user_id):
-    print("🎮 Acción detectada: Jugar")
+    log_acciones.debug("🎮 Acción detectada: Jugar")
 
     # Verificar si el usuario está registrado
     usuario = check_user_registered(user_id)
@@ -179,32 +187,15 @@ def handle_jugar(user_id):
 
     mensaje = "🎲 *Selecciona un tablero para jugar:*"
     botones = {"inline_keyboard": []}
-    
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
 
     for tablero in tableros:
-        ID_tablero_jackpot= tablero['id_tablero']
-        
-        print(f"entre al ciclo y el id_tablero es: {ID_tablero_jackpot}")
-        
-        cursor.execute("SELECT premio_ganador FROM jackpots WHERE id_tablero = %s", (ID_tablero_jackpot,))
-        jack_premio = cursor.fetchone()
-        
-        acumulado = jack_premio['premio_ganador'] if jack_premio else 0
-        
-        print(f"el premio es: {acumulado}")
-
-        acumulado_currency = "${:,.0f}".format(acumulado).replace(',', '.')
+        acumulado_currency = "${:,.0f}".format(tablero['premio_ganador']).replace(',', '.')
         
         precio_bolita = "${:,.0f}".format(tablero['precio_por_bolita']).replace(',', '.')
         botones["inline_keyboard"].append([
             {"text": f"#ID: {tablero['id_tablero']} - 🟢 {precio_bolita}  - 💰 Acum: {acumulado_currency}", "callback_data": f"t4bl3r0s3l|{tablero['id_tablero']}"}
         ])
 
-    cursor.close()
-    conn.close()
-
     return JSONResponse(content={
         "fulfillmentMessages": [
             {
@@ -222,28 +213,25 @@ def handle_jugar(user_id):
 
 #########
 
-async def handle_seleccionar_tablero(user_id, rtaTableroID):
+@accion("actTableroSelect", "rtaTableroID")
+def handle_seleccionar_tablero(user_id, rtaTableroID):
     if not rtaTableroID:
         return JSONResponse(content={"fulfillmentText": "❌ No se recibió el ID del tablero."})
     
     id_tablero = rtaTableroID.replace("|","")
-    print(f"📝 Acción detectada: Tablero Seleccionado {id_tablero}")
-    
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM tableros WHERE id_tablero = %s", (id_tablero,))
-    tablero = cursor.fetchone()
-    
-    if not tablero:
-        return JSONResponse(content={"fulfillmentText": "❌ Tablero no encontrado."})
-    
-    cursor.execute("SELECT COUNT(DISTINCT user_id) as inscritos, SUM(cantidad_bolitas) as bolitas_compradas FROM jugadores_tableros WHERE id_tablero = %s", (id_tablero,))
-    stats = cursor.fetchone()
-    cursor.execute("SELECT * FROM jackpots WHERE id_tablero = %s", (id_tablero,))
-    jackpots = cursor.fetchone()
+    log_acciones.debug("📝 Acción detectada: Tablero Seleccionado %s", id_tablero)
     
-    cursor.close()
-    conn.close()
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute("SELECT * FROM tableros WHERE id_tablero = %s", (id_tablero,))
+        tablero = cursor.fetchone()
+        
+        if not tablero:
+            return JSONResponse(content={"fulfillmentText": "❌ Tablero no encontrado."})
+        
+        cursor.execute("SELECT jugadores AS inscritos, cantidad_bolitas AS bolitas_compradas FROM tableros_resumen WHERE id_tablero = %s", (id_tablero,))
+        stats = cursor.fetchone() or {"inscritos": 0, "bolitas_compradas": 0}
+        cursor.execute("SELECT * FROM jackpots WHERE id_tablero = %s", (id_tablero,))
+        jackpots = cursor.fetchone()
     
     disponibles = tablero["max_bolitas"] - (stats["bolitas_compradas"] or 0)
     precio_bolita = "${:,.0f}".format(tablero['precio_por_bolita']).replace(',', '.')
@@ -263,111 +251,150 @@ async def handle_seleccionar_tablero(user_id, rtaTableroID):
         }]
     })
 
+# ✅ Porcentajes de reparto del jackpot (cambian muy poco, se cachean)
+def get_configuracion_pagos():
+    return cache.get_or_load(KEY_CONFIGURACION_PAGOS, _cargar_configuracion_pagos, CACHE_TTL_CONFIG_PAGOS)
+
+
+def _cargar_configuracion_pagos():
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute("SELECT * FROM configuracion_pagos WHERE id_config = %s", (1,))
+        return cursor.fetchone()
+
+
+@accion("actComprarBolitas", "rtaTableroID", "rtaCantBolitas", bloqueante=False)
 async def handle_comprar_bolitas(user_id, rtaTableroID, rtaCantBolitas):
     if not rtaTableroID:
         return JSONResponse(content={"fulfillmentText": "❌ No se recibió el ID del tablero."})
     
     id_tablero = rtaTableroID.replace("|","")
-    cantidad = rtaCantBolitas
-    print(f"📝 Acción detectada: Comora {cantidad} en el tablero {id_tablero}")
-    
-    
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT saldo FROM jugadores WHERE user_id = %s", (user_id,))
-    jugador = cursor.fetchone()
-    
-    cursor.execute("SELECT * FROM tableros WHERE id_tablero = %s", (id_tablero,))
-    tablero = cursor.fetchone()
-    
-    cursor.execute("SELECT SUM(cantidad_bolitas) as compradas FROM jugadores_tableros WHERE id_tablero = %s", (id_tablero,))
-    stats = cursor.fetchone()
+    log_acciones.debug("📝 Acción detectada: Compra %s en el tablero %s", rtaCantBolitas, id_tablero)
 
-    # 🔹 NUEVO: Obtener la cantidad de bolitas compradas por el jugador en este tablero
-    cursor.execute("SELECT SUM(cantidad_bolitas) AS compradas_por_jugador FROM jugadores_tableros WHERE user_id = %s AND id_tablero = %s", (user_id, id_tablero))
-    jugador_stats = cursor.fetchone()
+    try:
+        cantidad = int(rtaCantBolitas)
+    except (TypeError, ValueError):
+        return JSONResponse(content={"fulfillmentText": "❌ La cantidad de bolitas debe ser un número válido."})
 
-     # 🔹 NUEVO: Obtener el monto actual del jackpot del tablero
-    cursor.execute("SELECT monto_acumulado FROM jackpots WHERE id_tablero = %s", (id_tablero,))
-    jackpot = cursor.fetchone()
+    # Tableros de COMPRAS_AGRUPADAS: la compra va en el próximo lote del tablero (un commit para muchas)
+    if compras_agrupadas.activo(id_tablero):
+        mensaje = await get_cola_compras().comprar(user_id, id_tablero, cantidad)
+    else:
+        mensaje = await run_db(comprar_bolitas, user_id, id_tablero, cantidad)
+    return JSONResponse(content={"fulfillmentText": mensaje})
+
+
+# ✅ Compra de bolitas en una sola transacción
+# - El débito de saldo es condicional (saldo >= costo) y bloquea solo la fila del jugador,
+#   lo que serializa las compras de ese jugador y protege el límite por jugador.
+# - El jackpot se actualiza con un único upsert (requiere UNIQUE en jackpots.id_tablero).
+# - READ COMMITTED: las lecturas ven lo último confirmado y no se toman gap locks.
+# Devuelve el texto para responder al usuario.
+def comprar_bolitas(user_id, id_tablero, cantidad):
+    # Se lee antes de pedir la conexión para no ocupar dos conexiones del pool a la vez
+    porcentaje_pagos = get_configuracion_pagos()
+
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        conn.start_transaction(isolation_level="READ COMMITTED")
+        cursor.execute(
+            "SELECT precio_por_bolita, min_bolitas_por_jugador, max_bolitas_por_jugador FROM tableros WHERE id_tablero = %s",
+            (id_tablero,)
+        )
+        tablero = cursor.fetchone()
+        if not tablero:
+            conn.rollback()
+            return "❌ Tablero no encontrado."
 
-    cursor.execute("SELECT * FROM configuracion_pagos WHERE id_config = %s", (1,))
-    porcentaje_pagos = cursor.fetchone()
-    
-    
-    cursor.close()
-    conn.close()
-    
-    costo_total = int(cantidad) * tablero["precio_por_bolita"]
-    ## disponibles = tablero["max_bolitas"] - (stats["compradas"] or 0)
-    bolitas_compradas_jugador = jugador_stats["compradas_por_jugador"] or 0
-    bolitas_totales_despues_compra = bolitas_compradas_jugador + int(cantidad)
-    monto_casa = (jackpot['monto_acumulado'] + costo_total) * porcentaje_pagos["porcentaje_casa"] if jackpot else (costo_total * porcentaje_pagos["porcentaje_casa"])
-    monto_sponsor = (jackpot['monto_acumulado'] + costo_total) * porcentaje_pagos["porcentaje_sponsor"] if jackpot else  (costo_total * porcentaje_pagos["porcentaje_sponsor"])
-    monto_ganador = (jackpot['monto_acumulado'] + costo_total) * porcentaje_pagos["porcentaje_ganador"] if jackpot else (costo_total * porcentaje_pagos["porcentaje_ganador"])
-    
+        if cantidad < tablero["min_bolitas_por_jugador"] or cantidad > tablero["max_bolitas_por_jugador"]:
+            conn.rollback()
+            return "❌ Cantidad de bolitas fuera del rango permitido."
 
-    
-    if jugador["saldo"] < costo_total:
-        return JSONResponse(content={"fulfillmentText": "❌ No tienes saldo suficiente."})
-    if cantidad < tablero["min_bolitas_por_jugador"] or cantidad > tablero["max_bolitas_por_jugador"]:
-        return JSONResponse(content={"fulfillmentText": "❌ Cantidad de bolitas fuera del rango permitido."})
-    '''if cantidad > disponibles:
-        return JSONResponse(content={"fulfillmentText": "❌ No hay suficientes bolitas disponibles."})'''
-    if bolitas_totales_despues_compra > tablero["max_bolitas_por_jugador"]:
-        return JSONResponse(content={"fulfillmentText": f"❌ No puedes comprar más bolitas. Ya tienes {bolitas_compradas_jugador} y el límite es {tablero['max_bolitas_por_jugador']}."})
+        costo_total = cantidad * tablero["precio_por_bolita"]
 
+        try:
+            # 1️⃣ Débito condicional: falla sin tocar nada si el saldo no alcanza
+            cursor.execute(
+                "UPDATE jugadores SET saldo = saldo - %s WHERE user_id = %s AND saldo >= %s",
+                (costo_total, user_id, costo_total)
+            )
+            if cursor.rowcount == 0:
+                conn.rollback()
+                # Con el perfil en caché ya se sabe que está registrado
+                if perfil_en_cache(user_id) is None and _leer_perfil(cursor, user_id) is None:
+                    return "❌ No estás registrado en el sistema."
+                return "❌ No tienes saldo suficiente."
+
+            # 2️⃣ Límite por jugador (la fila del jugador ya está bloqueada por el UPDATE)
+            compradas = bolitas_del_jugador(cursor, id_tablero, user_id)
+            bolitas_compradas_jugador = compradas or 0
+            if bolitas_compradas_jugador + cantidad > tablero["max_bolitas_por_jugador"]:
+                conn.rollback()
+                return f"❌ No puedes comprar más bolitas. Ya tienes {bolitas_compradas_jugador} y el límite es {tablero['max_bolitas_por_jugador']}."
+
+            # 3️⃣ Registrar la compra y sumarla a los contadores materializados
+            cursor.execute(
+                "INSERT INTO jugadores_tableros (user_id, id_tablero, cantidad_bolitas, monto_pagado) VALUES (%s, %s, %s, %s)",
+                (user_id, id_tablero, cantidad, costo_total)
+            )
+            registrar_en_contadores(cursor, id_tablero, user_id, cantidad, costo_total, jugador_nuevo=compradas is None)
+
+            # 4️⃣ Jackpot en un solo upsert; en ON DUPLICATE KEY UPDATE las asignaciones
+            # se evalúan en orden, así que los premios ya ven el monto_acumulado nuevo
+            cursor.execute("""
+                INSERT INTO jackpots (id_tablero, acum_bolitas, monto_acumulado, ganancia_bruta, premio_sponsor, premio_ganador)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    acum_bolitas = acum_bolitas + VALUES(acum_bolitas),
+                    monto_acumulado = monto_acumulado + VALUES(monto_acumulado),
+                    ganancia_bruta = monto_acumulado * %s,
+                    premio_sponsor = monto_acumulado * %s,
+                    premio_ganador = monto_acumulado * %s
+            """, (
+                id_tablero, cantidad, costo_total,
+                costo_total * porcentaje_pagos["porcentaje_casa"],
+                costo_total * porcentaje_pagos["porcentaje_sponsor"],
+                costo_total * porcentaje_pagos["porcentaje_ganador"],
+                porcentaje_pagos["porcentaje_casa"],
+                porcentaje_pagos["porcentaje_sponsor"],
+                porcentaje_pagos["porcentaje_ganador"],
+            ))
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    marcar_escritura(user_id)  # Sus próximas lecturas van a la primaria (leer lo propio)
+    invalidar_tableros(id_tablero)
+    get_hub().avisar_compra(id_tablero)  # Jackpot en vivo para quien mira el tablero
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("UPDATE jugadores SET saldo = saldo - %s WHERE user_id = %s", (costo_total, user_id))
-    cursor.execute("INSERT INTO jugadores_tableros (user_id, id_tablero, cantidad_bolitas, monto_pagado) VALUES (%s, %s, %s, %s)", (user_id, id_tablero, cantidad, costo_total))
-    if jackpot:
-        cursor.execute("UPDATE jackpots SET monto_acumulado = monto_acumulado + %s WHERE id_tablero = %s", (costo_total, id_tablero))
-        cursor.execute("UPDATE jackpots SET acum_bolitas = acum_bolitas + %s WHERE id_tablero = %s", (cantidad, id_tablero))
-        cursor.execute("UPDATE jackpots SET ganancia_bruta =  %s, premio_sponsor = %s, premio_ganador = %s WHERE id_tablero = %s", (monto_casa, monto_sponsor, monto_ganador, id_tablero))
-    
-    else:
-        cursor.execute("INSERT INTO jackpots (id_tablero, acum_bolitas, monto_acumulado, ganancia_bruta, premio_sponsor, premio_ganador) VALUES (%s, %s, %s, %s, %s, %s)", (id_tablero, cantidad, costo_total, monto_casa, monto_sponsor, monto_ganador))
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
-    
-    return JSONResponse(content={"fulfillmentText": "✅ Compra realizada con éxito."})
+    return "✅ Compra realizada con éxito."
 
 # ✅ Función para manejar "MisTablerosAbiertos"
+@accion("actMisTabAbiertos")
+@solo_lectura
 def handle_mis_tableros_abiertos(user_id):
-    print("📌 Acción detectada: MisTablerosAbiertos")
-
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-        
-    # ✅ Consulta corregida para cumplir con sql_mode=only_full_group_by
-    cursor.execute("""
-        SELECT 
-            jt.id_tablero,
-            MAX(t.fecha_creacion) AS fecha_creacion,  # Usamos MAX para cumplir con only_full_group_by
-            SUM(jt.cantidad_bolitas) AS bolitas_compradas_usuario,
-            MAX(j.acum_bolitas) AS bolitas_totales_tablero,  # Usamos MAX para cumplir con only_full_group_by
-            MAX(j.premio_ganador) AS acumulado_tablero  # Usamos MAX para cumplir con only_full_group_by
-        FROM 
-            jugadores_tableros jt
-        JOIN 
-            tableros t ON jt.id_tablero = t.id_tablero
-        LEFT JOIN 
-            jackpots j ON jt.id_tablero = j.id_tablero
-        WHERE 
-            jt.user_id = %s AND t.estado = 'abierto'
-        GROUP BY 
-            jt.id_tablero
-    """, (user_id,))
+    log_acciones.debug("📌 Acción detectada: MisTablerosAbiertos")
+
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        # ✅ Lectura desde el resumen por (tablero, jugador): una fila por tablero, sin GROUP BY
+        cursor.execute("""
+            SELECT 
+                r.id_tablero,
+                t.fecha_creacion,
+                r.cantidad_bolitas AS bolitas_compradas_usuario,
+                COALESCE(j.acum_bolitas, 0) AS bolitas_totales_tablero,
+                COALESCE(j.premio_ganador, 0) AS acumulado_tablero
+            FROM 
+                jugadores_tableros_resumen r
+            JOIN 
+                tableros t ON r.id_tablero = t.id_tablero
+            LEFT JOIN 
+                jackpots j ON r.id_tablero = j.id_tablero
+            WHERE 
+                r.user_id = %s AND t.estado = 'abierto'
+        """, (user_id,))
     
-    tableros = cursor.fetchall()
-    cursor.close()
-    conn.close()
+        tableros = cursor.fetchall()
 
     if not tableros:
         return JSONResponse(content={"fulfillmentText": "📭 No estás inscrito en ningún tablero abierto en este momento."})
@@ -404,62 +431,84 @@ def handle_mis_tableros_abiertos(user_id):
 
 ######### 🟡🟡🟡 Fin Funcion Tableros Abiertos
 
+# ✅ Meses pedidos: "3", 3, "3-5", "3,4,6" o una lista de Dialogflow; devuelve una lista ordenada de meses
+# Un rango fuera de 1-12 devuelve [] sin armarlo (un "1-999999999" no llega a construir la lista)
+def _meses_pedidos(rtaMes):
+    if isinstance(rtaMes, (list, tuple)):
+        partes = [str(m) for m in rtaMes]
+    else:
+        texto = str(rtaMes).replace(" ", "")
+        if "-" in texto:
+            inicio, _, fin = texto.partition("-")
+            inicio, fin = int(inicio), int(fin)
+            if not 1 <= inicio <= fin <= 12:
+                return []
+            return list(range(inicio, fin + 1))
+        partes = texto.split(",")
+    return sorted({int(float(m)) for m in partes if m})
+
+
 # ✅ Función para manejar "MisTablerosJugados"
+@accion("actMisTabJugados", "rtaMes", "rtaAnio")
+@solo_lectura
 def handle_mis_tableros_jugados(user_id, rtaMes, rtaAnio):
-    print("📌 Acción detectada: MisTablerosJugados")
+    log_acciones.debug("📌 Acción detectada: MisTablerosJugados")
 
     # Validar que los parámetros de mes y año estén presentes
     if not rtaMes or not rtaAnio:
         return JSONResponse(content={"fulfillmentText": "❌ Faltan parámetros obligatorios (mes o año)."})
 
-    # Convertir el mes y año a enteros
+    # Convertir los meses y el año a enteros (se admiten varios meses: "3-5" o "3,4,6")
     try:
-        mes = int(rtaMes)
-        anio = int(rtaAnio)
-    except ValueError:
+        meses = _meses_pedidos(rtaMes)
+        anio = int(float(rtaAnio))
+    except (ValueError, OverflowError):
         return JSONResponse(content={"fulfillmentText": "❌ El mes y el año deben ser números válidos."})
 
-    # Validar que el mes esté en el rango correcto (1-12)
-    if mes < 1 or mes > 12:
+    # Validar que los meses estén en el rango correcto (1-12)
+    if not meses or meses[0] < 1 or meses[-1] > 12:
         return JSONResponse(content={"fulfillmentText": "❌ El mes debe estar entre 1 y 12."})
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # ✅ Obtener los tableros en los que el usuario ha participado en el mes y año especificados
-    cursor.execute("""
-        SELECT DISTINCT 
-            jt.id_tablero
-        FROM 
-            jugadores_tableros jt
-        JOIN 
-            tableros t ON jt.id_tablero = t.id_tablero
-        WHERE 
-            jt.user_id = %s
-            AND YEAR(t.fecha_creacion) = %s
-            AND MONTH(t.fecha_creacion) = %s
-            AND t.estado != 'abierto'
-    """, (user_id, anio, mes))
-
-    tableros = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    # ✅ Historial mensual por rango sobre su clave primaria (user_id, mes, id_tablero)
+    # Un año fuera del calendario (0, 99999) no tiene historial: se responde sin consultar
+    por_mes = {}
+    if MINYEAR <= anio <= MAXYEAR:
+        with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+            por_mes = tableros_por_mes(cursor, user_id, primer_dia(anio, meses[0]), primer_dia(anio, meses[-1]))
 
-    if not tableros:
-        return JSONResponse(content={"fulfillmentText": f"📭 No participaste en ningún tablero en {mes}/{anio}."})
+    por_mes = {fecha: ids for fecha, ids in por_mes.items() if fecha.month in meses}
 
-    # ✅ Construir la lista de IDs de tableros separados por comas
-    lista_tableros = ", ".join(str(tablero["id_tablero"]) for tablero in tableros)
+    if len(meses) == 1:
+        mes = meses[0]
+        if not por_mes:
+            return JSONResponse(content={"fulfillmentText": f"📭 No participaste en ningún tablero en {mes}/{anio}."})
 
-    return JSONResponse(content={
-        "fulfillmentText": f"📋 ID de los Tableros en los que participaste en {mes}/{anio}:\n\n {lista_tableros}"
-    })
+        # ✅ Construir la lista de IDs de tableros separados por comas
+        lista_tableros = ", ".join(str(id_tablero) for ids in por_mes.values() for id_tablero in ids)
+        return JSONResponse(content={
+            "fulfillmentText": f"📋 ID de los Tableros en los que participaste en {mes}/{anio}:\n\n {lista_tableros}"
+        })
+
+    if meses == list(range(meses[0], meses[-1] + 1)):
+        periodo = f"entre {meses[0]}/{anio} y {meses[-1]}/{anio}"
+    else:
+        periodo = "en " + ", ".join(f"{mes}/{anio}" for mes in meses)
+    if not por_mes:
+        return JSONResponse(content={"fulfillmentText": f"📭 No participaste en ningún tablero {periodo}."})
+
+    mensaje = f"📋 ID de los Tableros en los que participaste {periodo}:\n"
+    for fecha, ids in por_mes.items():
+        mensaje += f"\n🗓️ {fecha.month}/{fecha.year}: {', '.join(str(id_tablero) for id_tablero in ids)}"
+
+    return JSONResponse(content={"fulfillmentText": mensaje})
 
 ##### 🟡🟡🟡 Fin Función Mis Tableros Jugados
 
 # ✅ Función para manejar "ConsultarTablero"
+@accion("actConsultaTablero", "rtaIDTablero", usa_user_id=False)
+@solo_lectura
 def handle_consulta_tablero(rtaIDTablero):
-    print("📌 Acción detectada: ConsultarTablero")
+    log_acciones.debug("📌 Acción detectada: ConsultarTablero")
 
     # Validar que el parámetro rtaIDTablero esté presente
     if not rtaIDTablero:
@@ -471,31 +520,28 @@ def handle_consulta_tablero(rtaIDTablero):
     except ValueError:
         return JSONResponse(content={"fulfillmentText": "❌ El ID del tablero debe ser un número válido."})
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # ✅ Obtener los datos de la tabla jackpots para el ID de tablero especificado
-    cursor.execute("""
-        SELECT 
-            id_tablero,
-            monto_acumulado,
-            alias_ganador,
-            sponsor_ganador,
-            premio_ganador,
-            premio_sponsor,
-            estado,
-            link_soporte,
-            fecha_pago,
-            acum_bolitas
-        FROM 
-            jackpots
-        WHERE 
-            id_tablero = %s
-    """, (id_tablero,))
-
-    jackpot = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+
+        # ✅ Obtener los datos de la tabla jackpots para el ID de tablero especificado
+        cursor.execute("""
+            SELECT 
+                id_tablero,
+                monto_acumulado,
+                alias_ganador,
+                sponsor_ganador,
+                premio_ganador,
+                premio_sponsor,
+                estado,
+                link_soporte,
+                fecha_pago,
+                acum_bolitas
+            FROM 
+                jackpots
+            WHERE 
+                id_tablero = %s
+        """, (id_tablero,))
+
+        jackpot = cursor.fetchone()
 
     if not jackpot:
         return JSONResponse(content={"fulfillmentText": f"❌ No se encontró información para el tablero con ID {id_tablero}."})
@@ -531,52 +577,50 @@ def handle_consulta_tablero(rtaIDTablero):
 
 ##### 🟡🟡🟡 Fin Función Consultar Tablero
 
+# ✅ Repartir bloques de texto en mensajes de Telegram de hasta `limite` caracteres (sin partir un bloque)
+def partir_en_mensajes(bloques, limite=TELEGRAM_MAX_CARACTERES):
+    mensajes = [""]
+    for bloque in bloques:
+        if mensajes[-1] and len(mensajes[-1]) + len(bloque) > limite:
+            mensajes.append("")
+        mensajes[-1] += bloque[:limite]
+    return mensajes
+
+
 # ✅ Función para manejar "MisTablerosGanados"
-def handle_mis_tableros_ganados(user_id):
-    print("📌 Acción detectada: MisTablerosGanados")
+# Lee una página del libro de ganancias (ver bolas_locas/ganancias.py); rtaPagina es opcional
+@accion("actMisTabGanados", "rtaPagina")
+@solo_lectura
+def handle_mis_tableros_ganados(user_id, rtaPagina=None):
+    log_acciones.debug("📌 Acción detectada: MisTablerosGanados")
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    try:
+        pagina = max(1, int(float(rtaPagina))) if rtaPagina else 1
+    except (ValueError, OverflowError):
+        return JSONResponse(content={"fulfillmentText": "❌ La página debe ser un número válido."})
 
-    # ✅ Obtener el alias del usuario
-    cursor.execute("SELECT alias FROM jugadores WHERE user_id = %s", (user_id,))
-    usuario = cursor.fetchone()
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
 
-    if not usuario:
-        return JSONResponse(content={"fulfillmentText": "❌ No estás registrado en el sistema."})
+        # ✅ Tableros en los que el usuario fue ganador o sponsor, por la PK (user_id, id_tablero)
+        tableros, hay_mas = pagina_de_ganancias(cursor, user_id, pagina, GANANCIAS_POR_PAGINA)
 
-    alias_usuario = usuario["alias"]
-
-    # ✅ Obtener los tableros en los que el usuario aparece como ganador o sponsor
-    cursor.execute("""
-        SELECT 
-            id_tablero,
-            monto_acumulado,
-            alias_ganador,
-            sponsor_ganador,
-            premio_ganador,
-            premio_sponsor,
-            estado,
-            link_soporte,
-            fecha_pago,
-            acum_bolitas
-        FROM 
-            jackpots
-        WHERE 
-            alias_ganador = %s OR sponsor_ganador = %s
-    """, (alias_usuario, alias_usuario))
-
-    tableros = cursor.fetchall()
-    cursor.close()
-    conn.close()
+        # El registro solo se consulta si no hay nada que mostrar
+        if not tableros and pagina == 1:
+            if perfil_en_cache(user_id) is None and _leer_perfil(cursor, user_id) is None:
+                return JSONResponse(content={"fulfillmentText": "❌ No estás registrado en el sistema."})
 
     if not tableros:
+        if pagina > 1:
+            return JSONResponse(content={"fulfillmentText": f"📭 No hay más tableros ganados (página {pagina})."})
         return JSONResponse(content={"fulfillmentText": "📭 No has ganado ni has sido sponsor en ningún tablero ganador."})
 
-    # ✅ Construir el mensaje con los tableros
-    mensaje = "🏆 *Tus Tableros Ganados o con ganacias como Sponsor:*\n\n"
+    # ✅ Construir el mensaje con los tableros, repartido en mensajes que Telegram acepte
+    encabezado = "🏆 *Tus Tableros Ganados o con ganacias como Sponsor:*"
+    if pagina > 1:
+        encabezado += f" _(página {pagina})_"
+    bloques = [encabezado + "\n\n"]
     for tablero in tableros:
-        mensaje += (
+        bloques.append(
             f"🔹 *ID Tablero:* {tablero['id_tablero']}\n"
             f"💰 *Monto Acumulado:* ${tablero['monto_acumulado']:,.0f}\n"
             f"🔮 *Bolitas Acumuladas:* {tablero['acum_bolitas']}\n"
@@ -587,8 +631,9 @@ def handle_mis_tableros_ganados(user_id):
             f"📊 *Estado:* {tablero['estado'].capitalize()}\n"
             f"🔗 *Link de Soporte:* {tablero['link_soporte'] or 'N/A'}\n"
             f"📅 *Fecha de Pago:* {tablero['fecha_pago'].strftime('%Y-%m-%d %H:%M:%S') if tablero['fecha_pago'] else 'N/A'}\n\n"
-            
         )
+    if hay_mas:
+        bloques.append(f"➡️ Hay más tableros: pide la página {pagina + 1}.")
 
     return JSONResponse(content={
         "fulfillmentMessages": [
@@ -601,6 +646,7 @@ def handle_mis_tableros_ganados(user_id):
                     }
                 }
             }
+            for mensaje in partir_en_mensajes(bloques)
         ]
     })
 
@@ -608,88 +654,54 @@ def handle_mis_tableros_ganados(user_id):
 
 
 # ✅ Webhook de Dialogflow
+# El body se valida una sola vez y la acción se despacha con el registro ACCIONES (ver bolas_locas/acciones.py)
 @router.post("/webhook")
 async def handle_dialogflow_webhook(request: Request):
-    print("🚨 Webhook llamado") 
-    data = await request.json()
-
-    # ✅ Extraer el user_id de Telegram
-    user_id = None
     try:
-        user_id = data["originalDetectIntentRequest"]["payload"]["data"]["from"]["id"]
-    except KeyError:
-        try:
-            user_id = data["originalDetectIntentRequest"]["payload"]["data"]["callback_query"]["from"]["id"]
-            print(f"📌 User ID obtenido desde callback: {user_id}")
-        except KeyError:
-            return JSONResponse(content={"fulfillmentText": "❌ Error: No se pudo obtener el ID de usuario de Telegram."})
-
-    # ✅ Verificar la acción
-    action = data["queryResult"].get("action")
-
-    if action == "actDatosCuenta":
-        return handle_mi_cuenta(user_id)
-
-    if action == "actCambiarNequi":
-        rtaNuevoNequi = data["queryResult"]["parameters"].get("rtaNuevoNequi")
-        return handle_cambiar_nequi(user_id, rtaNuevoNequi)
-
-    if action == "actJugar":
-        return handle_jugar(user_id)
-
-    if action == "actRegistrarUsuario":
-        return handle_registrar_usuario(user_id, data)
-
-    if action == "actTableroSelect":
-        rtaTableroID = data["queryResult"]["parameters"].get("rtaTableroID")
-        return await handle_seleccionar_tablero(user_id, rtaTableroID)
-    
-    if action == "actComprarBolitas":
-        rtaCantBolitas = data["queryResult"]["parameters"].get("rtaCantBolitas")
-        rtaTableroID = data["queryResult"]["parameters"].get("rtaTableroID")
-        return await handle_comprar_bolitas(user_id, rtaTableroID, rtaCantBolitas)
-
-    if action == "actMisTabAbiertos":
-        return handle_mis_tableros_abiertos(user_id)
-
-    # ✅ Nuevo action para MisTablerosJugados
-    if action == "actMisTabJugados":
-        rtaMes = data["queryResult"]["parameters"].get("rtaMes")
-        rtaAnio = data["queryResult"]["parameters"].get("rtaAnio")
-        return handle_mis_tableros_jugados(user_id, rtaMes, rtaAnio)
-
-    
-    # ✅ Nuevo action para ConsultarTablero
-    if action == "actConsultaTablero":
-        rtaIDTablero = data["queryResult"]["parameters"].get("rtaIDTablero")
-        return handle_consulta_tablero(rtaIDTablero)
-
-    
-    # ✅ Nuevo action para MisTablerosGanados
-    if action == "actMisTabGanados":
-        return handle_mis_tableros_ganados(user_id)
-
-
-        # ✅ Nueva acción para Comprar Álbum
-    if action == "actComprarAlbum":
-        return handle_comprar_album()
-
+        payload = PayloadDialogflow.model_validate_json(await request.body())
+    except ValidationError:
+        return JSONResponse(content={"fulfillmentText": "❌ Error: solicitud de Dialogflow inválida."}, status_code=400)
 
-    if action == "actComprarAlbumMiniApp":
-        return handle_comprar_album_miniapp(user_id)
+    # ✅ Extraer el user_id de Telegram (del mensaje o del callback de un botón)
+    user_id = payload.user_id
+    if user_id is None:
+        return JSONResponse(content={"fulfillmentText": "❌ Error: No se pudo obtener el ID de usuario de Telegram."})
 
-    return JSONResponse(content={"fulfillmentText": "⚠️ Acción no reconocida."})
+    # ✅ Verificar la acción
+    action = payload.queryResult.action
+    registrada = ACCIONES.get(action)
+    etiquetar_accion(action if registrada else "desconocida")
+    contexto_log(action=action, user_id=user_id)
+    usuario_en_curso(user_id)
+    log_acciones.debug("🚨 Webhook llamado")
+
+    if registrada is None:
+        return JSONResponse(content={"fulfillmentText": "⚠️ Acción no reconocida."})
+
+    argumentos = registrada.argumentos(user_id, payload.queryResult.parameters)
+    # Los handlers usan MySQL de forma bloqueante: se ejecutan con run_db para no frenar el event loop
+    if registrada.bloqueante:
+        return await run_db(registrada.handler, *argumentos)
+    respuesta = registrada.handler(*argumentos)
+    # Los no bloqueantes pueden ser async (p. ej. la compra, que espera a su lote)
+    return await respuesta if inspect.isawaitable(respuesta) else respuesta
 
 # ✅ Función para manejar "MiCuenta"
+@accion("actDatosCuenta")
 def handle_mi_cuenta(user_id):
-    print("📌 Acción detectada: MiCuenta")
-
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT numero_celular, alias, sponsor, saldo FROM jugadores WHERE user_id = %s", (user_id,))
-    usuario = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    log_acciones.debug("📌 Acción detectada: MiCuenta")
+
+    # El perfil sale de la caché; el saldo se lee siempre de MySQL para que nunca esté desactualizado
+    perfil = perfil_en_cache(user_id)
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        if perfil is None:
+            usuario = _leer_perfil(cursor, user_id, con_saldo=True)
+        else:
+            cursor.execute("SELECT saldo FROM jugadores WHERE user_id = %s", (user_id,))
+            fila = cursor.fetchone()
+            usuario = {**perfil, "saldo": fila["saldo"]} if fila else None
+            if fila is None:
+                invalidar_perfil(user_id)  # El jugador ya no existe
 
     if not usuario:
         return JSONResponse(content={"fulfillmentText": "❌ No estás registrado en el sistema."})
@@ -731,21 +743,28 @@ def handle_mi_cuenta(user_id):
     return JSONResponse(content=botones)
 
 # ✅ Función para manejar el cambio de número de Nequi
+@accion("actCambiarNequi", "rtaNuevoNequi")
 def handle_cambiar_nequi(user_id, rtaNuevoNequi):
-    print("🔄 Acción detectada: CambiarNequi")
+    log_acciones.debug("🔄 Acción detectada: CambiarNequi")
 
     # Validaciones del nuevo número de Nequi
-    rtaNuevoNequi = re.sub(r"\D", "", str(rtaNuevoNequi))
-    if not re.fullmatch(r"3\d{9}", rtaNuevoNequi):
+    rtaNuevoNequi = registro.normalizar_celular(rtaNuevoNequi)
+    if rtaNuevoNequi is None:
         return JSONResponse(content={"fulfillmentText": "❌ El número de celular debe tener 10 dígitos y empezar por 3."})
 
-    # Actualizar el número en la base de datos
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("UPDATE jugadores SET numero_celular = %s WHERE user_id = %s", (rtaNuevoNequi, user_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # Actualizar el número en la base de datos (el celular es único: otro jugador puede tenerlo)
+    try:
+        with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+            cursor.execute("UPDATE jugadores SET numero_celular = %s WHERE user_id = %s", (rtaNuevoNequi, user_id))
+            conn.commit()
+        # Los demás datos del perfil no cambian: actualizar la entrada si está en caché
+        perfil = perfil_en_cache(user_id)
+        if perfil is not None:
+            guardar_perfil(user_id, {**perfil, "numero_celular": rtaNuevoNequi})
+    except IntegrityError as e:
+        if registro.motivo_de_duplicado(e) != registro.CELULAR_EN_USO:
+            raise
+        return JSONResponse(content={"fulfillmentText": f"❌ El número {rtaNuevoNequi} ya está registrado con otra cuenta."})
 
     return JSONResponse(content={"fulfillmentText": "✅ Número de Nequi actualizado correctamente."})
 
@@ -757,73 +776,155 @@ def convertir_a_float(data):
     return data
 
 # ✅ Endpoint para obtener los tableros abiertos
+# Con ETag / If-None-Match: 304 sin tocar MySQL mientras ninguna compra cambie el listado
 @router.get("/tableros_abiertos")
-def get_tableros_abiertos():
-    print("📢 Solicitando tableros abiertos...")
+def get_tableros_abiertos(request: Request):
+    log.debug("📢 Solicitando tableros abiertos...")
 
     try:
-        tableros = get_open_tableros()
-        print(f"✅ Tableros obtenidos: {tableros}")  # 🔍 Ver qué devuelve la consulta
+        respuesta = revalidacion.cacheada(
+            RECURSO_TABLEROS, version(RECURSO_TABLEROS), get_open_tableros, CACHE_TTL_TABLEROS
+        )
 
-        if not tableros:
+        if respuesta is None:
             return JSONResponse(content={"message": "No hay tableros abiertos."}, status_code=404)
 
-        return JSONResponse(content=tableros)
+        return revalidacion.responder(request, respuesta, HTTP_CACHE_TABLEROS)
 
     except Exception as e:
-        print(f"❌ Error en el endpoint /tableros_abiertos: {e}")
+        log.exception("❌ Error en el endpoint /tableros_abiertos")
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+# ✅ Leer jugadores de un tablero en orden de user_id, a partir de `after` (keyset sobre la PK del resumen)
+# Devuelve las filas ya codificadas (JSON por fila) para no guardar dicts de más en memoria.
+# Lee en la primaria: el endpoint la usa cuando el ETag sale del jackpot (leído en la primaria),
+# así el cuerpo nunca es más viejo que su ETag
+def leer_jugadores_primaria(tablero_id, after=None, limite=JUGADORES_LOTE_STREAM):
+    query = """
+        SELECT j.user_id, j.alias, j.sponsor, r.cantidad_bolitas AS total_bolitas
+        FROM jugadores_tableros_resumen r
+        JOIN jugadores j ON r.user_id = j.user_id
+        WHERE r.id_tablero = %s {desde}
+        ORDER BY r.user_id
+        LIMIT %s
+    """.format(desde="AND r.user_id > %s" if after is not None else "")
+    params = (tablero_id, after, limite) if after is not None else (tablero_id, limite)
+
+    filas, ultimo = [], None
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        cursor.execute(query, params)
+        # Cursor sin buffer: las filas se leen del socket de a poco y se codifican al vuelo
+        while True:
+            bloque = cursor.fetchmany(200)
+            if not bloque:
+                break
+            for jugador in bloque:
+                filas.append(a_json(jugador))
+            ultimo = bloque[-1]["user_id"]
+    return filas, ultimo
+
+
+# ✅ Lo mismo desde una réplica (si las hay), para respuestas sin ETag derivado del jackpot
+leer_jugadores_tablero = solo_lectura(leer_jugadores_primaria)
+
+
+# ✅ Generar el cuerpo en bloques: cada bloque es una consulta corta, la conexión se devuelve
+# al pool antes de escribir al cliente (un cliente lento no retiene conexiones)
+async def _stream_jugadores(tablero_id, filas, ultimo, ndjson, leer=leer_jugadores_tablero):
+    primero = True
+    if not ndjson:
+        yield b"["
+    while filas:
+        if ndjson:
+            yield b"\n".join(filas) + b"\n"
+        else:
+            yield (b"" if primero else b",") + b",".join(filas)
+        primero = False
+        if len(filas) < JUGADORES_LOTE_STREAM:
+            break
+        try:
+            filas, ultimo = await run_db(leer, tablero_id, ultimo)
+        except Exception:
+            # El estado ya salió: solo queda cortar el cuerpo y dejar rastro
+            log.exception("❌ Error a mitad del stream de /tablero/%s/jugadores", tablero_id)
+            return
+    if not ndjson:
+        yield b"]"
+
+
 # ✅ Endpoint para obtener jugadores de un tablero específico
+# - sin `limit`: la lista completa como antes, pero enviada por bloques (memoria constante)
+# - `limit` (+ `after` = último user_id recibido): una página {"jugadores": [...], "siguiente_after": id | null}
+# - `formato=ndjson`: un jugador por línea, por bloques
+# - ETag derivado del jackpot del tablero: con If-None-Match al día, 304 sin leer la lista;
+#   el cuerpo va en gzip si el cliente lo acepta. Con ETag la lista se lee en la primaria: una
+#   réplica atrasada guardaría una lista vieja bajo el ETag nuevo hasta la próxima compra
 @router.get("/tablero/{tablero_id}/jugadores")
-def get_jugadores_tablero(tablero_id: int):
-    print(f"📢 Solicitando jugadores del tablero {tablero_id}...")
- 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+async def get_jugadores_tablero(request: Request, tablero_id: int, limit: int | None = None, after: int | None = None,
+                                formato: str = "json"):
+    log.debug("📢 Solicitando jugadores del tablero %s...", tablero_id)
 
-    try:
-        query = """
-            SELECT j.user_id, j.alias, j.sponsor, SUM(jt.cantidad_bolitas) AS total_bolitas
-            FROM jugadores_tableros jt
-            JOIN jugadores j ON jt.user_id = j.user_id
-            WHERE jt.id_tablero = %s
-            GROUP BY j.user_id, j.alias, j.sponsor
-        """
-        
-        cursor.execute(query, (tablero_id,))
-        jugadores = cursor.fetchall()
-
-       # Convertir valores Decimal a float
-        jugadores = convertir_a_float(jugadores)
+    if formato not in ("json", "ndjson"):
+        return JSONResponse(content={"error": "formato debe ser json o ndjson."}, status_code=400)
 
-        if not jugadores:
+    try:
+        jackpot = await run_db(representacion_jackpot, tablero_id)
+        headers = None
+        if jackpot is not None:
+            # Toda compra cambia el jackpot: si no cambió, la lista de jugadores tampoco
+            etag = jackpot.etag.replace('W/"', 'W/"j', 1)
+            headers = revalidacion.cabeceras(etag, HTTP_CACHE_JUGADORES)
+            if revalidacion.vigente(request.headers, etag):
+                return Response(status_code=304, headers=headers)
+        con_gzip = revalidacion.acepta_gzip(request.headers)
+        leer = leer_jugadores_primaria if headers is not None else leer_jugadores_tablero
+
+        if limit is not None:
+            limit = max(1, min(limit, JUGADORES_LIMITE_MAX))
+            # Una fila de más para saber si hay otra página
+            filas, _ = await run_db(leer, tablero_id, after, limit + 1)
+            if not filas and after is None:
+                return JSONResponse(content={"message": "No hay jugadores en este tablero."}, status_code=404)
+            hay_mas = len(filas) > limit
+            filas = filas[:limit]
+            siguiente = desde_json(filas[-1])["user_id"] if hay_mas else None
+            headers = dict(headers or {})
+            if formato == "ndjson":
+                if siguiente is not None:
+                    headers["X-Siguiente-After"] = str(siguiente)
+                cuerpo, media_type = b"".join(f + b"\n" for f in filas), NDJSON
+            else:
+                cuerpo = b'{"jugadores":[' + b",".join(filas) + b'],"siguiente_after":' + a_json(siguiente) + b"}"
+                media_type = "application/json"
+            comprimido = revalidacion.comprimir(cuerpo) if con_gzip else None
+            if comprimido is not None:
+                headers["Content-Encoding"] = "gzip"
+                cuerpo = comprimido
+            return Response(content=cuerpo, media_type=media_type, headers=headers)
+
+        # Primer bloque antes de responder: así un tablero vacío sigue siendo 404
+        filas, ultimo = await run_db(leer, tablero_id, after)
+        if not filas:
             return JSONResponse(content={"message": "No hay jugadores en este tablero."}, status_code=404)
 
-        return JSONResponse(content=jugadores)
+        ndjson = formato == "ndjson"
+        cuerpo = _stream_jugadores(tablero_id, filas, ultimo, ndjson, leer)
+        if con_gzip:
+            headers = {**(headers or {}), "Content-Encoding": "gzip"}
+            cuerpo = revalidacion.comprimir_stream(cuerpo)
+        return StreamingResponse(cuerpo, media_type=NDJSON if ndjson else "application/json", headers=headers)
 
     except Exception as e:
-        print(f"❌ Error en el endpoint /tablero/{tablero_id}/jugadores: {e}")
+        log.exception("❌ Error en el endpoint /tablero/%s/jugadores", tablero_id)
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
-    finally:
-        cursor.close()
-        conn.close()
-
 ##### 🟡🟡🟡 Fin Endpoint para obtener jugadores de un tablero específico
 
 
-# ✅ Endpoint para obtener los datos del jackpot de un tablero específico
-@router.get("/tablero/{id_tablero}/jackpot")
-async def obtener_jackpot_tablero(id_tablero: int):
-    """
-    Endpoint para obtener los datos del jackpot de un tablero específico.
-    """
-    try:
-        # Conectar a la base de datos
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
+# ✅ Función para leer los datos del jackpot de un tablero
+# En la primaria: se lee una vez por versión del tablero y queda cacheado (representacion_jackpot)
+def get_jackpot_tablero(id_tablero):
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
         # Consultar los datos del jackpot para el tablero seleccionado
         query = """
         SELECT id_tablero, acum_bolitas, premio_ganador, premio_sponsor
@@ -831,211 +932,145 @@ async def obtener_jackpot_tablero(id_tablero: int):
         WHERE id_tablero = %s
         """
         cursor.execute(query, (id_tablero,))
-        jackpot_data = cursor.fetchone()
+        return cursor.fetchone()
 
-        # Cerrar la conexión
-        cursor.close()
-        conn.close()
 
+# ✅ Jackpot de un tablero ya serializado (cacheado por versión del tablero); None si no existe
+def representacion_jackpot(id_tablero):
+    def cargar():
+        jackpot_data = get_jackpot_tablero(id_tablero)
         if not jackpot_data:
-            raise HTTPException(status_code=404, detail="No se encontraron datos del jackpot para este tablero.")
-
-        # Devolver los datos del jackpot
+            return None
         return {
-            
             "id_tablero": jackpot_data["id_tablero"],
             "acum_bolitas": jackpot_data["acum_bolitas"],
             "premio_ganador": jackpot_data["premio_ganador"],
             "premio_sponsor": jackpot_data["premio_sponsor"]
         }
+    return revalidacion.cacheada(
+        f"jackpot:{id_tablero}", version_tablero(id_tablero), cargar, CACHE_TTL_TABLEROS
+    )
+
 
+# ✅ Endpoint para obtener los datos del jackpot de un tablero específico
+@router.get("/tablero/{id_tablero}/jackpot")
+async def obtener_jackpot_tablero(id_tablero: int, request: Request):
+    """
+    Endpoint para obtener los datos del jackpot de un tablero específico.
+    """
+    try:
+        jackpot = await run_db(representacion_jackpot, id_tablero)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener los datos del jackpot: {str(e)}")
 
+    if jackpot is None:
+        raise HTTPException(status_code=404, detail="No se encontraron datos del jackpot para este tablero.")
+
+    # Devolver los datos del jackpot (304 si el cliente ya tiene esta versión)
+    return revalidacion.responder(request, jackpot, HTTP_CACHE_TABLEROS)
+
 ##### 🟡🟡🟡 Fin Endpoint para obtener los datos del jackpot de un tablero específico.
 
-from random import randint
 
-@router.post("/simular_compras")
-async def simular_compras():
-    print("📢 Simulando compras masivas en el tablero ID 4...")
+# ✅ Jackpot en vivo (Server-Sent Events): el valor actual y cada cambio tras una compra
+# Todos los clientes de un tablero comparten una lectura por actualización (ver jackpot_en_vivo.py)
+@router.get("/tablero/{id_tablero}/jackpot/eventos")
+async def eventos_jackpot_tablero(id_tablero: int):
+    hub = get_hub()
     try:
-        # Conectar a la base de datos
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Paso 0: Actualizar el saldo de todos los jugadores a 500,000
-        print("💰 Actualizando saldo de todos los jugadores a 500,000...")
-        cursor.execute("UPDATE jugadores SET saldo = 500000")
-        conn.commit()  # Confirmar la actualización
-        
-        # Paso 1: Truncar la tabla jugadores_tableros
-        print("🧹 Truncando la tabla jugadores_tableros...")
-        #cursor.execute("TRUNCATE TABLE jugadores_tableros")
-        cursor.execute("DELETE from jugadores_tableros WHERE id_tablero = %s", (4,))
-        
-        # Paso 2: Reiniciar los valores del jackpot para el id_tablero 4
-        print("🔄 Reiniciando valores del jackpot para el tablero ID 4...")
-        cursor.execute(
-            """
-            UPDATE jackpots 
-            SET 
-                monto_acumulado = 0, 
-                premio_ganador = 0, 
-                premio_sponsor = 0, 
-                ganancia_bruta = 0, 
-                acum_bolitas = 0
-            WHERE id_tablero = %s
-            """,
-            (4,)
-        )
-        
-        # Confirmar los cambios realizados hasta ahora
-        conn.commit()
-        
-        # Paso 3: Obtener todos los jugadores registrados
-        cursor.execute("SELECT user_id, saldo FROM jugadores")
-        jugadores = cursor.fetchall()
-        
-        # Definir el ID del tablero
-        id_tablero = 4
-        
-        # Iterar sobre cada jugador y simular la compra de bolitas
-        for jugador in jugadores:
-            user_id = jugador["user_id"]
-            saldo_actual = jugador["saldo"]
-            
-            # Consultar los detalles del tablero
-            cursor.execute("SELECT * FROM tableros WHERE id_tablero = %s", (id_tablero,))
-            tablero = cursor.fetchone()
-            if not tablero:
-                continue  # Saltar si el tablero no existe
-            
-            # Generar una cantidad aleatoria de bolitas dentro del rango permitido
-            min_bolitas = tablero["min_bolitas_por_jugador"]
-            max_bolitas = tablero["max_bolitas_por_jugador"]
-            cantidad_bolitas = randint(min_bolitas, max_bolitas)
-            
-            # Calcular el costo total
-            precio_por_bolita = tablero["precio_por_bolita"]
-            costo_total = cantidad_bolitas * precio_por_bolita
-            
-            # Verificar si el jugador tiene suficiente saldo
-            if saldo_actual < costo_total:
-                print(f"⚠️ Jugador {user_id} no tiene suficiente saldo para comprar {cantidad_bolitas} bolitas.")
-                continue
-            
-            # Verificar si el jugador ya alcanzó el límite máximo de bolitas en el tablero
-            cursor.execute(
-                "SELECT SUM(cantidad_bolitas) AS compradas_por_jugador FROM jugadores_tableros WHERE user_id = %s AND id_tablero = %s",
-                (user_id, id_tablero)
-            )
-            jugador_stats = cursor.fetchone()
-            bolitas_compradas_jugador = jugador_stats["compradas_por_jugador"] or 0
-            if bolitas_compradas_jugador + cantidad_bolitas > tablero["max_bolitas_por_jugador"]:
-                print(f"⚠️ Jugador {user_id} excede el límite máximo de bolitas en el tablero.")
-                continue
-            
-            # Actualizar el saldo del jugador
-            cursor.execute("UPDATE jugadores SET saldo = saldo - %s WHERE user_id = %s", (costo_total, user_id))
-            
-            # Registrar la compra en la tabla jugadores_tableros
-            cursor.execute(
-                "INSERT INTO jugadores_tableros (user_id, id_tablero, cantidad_bolitas, monto_pagado) VALUES (%s, %s, %s, %s)",
-                (user_id, id_tablero, cantidad_bolitas, costo_total)
-            )
-            
-            # Actualizar el jackpot
-            cursor.execute("SELECT * FROM jackpots WHERE id_tablero = %s", (id_tablero,))
-            jackpot = cursor.fetchone()
-            if jackpot:
-                # Calcular los nuevos valores para premio_ganador, premio_sponsor y ganancia_bruta
-                nuevo_monto_acumulado = jackpot["monto_acumulado"] + costo_total
-                premio_ganador = nuevo_monto_acumulado * Decimal('0.60')  # 60% del monto acumulado
-                premio_sponsor = nuevo_monto_acumulado * Decimal('0.06')  # 6% del monto acumulado
-                ganancia_bruta = nuevo_monto_acumulado * Decimal('0.34')  # 34% del monto acumulado
-                
-                # Actualizar el jackpot con los nuevos valores
-                cursor.execute(
-                    """
-                    UPDATE jackpots 
-                    SET 
-                        monto_acumulado = %s, 
-                        acum_bolitas = acum_bolitas + %s,
-                        premio_ganador = %s,
-                        premio_sponsor = %s,
-                        ganancia_bruta = %s
-                    WHERE id_tablero = %s
-                    """,
-                    (
-                        nuevo_monto_acumulado,
-                        cantidad_bolitas,
-                        premio_ganador,
-                        premio_sponsor,
-                        ganancia_bruta,
-                        id_tablero
-                    )
-                )
-            else:
-                # Calcular los valores iniciales para premio_ganador, premio_sponsor y ganancia_bruta
-                premio_ganador = costo_total * Decimal('0.60')  # 60% del monto acumulado
-                premio_sponsor = costo_total * Decimal('0.06')  # 6% del monto acumulado
-                ganancia_bruta = costo_total * Decimal('0.34')  # 34% del monto acumulado
-                
-                # Insertar un nuevo registro en jackpots
-                cursor.execute(
-                    """
-                    INSERT INTO jackpots 
-                    (id_tablero, acum_bolitas, monto_acumulado, premio_ganador, premio_sponsor, ganancia_bruta) 
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    """,
-                    (
-                        id_tablero,
-                        cantidad_bolitas,
-                        costo_total,
-                        premio_ganador,
-                        premio_sponsor,
-                        ganancia_bruta
-                    )
-                )
-            
-            print(f"✅ Jugador {user_id} compró {cantidad_bolitas} bolitas en el tablero {id_tablero}.")
-        
-        # Confirmar los cambios en la base de datos
-        conn.commit()
-        
-        # Cerrar la conexión
-        cursor.close()
-        conn.close()
-        return JSONResponse(content={"message": "Simulación de compras completada."})
-    
+        jackpot_data = await hub.foto(id_tablero)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener los datos del jackpot: {str(e)}")
+
+    if not jackpot_data:
+        raise HTTPException(status_code=404, detail="No se encontraron datos del jackpot para este tablero.")
+
+    return StreamingResponse(
+        hub.eventos(id_tablero),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # Sin buffer en nginx/proxies
+    )
+
+##### 🟡🟡🟡 Fin Jackpot en vivo
+
+# La simulación de compras masivas borra compras y reinicia saldos: solo por línea de comandos
+# contra bases de prueba (python -m bolas_locas.simulacion), nunca como endpoint público
+
+# ✅ Registro masivo para campañas de inscripción (mismo formato que `python -m bolas_locas.registro importar`)
+# Body: {"jugadores": [{"user_id", "numero_celular", "alias", "sponsor"}, ...], "sponsor": "alias por defecto"}
+# Exige el header X-Token = REGISTRO_MASIVO_TOKEN; sin token configurado el endpoint queda deshabilitado
+@router.post("/registro_masivo")
+async def registro_masivo(request: Request):
+    if not REGISTRO_MASIVO_TOKEN:
+        return JSONResponse(content={"error": "Registro masivo deshabilitado (falta REGISTRO_MASIVO_TOKEN)."}, status_code=403)
+    if not hmac.compare_digest(request.headers.get("X-Token", ""), REGISTRO_MASIVO_TOKEN):
+        return JSONResponse(content={"error": "No autorizado."}, status_code=401)
+
+    # El body se lee solo después de autorizar
+    try:
+        data = desde_json(await request.body())
+    except ValueError:
+        return JSONResponse(content={"error": "JSON inválido."}, status_code=400)
+    if not isinstance(data, dict):
+        return JSONResponse(content={"error": "Se esperaba un objeto JSON."}, status_code=400)
+
+    jugadores = data.get("jugadores")
+    if not isinstance(jugadores, list) or not all(isinstance(j, dict) for j in jugadores):
+        return JSONResponse(content={"error": "Se esperaba una lista 'jugadores'."}, status_code=400)
+    if len(jugadores) > REGISTRO_MASIVO_MAX:
+        return JSONResponse(content={"error": f"Máximo {REGISTRO_MASIVO_MAX} jugadores por solicitud."}, status_code=413)
+
+    try:
+        resultado = await run_db(registro.importar, jugadores, data.get("sponsor"))
     except Exception as e:
-        print(f"❌ Error al simular compras: {e}")
+        log.exception("❌ Error en el registro masivo")
+        registrar_error(e)
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+    log.info("📥 Registro masivo: %s registrados, %s rechazados", resultado["registrados"], len(resultado["rechazados"]))
+    return JSONResponse(content=resultado)
+
 ############################################################
 ##      📚📚📚 Inicio Seccion de ALBUMES 📚📚📚         ##
 ############################################################
 
 @router.get("/albumes_disponibles")
-def get_albumes_disponibles():
+def get_albumes_disponibles(request: Request):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT id_album, nombre, descripcion, precio FROM albumes WHERE estado = 'activo'")
-        albumes = cursor.fetchall()
-        # Convertir valores Decimal a float
-        albumes = convertir_a_float(albumes)
-        cursor.close()
-        conn.close()
-        if not albumes:
+        albumes = revalidacion.cacheada(
+            RECURSO_ALBUMES, version(RECURSO_ALBUMES), get_albumes_activos, CACHE_TTL_ALBUMES
+        )
+        if albumes is None:
             return JSONResponse(content={"message": "No hay álbumes disponibles."}, status_code=404)
-        return JSONResponse(content=albumes)
+        return revalidacion.responder(request, albumes, HTTP_CACHE_ALBUMES)
     except Exception as e:
-        print(f"❌ Error en el endpoint /albumes_disponibles: {e}")
+        log.exception("❌ Error en el endpoint /albumes_disponibles")
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+# ✅ Función para registrar una compra de álbum en estado pendiente
+# Devuelve (album, id_compra_album, error); error es un JSONResponse listo para responder
+def registrar_compra_album(user_id, id_album):
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
+        # Verificar si el álbum existe
+        cursor.execute("SELECT * FROM albumes WHERE id_album = %s AND estado = 'activo'", (id_album,))
+        album = cursor.fetchone()
+        if not album:
+            return None, None, JSONResponse(content={"error": "El álbum no existe o no está disponible."}, status_code=404)
+
+        # Registrar la compra en estado pendiente
+        try:
+            cursor.execute(
+                "INSERT INTO compras_albumes (user_id, id_album, estado) VALUES (%s, %s, 'pendiente')",
+                (user_id, id_album)
+            )
+            conn.commit()
+            return album, cursor.lastrowid, None
+        except Exception as e:
+            conn.rollback()
+            return None, None, JSONResponse(content={"error": f"Error al registrar la compra: {str(e)}"}, status_code=500)
+
+
 @router.post("/iniciar_compra_album")
 async def iniciar_compra_album(data: dict):
     user_id = data.get("user_id")
@@ -1044,89 +1079,75 @@ async def iniciar_compra_album(data: dict):
     if not user_id or not id_album:
         return JSONResponse(content={"error": "Faltan parámetros obligatorios."}, status_code=400)
 
-    # Verificar si el álbum existe
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM albumes WHERE id_album = %s AND estado = 'activo'", (id_album,))
-    album = cursor.fetchone()
-    if not album:
-        return JSONResponse(content={"error": "El álbum no existe o no está disponible."}, status_code=404)
-
-    # Registrar la compra en estado pendiente
-    try:
-        cursor.execute(
-            "INSERT INTO compras_albumes (user_id, id_album, estado) VALUES (%s, %s, 'pendiente')",
-            (user_id, id_album)
-        )
-        conn.commit()
-        id_compra_album = cursor.lastrowid
-    except Exception as e:
-        conn.rollback()
-        return JSONResponse(content={"error": f"Error al registrar la compra: {str(e)}"}, status_code=500)
-    finally:
-        cursor.close()
-        conn.close()
+    album, id_compra_album, error = await run_db(registrar_compra_album, user_id, id_album)
+    if error:
+        return error
 
     # Generar solicitud de pago en Bold
     bold_payload = {
         "amount": album["precio"],
         "currency": "COP",
         "description": f"Compra de álbum: {album['nombre']}",
-        "callback_url": "https://bolas-locas-production.up.railway.app/callback_bold",
+        "callback_url": BOLD_CALLBACK_URL,
         "reference": str(id_compra_album)  # Usamos el ID de la compra como referencia
     }
 
+    # Cliente async compartido (keep-alive, timeouts, reintentos, circuit breaker).
+    # La referencia viaja como Idempotency-Key: si se reintenta, Bold no crea un segundo cobro
     try:
-        response = requests.post("https://api.bold.com/payments", json=bold_payload)
-        if response.status_code != 200:
-            return JSONResponse(content={"error": "Error al generar la solicitud de pago."}, status_code=500)
+        pago = await get_cliente_bold().crear_pago(bold_payload, idempotency_key=bold_payload["reference"])
+    except CircuitoAbiertoError:
+        return JSONResponse(content={"error": "Los pagos no están disponibles en este momento. Intenta de nuevo en unos minutos."}, status_code=503)
+    except ErrorPasarela as e:
+        log.warning("⚠️ Error al generar la solicitud de pago %s: %s", id_compra_album, e)
+        return JSONResponse(content={"error": "Error al generar la solicitud de pago."}, status_code=502)
+
+    return JSONResponse(content={"payment_url": pago.get("payment_url")})
+
+# ✅ Callback de Bold: verificar la firma, validar, encolar y responder de inmediato.
+# El worker de bolas_locas/callbacks_bold.py aplica los pagos por lotes y sin duplicar.
+@router.post("/callback_bold")
+async def callback_bold(request: Request):
+    if not BOLD_WEBHOOK_SECRET:
+        log.error("❌ /callback_bold rechazado: falta BOLD_WEBHOOK_SECRET")
+        return JSONResponse(content={"error": "Callback no disponible."}, status_code=503)
+
+    cuerpo = await request.body()
+    if not firma_valida(cuerpo, request.headers.get("x-bold-signature")):
+        return JSONResponse(content={"error": "Firma inválida."}, status_code=401)
+
+    try:
+        data = desde_json(cuerpo)
+    except ValueError:
+        return JSONResponse(content={"error": "JSON inválido."}, status_code=400)
+    if not isinstance(data, dict):
+        return JSONResponse(content={"error": "JSON inválido."}, status_code=400)
 
-        payment_url = response.json().get("payment_url")
-        return JSONResponse(content={"payment_url": payment_url})
-    except Exception as e:
-        return JSONResponse(content={"error": f"Error al comunicarse con Bold: {str(e)}"}, status_code=500)
-'''
-    @router.post("/callback_bold")
-async def callback_bold(data: dict):
     reference = data.get("reference")
     status = data.get("status")
 
     if not reference or not status:
         return JSONResponse(content={"error": "Faltan parámetros obligatorios."}, status_code=400)
 
-    # Actualizar el estado de la compra
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    # La referencia es el id_compra_album que mandamos al crear el pago
     try:
-        cursor.execute(
-            "UPDATE compras_albumes SET estado = %s, fecha_confirmacion = NOW() WHERE id_compra_album = %s",
-            (status, reference)
-        )
-        conn.commit()
+        id_compra_album = int(reference)
+    except (TypeError, ValueError):
+        return JSONResponse(content={"error": "Referencia inválida."}, status_code=400)
+
+    estado = str(status).strip().lower()
+    if estado not in ESTADOS_VALIDOS:
+        return JSONResponse(content={"error": "Estado inválido."}, status_code=400)
+
+    if not get_cola_callbacks().encolar(id_compra_album, estado):
+        return JSONResponse(content={"error": "Callback no procesado, intenta de nuevo."}, status_code=503)
+
+    return JSONResponse(content={"message": "Callback recibido."})
 
-        if status == "completado":
-            # Asignar las láminas del usuario al álbum
-            cursor.execute(
-                "INSERT INTO coleccion_laminas (user_id, id_album, id_lamina, cantidad) "
-                "SELECT %s, %s, id_lamina, COUNT(*) "
-                "FROM laminas_obtenidas "
-                "WHERE user_id = %s AND id_lamina IN (SELECT id_lamina FROM laminas WHERE id_album = %s) "
-                "GROUP BY id_lamina",
-                (user_id, id_album, user_id, id_album)
-            )
-            conn.commit()
-    except Exception as e:
-        conn.rollback()
-        return JSONResponse(content={"error": f"Error al procesar el callback: {str(e)}"}, status_code=500)
-    finally:
-        cursor.close()
-        conn.close()
-
-    return JSONResponse(content={"message": "Callback procesado correctamente."})
-'''
 # ✅ Función para manejar la acción de comprar álbum
+@accion("actComprarAlbum", usa_user_id=False)
 def handle_comprar_album():
-    print("📚 Acción detectada: Comprar Álbum")
+    log_acciones.debug("📚 Acción detectada: Comprar Álbum")
     try:
         # Obtener álbumes disponibles directamente desde la función local
         albumes = get_albumes_disponibles_local()
@@ -1161,39 +1182,54 @@ def handle_comprar_album():
             ]
         })
     except Exception as e:
-        print(f"❌ Error al procesar la acción actComprarAlbum: {e}")
+        log.exception("❌ Error al procesar la acción actComprarAlbum")
+        registrar_error(e)
         return JSONResponse(content={"fulfillmentText": "❌ Hubo un error al procesar la solicitud."})
 
 
-# ✅ Función local para obtener álbumes disponibles
-def get_albumes_disponibles_local():
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+# ✅ Precargar las cachés de lectura al arrancar (lo llama el lifespan de main.py)
+def calentar_caches():
+    get_open_tableros()
+    get_albumes_activos()
+    get_configuracion_pagos()
+
+
+# ✅ Catálogo de álbumes activos (cacheado, lo comparten el endpoint y el bot)
+def get_albumes_activos():
+    return cache.get_or_load(KEY_ALBUMES_ACTIVOS, _cargar_albumes_activos, CACHE_TTL_ALBUMES)
+
+
+def _cargar_albumes_activos():
+    with db_connection() as conn, closing(conn.cursor(dictionary=True)) as cursor:
         cursor.execute("SELECT id_album, nombre, descripcion, precio FROM albumes WHERE estado = 'activo'")
         albumes = cursor.fetchall()
 
-        # Convertir valores Decimal a float
-        albumes = convertir_a_float(albumes)
+    # Convertir valores Decimal a float
+    return convertir_a_float(albumes)
+
 
-        cursor.close()
-        conn.close()
+# ✅ Función local para obtener álbumes disponibles
+def get_albumes_disponibles_local():
+    try:
+        albumes = get_albumes_activos()
 
         if not albumes:
-            print("⚠️ No se encontraron álbumes disponibles.")
+            log.info("⚠️ No se encontraron álbumes disponibles.")
             return []
 
-        print(f"✅ Álbumes obtenidos: {albumes}")  # 🔍 Ver qué devuelve la consulta
+        log.debug("✅ Álbumes obtenidos: %d", len(albumes))
         return albumes
 
     except Exception as e:
-        print(f"❌ Error en la función get_albumes_disponibles_local: {e}")
+        log.exception("❌ Error en la función get_albumes_disponibles_local")
+        registrar_error(e)
         return []
 
     
     # ✅ Función para manejar la acción "Comprar Álbum Mini App"
+@accion("actComprarAlbumMiniApp", bloqueante=False)
 def handle_comprar_album_miniapp(user_id):
-    print("🛒 Acción detectada: Comprar Álbum Mini App")
+    log_acciones.debug("🛒 Acción detectada: Comprar Álbum Mini App")
 
     # URL de la Mini App (asegúrate de que coincida con tu dominio)
     mini_app_url = "https://www.solutions-systems.com/bolas_locas/mini-app.html"  # Reemplaza con la URL de tu Mini App